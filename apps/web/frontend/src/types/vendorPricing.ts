@@ -70,6 +70,9 @@ export interface DemandScenario {
 export interface ProductForecastRecommendation {
   recommended_restock_units: number;
   demand_next_7d: number;
+  safety_stock_units?: number;
+  lead_time_days?: number;
+  lead_time_demand?: Record<string, number>;
   action: string;
   confidence: number;
 }
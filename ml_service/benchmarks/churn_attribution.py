@@ -0,0 +1,131 @@
+"""
+Churn key-factor attribution benchmark
+Times batched path-dependent TreeSHAP (`TreeShapExplainer.shap_values`) against plain inference on a
+`--trees` × depth-`--depth` ensemble at increasing batch sizes, and checks additivity (SHAP values plus
+the expected value reproduce each row's margin). With xgboost installed the model is a booster trained
+on synthetic RFM rows, inference is `inplace_predict` and the attributions are also compared with
+`pred_contribs=True`; without it the trees are random, written in the same JSON model format, and
+inference is the compiled serving layout (`CompiledTrees.margin`).
+
+Usage (from ml_service/):
+    python -m benchmarks.churn_attribution --trees 300 --depth 4
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from src.services.churn_model import CHURN_FEATURES
+from src.services.tree_ensemble import CompiledTrees, TreeEnsemble, TreeShapExplainer
+
+try:
+    import xgboost as xgb  # type: ignore
+except Exception:  # pragma: no cover - optional dependency safeguard
+    xgb = None  # type: ignore
+
+
+def _random_tree(rng: np.random.Generator, n_features: int, depth: int) -> Dict[str, List[Any]]:
+    columns: Dict[str, List[Any]] = {
+        key: [] for key in ("left_children", "right_children", "split_indices", "split_conditions", "default_left", "sum_hessian")
+    }
+    stack = [(0, 0, 1000.0)]
+    for key in columns:
+        columns[key].append(0)
+    while stack:
+        node, level, cover = stack.pop()
+        columns["sum_hessian"][node] = cover
+        if level == depth:
+            columns["left_children"][node] = columns["right_children"][node] = -1
+            columns["split_conditions"][node] = float(rng.normal(0.0, 0.1))
+            continue
+        children = len(columns["left_children"])
+        for key in columns:
+            columns[key].extend([0, 0])
+        columns["left_children"][node], columns["right_children"][node] = children, children + 1
+        columns["split_indices"][node] = int(rng.integers(n_features))
+        columns["split_conditions"][node] = float(rng.normal())
+        columns["default_left"][node] = int(rng.random() < 0.5)
+        share = rng.uniform(0.1, 0.9)
+        stack += [(children, level + 1, cover * share), (children + 1, level + 1, cover * (1 - share))]
+    return columns
+
+
+def _model(args: argparse.Namespace, matrix: np.ndarray) -> Dict[str, Any]:
+    rng = np.random.default_rng(args.seed)
+    if xgb is not None:
+        margin = matrix @ rng.normal(size=matrix.shape[1]) + np.sin(3 * matrix[:, 0])
+        labels = (rng.random(len(matrix)) < 1 / (1 + np.exp(-np.nan_to_num(margin)))).astype(np.float32)
+        params = {"objective": "binary:logistic", "max_depth": args.depth, "eta": 0.1, "nthread": 1}
+        booster = xgb.train(params, xgb.DMatrix(matrix, label=labels), num_boost_round=args.trees)
+        return json.loads(booster.save_raw(raw_format="json"))
+    return {
+        "learner": {
+            "learner_model_param": {"base_score": "5E-1", "num_feature": str(matrix.shape[1])},
+            "objective": {"name": "binary:logistic"},
+            "gradient_booster": {
+                "name": "gbtree",
+                "model": {"trees": [_random_tree(rng, matrix.shape[1], args.depth) for _ in range(args.trees)]},
+            },
+        }
+    }
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix = rng.normal(size=(max(args.rows, 20000), len(CHURN_FEATURES)))
+    matrix[rng.random(matrix.shape) < 0.05] = np.nan
+    model = _model(args, matrix)
+    ensemble = TreeEnsemble.from_xgboost_json(model)
+    start = time.perf_counter()
+    explainer = TreeShapExplainer.from_ensemble(ensemble)
+    print(f"trees={len(ensemble)} nodes={len(ensemble.feature)} explainer_build={time.perf_counter() - start:.3f}s")
+
+    if xgb is not None:
+        booster = xgb.Booster(model_file=bytearray(json.dumps(model).encode()))
+        booster.set_param({"nthread": 1})
+
+        def margin(rows: np.ndarray) -> np.ndarray:
+            return booster.inplace_predict(rows, predict_type="margin")
+
+        inference = "xgboost"
+    else:
+        margin, inference = CompiledTrees.from_ensemble(ensemble).margin, "compiled"
+
+    sample = matrix[: args.rows]
+    shap = explainer.shap_values(sample)
+    additivity = np.abs(shap.sum(axis=1) + explainer.expected_value - margin(sample)).max()
+    print(f"additivity max|Σφ + E[f] − margin| = {additivity:.2e}")
+    if xgb is not None:
+        contribs = booster.predict(xgb.DMatrix(sample), pred_contribs=True)
+        print(f"max|φ − pred_contribs| = {np.abs(shap - contribs[:, :-1]).max():.2e}")
+
+    print(f"{'batch':>8} {f'{inference}_us':>14} {'shap_us':>10} {'ratio':>7}")
+    size = 1
+    while size <= args.rows:
+        rows = sample[:size]
+        repeat = max(1, 2000 // size)
+        infer = _timed(lambda: margin(rows), repeat)
+        attribute = _timed(lambda: explainer.shap_values(rows), repeat)
+        print(f"{size:>8} {infer / size * 1e6:>14.1f} {attribute / size * 1e6:>10.1f} {attribute / infer:>7.1f}")
+        size *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Churn batch inference benchmark
+Writes a synthetic user_behavior_metrics source for `--users` users into a scratch feature repo, serves it
+through the snapshot feature store and times `ChurnService.predict_batch` (feature gather, scoring and key
+factors) at increasing batch sizes. A one-request-per-user loop over the first `--loop-users` users is
+the baseline. Feature and attribution caches are cleared before each run; the last line rescores the
+largest batch with warm attribution caches.
+
+Usage (from ml_service/):
+    python -m benchmarks.churn_batch --users 100000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.services.churn_service import ChurnService
+from src.services.embedded_online_store import EMBEDDED_VIEW_SPECS
+from src.services.feature_cache import online_feature_cache
+from src.services.feature_snapshots import FeatureSnapshotLoader, FeatureSnapshotStore
+
+USER_VIEW = "user_behavior_metrics"
+
+
+def _write_user_features(repo: Path, user_ids, seed: int = 3) -> None:
+    rng = np.random.default_rng(seed)
+    n = len(user_ids)
+    total_orders = rng.poisson(12, n)
+    table = pa.table(
+        {
+            "user_id": user_ids,
+            "event_timestamp": pa.array([datetime.now(timezone.utc)] * n, pa.timestamp("us", tz="UTC")),
+            "orders_last_30d": rng.poisson(2, n),
+            "total_orders": total_orders,
+            "avg_order_value": rng.gamma(4.0, 37.0, n),
+            "lifetime_value_score": rng.beta(3, 2, n),
+            "rfm_score": rng.beta(3, 2, n),
+        }
+    )
+    path = repo / EMBEDDED_VIEW_SPECS[USER_VIEW].source_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--loop-users", type=int, default=1000)
+    args = parser.parse_args()
+
+    user_ids = [f"user-{idx:07d}" for idx in range(args.users)]
+    with tempfile.TemporaryDirectory() as scratch:
+        repo = Path(scratch)
+        _write_user_features(repo, user_ids)
+        service = ChurnService()
+        loader = FeatureSnapshotLoader(repo_path=repo, snapshot_dir=repo / "snapshots")
+        service._feature_store = FeatureSnapshotStore(loader)
+        asyncio.run(service.predict_batch(user_ids[:10]))  # load the snapshot
+
+        print(f"users={args.users} model={service.model_version}")
+        print(f"{'mode':>10} {'batch':>8} {'total_s':>9} {'us/user':>9}")
+
+        online_feature_cache.invalidate()
+        service._attributions.clear()
+        loop_ids = user_ids[: args.loop_users]
+        start = time.perf_counter()
+
+        async def one_by_one():
+            for user_id in loop_ids:
+                await service.predict(user_id=user_id)
+
+        asyncio.run(one_by_one())
+        elapsed = time.perf_counter() - start
+        print(f"{'per-user':>10} {len(loop_ids):>8} {elapsed:>9.3f} {elapsed / len(loop_ids) * 1e6:>9.1f}")
+
+        size = 1
+        while size <= args.users:
+            online_feature_cache.invalidate()
+            service._attributions.clear()
+            batch = user_ids[:size]
+            start = time.perf_counter()
+            results = asyncio.run(service.predict_batch(batch))
+            elapsed = time.perf_counter() - start
+            assert len(results) == size
+            print(f"{'batch':>10} {size:>8} {elapsed:>9.3f} {elapsed / size * 1e6:>9.1f}")
+            size *= 10
+
+        online_feature_cache.invalidate()
+        start = time.perf_counter()
+        asyncio.run(service.predict_batch(batch))
+        elapsed = time.perf_counter() - start
+        print(f"{'warm':>10} {len(batch):>8} {elapsed:>9.3f} {elapsed / len(batch) * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
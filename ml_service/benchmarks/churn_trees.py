@@ -0,0 +1,74 @@
+"""
+Churn tree inference benchmark
+Compiles a `--trees` × depth-`--depth` ensemble (see benchmarks.churn_attribution for how it is built)
+to the memory-mapped serving layout, then reports compile time, load time and per-row latency of
+`CompiledTrees.predict_proba` at increasing batch sizes. With xgboost installed, `inplace_predict` on the
+same booster is timed alongside and the two are checked to agree.
+
+Usage (from ml_service/):
+    python -m benchmarks.churn_trees --trees 300 --depth 4
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.churn_attribution import _model, _timed, xgb
+from src.services.churn_model import CHURN_FEATURES, compile_churn_model
+from src.services.tree_ensemble import TreeEnsemble, load_compiled
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix = rng.normal(size=(max(args.rows, 20000), len(CHURN_FEATURES)))
+    matrix[rng.random(matrix.shape) < 0.05] = np.nan
+    model = _model(args, matrix)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        compiled = Path(scratch) / "trees"
+        start = time.perf_counter()
+        compile_churn_model(TreeEnsemble.from_xgboost_json(model), compiled)
+        compile_sec = time.perf_counter() - start
+        start = time.perf_counter()
+        trees, _ = load_compiled(compiled)
+        load_ms = (time.perf_counter() - start) * 1e3
+        size_kb = sum(path.stat().st_size for path in compiled.iterdir()) / 1024
+        print(
+            f"trees={len(trees.roots)} nodes={len(trees.feature)} depth={trees.depth} "
+            f"compile={compile_sec:.3f}s load={load_ms:.2f}ms files={size_kb:.0f} KB"
+        )
+
+        booster = None
+        if xgb is not None:
+            booster = xgb.Booster(model_file=bytearray(json.dumps(model).encode()))
+            booster.set_param({"nthread": 1})
+            sample = matrix[: min(args.rows, 20000)]
+            error = np.abs(trees.predict_proba(sample) - booster.inplace_predict(sample)).max()
+            print(f"max|p − xgboost| = {error:.2e}")
+
+        print(f"{'batch':>8} {'compiled_us':>12} {'per_row_us':>11}" + (f" {'xgboost_us':>11}" if booster else ""))
+        size = 1
+        while size <= args.rows:
+            rows = matrix[:size]
+            repeat = max(1, 20000 // size)
+            elapsed = _timed(lambda: trees.predict_proba(rows), repeat)
+            line = f"{size:>8} {elapsed * 1e6:>12.1f} {elapsed / size * 1e6:>11.2f}"
+            if booster is not None:
+                line += f" {_timed(lambda: booster.inplace_predict(rows), repeat) * 1e6:>11.1f}"
+            print(line)
+            size *= 10
+
+
+if __name__ == "__main__":
+    main()
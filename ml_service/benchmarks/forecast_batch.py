@@ -0,0 +1,76 @@
+"""
+Batch forecast throughput benchmark
+Runs `ForecastingService.forecast_products_batch` over the product catalog, then over SKUs outside it.
+
+Catalog SKUs are served from the forecast store, or else from the reconciled live forecasts: the live
+row is timed cold (hierarchy fit + reconciliation) and cached. Only store-miss SKUs outside the
+catalog reach the process pool, so the worker scaling table covers that path alone.
+
+Usage (from ml_service/):
+    python -m benchmarks.forecast_batch --products 20000 --horizon 30 --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from src.services.forecasting_service import BATCH_CHUNK_SIZE, ForecastingService
+from src.services.sales_history import product_catalog
+
+
+async def _drain(service: ForecastingService, product_ids, horizon: int, workers: int) -> int:
+    count = 0
+    async for _ in service.forecast_products_batch(product_ids, horizon=horizon, workers=workers):
+        count += 1
+    return count
+
+
+def _timed(service: ForecastingService, product_ids, horizon: int, workers: int):
+    start = time.perf_counter()
+    count = asyncio.run(_drain(service, product_ids, horizon, workers))
+    return count, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    catalog = [product_id for product_id, _ in product_catalog()]
+    known = set(catalog)
+    catalog_ids = catalog[: args.products]
+    service = ForecastingService()
+    cpu_count = os.cpu_count() or 1
+    print(f"cpu_count={cpu_count} catalog={len(catalog)} products={args.products} horizon={args.horizon}")
+
+    snapshot = service.forecast_store.current()
+    path = "store" if snapshot is not None and snapshot.covers(args.horizon) else "live"
+    print(f"\ncatalog SKUs ({path} path, no worker pool)")
+    print(f"{'run':>8} {'skus':>7} {'seconds':>9} {'sku/s':>9}")
+    runs = ["cold", "cached"] if path == "live" else ["store"]
+    for run in runs:
+        count, elapsed = _timed(service, catalog_ids, args.horizon, max(args.workers))
+        print(f"{run:>8} {count:>7} {elapsed:>9.3f} {count / elapsed:>9.0f}")
+
+    # Ids outside the catalog are the only ones fitted unreconciled across the process pool.
+    store_miss = [f"offcat-{idx:06d}" for idx in range(args.products)]
+    store_miss = [product_id for product_id in store_miss if product_id not in known]
+    print("\nstore-miss SKUs outside the catalog (process pool, synthetic sales)")
+    if cpu_count < max(args.workers):
+        print(f"note: cpu_count={cpu_count} < {max(args.workers)} workers, so speedup cannot exceed {cpu_count}x")
+    print(f"{'workers':>8} {'seconds':>9} {'sku/s':>9} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        # Warm every worker first so process start-up isn't counted.
+        asyncio.run(_drain(service, store_miss[: workers * BATCH_CHUNK_SIZE], args.horizon, workers))
+        count, elapsed = _timed(service, store_miss, args.horizon, workers)
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {count / elapsed:>9.0f} {baseline / elapsed:>7.2f}x")
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
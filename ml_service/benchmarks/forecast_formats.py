@@ -0,0 +1,72 @@
+"""
+Forecast response format benchmark
+Serializes the same batch of product forecasts as row-per-day JSON, columnar JSON and Arrow IPC
+and reports encoded size and encode time per format.
+
+Usage (from ml_service/):
+    python -m benchmarks.forecast_formats --products 2000 --horizon 365
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from src.services.forecasting_service import ForecastingService, _product_payload
+from src.utils.response_formats import arrow_product_stream, columnar_json
+
+
+async def _iterate(payloads):
+    for payload in payloads:
+        yield payload
+
+
+async def _arrow(payloads, horizon: int) -> bytes:
+    return b"".join([chunk async for chunk in arrow_product_stream(_iterate(payloads), horizon)])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--horizon", type=int, default=365)
+    args = parser.parse_args()
+
+    product_ids = [f"prod-{idx:06d}" for idx in range(args.products)]
+    service = ForecastingService()
+    batch = service.forecast_skus(product_ids, args.horizon)
+    lead_time = service.lead_time_demand(product_ids, batch.values)
+    start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def payloads(layout: str):
+        return [
+            _product_payload(
+                product_id, args.horizon, service._series_from_batch(batch, row, start_date), lead_time, row, layout
+            )
+            for row, product_id in enumerate(product_ids)
+        ]
+
+    encoders = {
+        "records": ("records", lambda items: b"".join((json.dumps(item) + "\n").encode("utf-8") for item in items)),
+        "columnar": ("columnar", lambda items: b"".join(columnar_json(item) + b"\n" for item in items)),
+        "arrow": ("columnar", lambda items: asyncio.run(_arrow(items, args.horizon))),
+    }
+
+    print(f"products={args.products} horizon={args.horizon}")
+    print(f"{'format':>9} {'build_s':>8} {'encode_s':>9} {'MB':>8} {'size':>6}")
+    baseline = None
+    for name, (layout, encode) in encoders.items():
+        start = time.perf_counter()
+        items = payloads(layout)
+        built = time.perf_counter()
+        body = encode(items)
+        encoded = time.perf_counter()
+        baseline = baseline or len(body)
+        print(
+            f"{name:>9} {built - start:>8.2f} {encoded - built:>9.2f} "
+            f"{len(body) / 1e6:>8.2f} {len(body) / baseline:>5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
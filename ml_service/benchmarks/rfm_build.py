@@ -0,0 +1,119 @@
+"""
+RFM feature build benchmark
+Writes a synthetic order export (`--orders` orders from `--users` users over two years) to a scratch Parquet
+file in row groups, then streams it through `build_rfm_features`. Reports wall time, throughput and the
+process's anonymous (heap) memory, which tracks the user count plus one chunk rather than the order count.
+Then folds a next-day delta of `--delta-orders` orders in with `update_rfm_features` and checks the result
+against a full recompute.
+
+Usage (from ml_service/):
+    python -m benchmarks.rfm_build --orders 20000000 --users 1000000 --delta-orders 100000
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, time as day_start, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.services.rfm_features import build_rfm_features, update_rfm_features, verify_rfm_features
+
+STATUSES = np.array(["DELIVERED", "SHIPPED", "PROCESSING", "CANCELLED"])
+
+
+def _anon_mb() -> float:
+    with open("/proc/self/status") as handle:
+        for line in handle:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _write_orders(
+    path: Path, orders: int, users: int, as_of: datetime, days: int = 730, group_rows: int = 1_000_000, seed: int = 11
+) -> None:
+    rng = np.random.default_rng(seed)
+    user_ids = np.array([f"user-{idx:08d}" for idx in range(users)], dtype=object)
+    end_us = int(as_of.timestamp() * 1e6) - 1
+    with pq.ParquetWriter(path, pa.schema([
+        ("user_id", pa.string()),
+        ("total", pa.float64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("status", pa.string()),
+    ])) as writer:
+        for start in range(0, orders, group_rows):
+            size = min(group_rows, orders - start)
+            writer.write_table(
+                pa.table(
+                    {
+                        "user_id": pa.array(user_ids[rng.zipf(1.3, size) % users]),
+                        "total": rng.gamma(3.0, 40.0, size),
+                        "created_at": pa.array(
+                            end_us - rng.integers(0, days * 86_400_000_000, size), pa.timestamp("us", tz="UTC")
+                        ),
+                        "status": pa.array(STATUSES[rng.choice(4, size, p=[0.8, 0.1, 0.05, 0.05])]),
+                    }
+                )
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=20_000_000)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--delta-orders", type=int, default=100_000)
+    args = parser.parse_args()
+
+    end = datetime.now(timezone.utc).date() - timedelta(days=2)
+    as_of = datetime.combine(end + timedelta(days=1), day_start(), tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as scratch:
+        root = Path(scratch)
+        start = time.perf_counter()
+        _write_orders(root / "orders.parquet", args.orders, args.users, as_of)
+        size_mb = (root / "orders.parquet").stat().st_size / 1e6
+        print(f"orders={args.orders} users={args.users} export={size_mb:.0f} MB ({time.perf_counter() - start:.1f}s)")
+
+        baseline = _anon_mb()
+        peak = baseline
+        done = threading.Event()
+
+        def sample():
+            nonlocal peak
+            while not done.wait(0.05):
+                peak = max(peak, _anon_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        summary = build_rfm_features(
+            root / "orders.parquet", root / "features.parquet", end, args.chunk_rows, root / "state"
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        print(
+            f"build {elapsed:.2f}s ({args.orders / elapsed / 1e6:.2f}M orders/s) users={summary['users']} "
+            f"anon baseline={baseline:.0f} MB peak={peak:.0f} MB"
+        )
+
+        (root / "history").mkdir()
+        os.replace(root / "orders.parquet", root / "history" / "orders.parquet")
+        next_day = as_of + timedelta(days=1)
+        _write_orders(root / "history" / "delta.parquet", args.delta_orders, args.users, next_day, days=1, seed=12)
+        update = update_rfm_features(root / "history" / "delta.parquet", end + timedelta(days=1), root / "state")
+        print(
+            f"update {update['elapsed_sec']:.2f}s delta_orders={update['delta_orders']} "
+            f"touched={update['touched_users']} new_users={update['new_users']} rows_written={update['rows_written']}"
+        )
+        print(f"verify {verify_rfm_features(root / 'history', root / 'state', args.chunk_rows)['status']}")
+
+
+if __name__ == "__main__":
+    main()
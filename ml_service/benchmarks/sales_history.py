@@ -0,0 +1,72 @@
+"""
+Sales history store benchmark
+Bulk-loads a synthetic assortment into a scratch store, then streams it back in SKU chunks through the memory
+maps. Reports wall time and the process's anonymous (heap) memory, which stays near one chunk's worth.
+The page cache backing the maps is reclaimable and is not counted.
+
+Usage (from ml_service/):
+    python -m benchmarks.sales_history --products 100000 --days 1095 [--fit]
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from src.services.forecast_engine import ForecastEngine
+from src.services.sales_history import MANIFEST, SalesHistory, bulk_load_sales, synthetic_sales
+from src.utils.store_files import read_json
+
+
+def _anon_mb() -> float:
+    with open("/proc/self/status") as handle:
+        for line in handle:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--fit", action="store_true", help="Also fit the forecasting engine on every chunk")
+    args = parser.parse_args()
+
+    product_ids = [f"sku-{idx:06d}" for idx in range(args.products)]
+    full_mb = args.products * args.days * 4 / 1e6
+    print(f"products={args.products} days={args.days} float32 history={full_mb:.0f} MB baseline_anon={_anon_mb():.0f} MB")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        root = Path(scratch)
+        peak = 0.0
+
+        def history(chunk):
+            nonlocal peak
+            block = synthetic_sales(chunk, args.days)
+            peak = max(peak, _anon_mb())
+            return block
+
+        start = time.perf_counter()
+        bulk_load_sales(root, date.today() - timedelta(days=args.days), product_ids, args.days, history, args.chunk_size)
+        print(f"{'load':>6} {time.perf_counter() - start:>8.2f}s peak_anon={peak:.0f} MB")
+
+        store = SalesHistory(root, read_json(root / MANIFEST))
+        engine = ForecastEngine()
+        peak, total = 0.0, 0.0
+        start = time.perf_counter()
+        for _, block in store.iter_chunks(args.chunk_size):
+            total += float(np.nansum(block))
+            if args.fit:
+                engine.fit(block)
+            peak = max(peak, _anon_mb())
+        label = "fit" if args.fit else "scan"
+        print(f"{label:>6} {time.perf_counter() - start:>8.2f}s peak_anon={peak:.0f} MB units={total:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,10 @@ class ChurnResponse(BaseModel):
     key_factors: List[dict]
 
 
+MAX_BATCH_USERS = 100000
+MAX_AT_RISK_PAGE = 10000
+
+
 # Initialize churn service
 churn_service = ChurnService()
 
@@ -71,18 +75,18 @@ async def predict_batch_churn(user_ids: List[str]):
     Predict churn for multiple customers
     
     Args:
-        user_ids: List of user identifiers
+        user_ids: List of user identifiers (at most MAX_BATCH_USERS)
         
     Returns:
-        Dictionary mapping user_id to churn predictions
+        Dictionary mapping user_id to churn predictions, scored in one vectorized pass
     """
+    if len(user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_USERS} user_ids per batch")
+
     try:
         logger.info("Batch churn prediction", count=len(user_ids))
         
-        results = {}
-        for user_id in user_ids:
-            prediction = await churn_service.predict(user_id=user_id)
-            results[user_id] = prediction
+        results = await churn_service.predict_batch(user_ids)
         
         return {"results": results}
         
@@ -92,31 +96,38 @@ async def predict_batch_churn(user_ids: List[str]):
 
 
 @router.get("/at-risk")
-async def get_at_risk_customers(limit: int = 100, threshold: float = 0.7):
+async def get_at_risk_customers(limit: int = 100, threshold: float = 0.7, cursor: Optional[str] = None):
     """
-    Get list of at-risk customers
+    Get at-risk customers, highest churn probability first
     
     Args:
-        limit: Maximum number of customers to return
+        limit: Maximum number of customers to return (at most MAX_AT_RISK_PAGE)
         threshold: Minimum churn probability threshold
+        cursor: `next_cursor` from the previous page
         
     Returns:
-        List of at-risk customers
+        Page of at-risk customers, the total above threshold and the cursor for the next page
     """
+    if not 1 <= limit <= MAX_AT_RISK_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_AT_RISK_PAGE}")
+
     try:
         logger.info("Getting at-risk customers", limit=limit, threshold=threshold)
         
-        at_risk = await churn_service.get_at_risk_customers(
+        page = await churn_service.get_at_risk_customers(
             limit=limit,
-            threshold=threshold
+            threshold=threshold,
+            cursor=cursor
         )
         
         return {
-            "count": len(at_risk),
+            "count": len(page["customers"]),
             "threshold": threshold,
-            "customers": at_risk
+            **page
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Error getting at-risk customers", error=str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
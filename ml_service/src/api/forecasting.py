@@ -3,13 +3,24 @@ Forecasting API endpoints
 Provides Prophet and XGBoost-based demand forecasting
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
+import json
 import structlog
-from datetime import datetime
+from datetime import date, datetime
 
 from src.services.forecasting_service import ForecastingService
+from src.utils.response_formats import (
+    ARROW_MEDIA_TYPE,
+    BATCH_MEDIA_TYPES,
+    arrow_product_stream,
+    columnar_json,
+    forecast_response,
+    layout_for,
+    negotiate,
+)
 
 router = APIRouter()
 logger = structlog.get_logger(__name__)
@@ -18,6 +29,17 @@ logger = structlog.get_logger(__name__)
 class ForecastRequest(BaseModel):
     horizon: int = 30  # Days to forecast
     algo: str = "prophet"  # "prophet" or "xgboost"
+    quantiles: Optional[List[float]] = None  # e.g. [0.1, 0.5, 0.9]; product forecasts only
+
+
+class BatchForecastRequest(BaseModel):
+    product_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    horizon: int = 30
+    algo: str = "prophet"
+
+
+MAX_BATCH_PRODUCTS = 50000
 
 
 class ForecastResponse(BaseModel):
@@ -32,7 +54,7 @@ forecast_service = ForecastingService()
 
 
 @router.post("/demand")
-async def forecast_demand(request: ForecastRequest):
+async def forecast_demand(request: ForecastRequest, accept: Optional[str] = Header(None)):
     """
     Forecast demand for products
     
@@ -41,30 +63,34 @@ async def forecast_demand(request: ForecastRequest):
         algo: Algorithm to use ('prophet' or 'xgboost')
         
     Returns:
-        Demand forecast with dates and predicted values
+        Demand forecast with dates and predicted values. Send
+        `Accept: application/vnd.easy11.forecast.columnar+json` for parallel arrays
+        or `Accept: application/vnd.apache.arrow.stream` for Arrow IPC.
     """
+    # Validate inputs
+    if request.horizon < 1 or request.horizon > 365:
+        raise HTTPException(
+            status_code=400,
+            detail="Horizon must be between 1 and 365 days"
+        )
+
+    if request.algo not in ["prophet", "xgboost"]:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid algorithm. Use 'prophet' or 'xgboost'"
+        )
+
     try:
         logger.info("Forecasting demand", horizon=request.horizon, algo=request.algo)
         
-        # Validate inputs
-        if request.horizon < 1 or request.horizon > 365:
-            raise HTTPException(
-                status_code=400,
-                detail="Horizon must be between 1 and 365 days"
-            )
-        
-        if request.algo not in ["prophet", "xgboost"]:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid algorithm. Use 'prophet' or 'xgboost'"
-            )
-        
+        media_type = negotiate(accept)
         forecast = await forecast_service.forecast_demand(
             horizon=request.horizon,
-            algorithm=request.algo
+            algorithm=request.algo,
+            layout=layout_for(media_type),
         )
         
-        return forecast
+        return forecast_response(forecast, media_type)
         
     except Exception as e:
         logger.error("Error forecasting demand", error=str(e))
@@ -72,7 +98,7 @@ async def forecast_demand(request: ForecastRequest):
 
 
 @router.post("/product/{product_id}")
-async def forecast_product(product_id: str, request: ForecastRequest):
+async def forecast_product(product_id: str, request: ForecastRequest, accept: Optional[str] = Header(None)):
     """
     Forecast demand for a specific product
     
@@ -80,20 +106,30 @@ async def forecast_product(product_id: str, request: ForecastRequest):
         product_id: Product identifier
         horizon: Number of days to forecast
         algo: Algorithm to use
+        quantiles: Optional demand quantiles (0-1) to add as per-day `p10`/`p50`/... paths
         
     Returns:
-        Product-specific demand forecast
+        Product-specific demand forecast (same content negotiation as /demand). The
+        restock recommendation is sized from bootstrapped lead-time demand quantiles.
     """
+    if request.horizon < 1 or request.horizon > 365:
+        raise HTTPException(status_code=400, detail="Horizon must be between 1 and 365 days")
+    if request.quantiles and not all(0 < level < 1 for level in request.quantiles):
+        raise HTTPException(status_code=400, detail="Quantiles must lie strictly between 0 and 1")
+
     try:
         logger.info("Forecasting product demand", product_id=product_id, horizon=request.horizon)
         
+        media_type = negotiate(accept)
         forecast = await forecast_service.forecast_product(
             product_id=product_id,
             horizon=request.horizon,
-            algorithm=request.algo
+            algorithm=request.algo,
+            layout=layout_for(media_type),
+            quantiles=request.quantiles,
         )
         
-        return forecast
+        return forecast_response(forecast, media_type)
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -102,21 +138,87 @@ async def forecast_product(product_id: str, request: ForecastRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.post("/products/batch")
+async def forecast_products_batch(request: BatchForecastRequest, accept: Optional[str] = Header(None)):
+    """
+    Forecast demand for many products at once
+    
+    Args:
+        product_ids: Products to forecast (or use category)
+        category: Forecast every product in this category
+        horizon: Number of days to forecast
+        
+    Returns:
+        NDJSON stream with one forecast and restock recommendation per product,
+        in partition completion order. `Accept: application/vnd.easy11.forecast.columnar+x-ndjson`
+        switches each line to parallel arrays; `Accept: application/vnd.apache.arrow.stream`
+        returns an Arrow IPC stream with one row per product.
+    """
+    if request.horizon < 1 or request.horizon > 365:
+        raise HTTPException(status_code=400, detail="Horizon must be between 1 and 365 days")
+    if bool(request.product_ids) == bool(request.category):
+        raise HTTPException(status_code=400, detail="Provide either product_ids or category")
+
+    if request.category:
+        try:
+            product_ids = forecast_service.products_in_category(request.category)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    else:
+        product_ids = list(dict.fromkeys(request.product_ids))
+    if len(product_ids) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PRODUCTS} products per batch")
+
+    media_type = negotiate(accept, BATCH_MEDIA_TYPES)
+    layout = layout_for(media_type)
+    logger.info("Forecasting product batch", products=len(product_ids), horizon=request.horizon, media_type=media_type)
+    results = forecast_service.forecast_products_batch(product_ids, horizon=request.horizon, layout=layout)
+
+    if media_type == ARROW_MEDIA_TYPE:
+        return StreamingResponse(arrow_product_stream(results, request.horizon), media_type=media_type)
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            async for result in results:
+                result["algo"] = request.algo
+                if layout == "columnar":
+                    yield columnar_json(result) + b"\n"
+                else:
+                    yield (json.dumps(result) + "\n").encode("utf-8")
+        except Exception as e:
+            logger.error("Error forecasting product batch", error=str(e))
+            yield (json.dumps({"error": "Internal server error"}) + "\n").encode("utf-8")
+
+    return StreamingResponse(stream(), media_type=media_type)
+
+
 @router.get("/trends")
-async def get_trends(period: str = "30d"):
+async def get_trends(
+    period: str = "30d",
+    category: Optional[str] = None,
+    product_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
     """
     Get demand trends and patterns
     
     Args:
         period: Time period ('7d', '30d', '90d', '1y')
+        category: Optional category; defaults to total demand
+        product_id: Optional product (takes precedence over category)
+        start: Optional first day of an arbitrary range (overrides period)
+        end: Optional last day of the range; defaults to the latest indexed day
         
     Returns:
-        Trend analysis with patterns and seasonality
+        Growth vs the preceding window, window totals, peak/trough days, and seasonality
     """
     try:
-        logger.info("Getting demand trends", period=period)
+        logger.info("Getting demand trends", period=period, category=category, product_id=product_id)
         
-        trends = await forecast_service.get_trends(period=period)
+        trends = await forecast_service.get_trends(
+            period=period, category=category, product_id=product_id, start=start, end=end
+        )
         
         return trends
         
@@ -2,17 +2,26 @@
 Generative AI endpoints for marketing content.
 """
 
-from typing import List, Optional
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import structlog
 
-from src.services.content_service import content_service
+from src.services.content_service import CAMPAIGN_CONCURRENCY, CAMPAIGN_ITEM_TIMEOUT_SEC, content_service
+from src.utils.response_formats import JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE, negotiate
 
 router = APIRouter()
 logger = structlog.get_logger(__name__)
 
+SSE_MEDIA_TYPE = "text/event-stream"
+CONTENT_MEDIA_TYPES = (JSON_MEDIA_TYPE, SSE_MEDIA_TYPE)
+# Proxies (nginx) would otherwise buffer the stream and defeat time-to-first-section.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+MAX_CAMPAIGN_ITEMS = 200
+
 
 class MarketingContentRequest(BaseModel):
     topic: str = Field(..., min_length=3, description="Campaign topic or theme")
@@ -23,23 +32,89 @@ class MarketingContentRequest(BaseModel):
     target_audience: str = Field("customers", description="customers | vendors | general")
 
 
+class CampaignContentRequest(BaseModel):
+    items: List[MarketingContentRequest]
+    concurrency: Optional[int] = Field(None, ge=1, description="Lower the server's concurrency limit")
+    item_timeout_sec: Optional[float] = Field(None, gt=0, description="Lower the server's per-item timeout")
+
+
 @router.post("/marketing/content")
-async def generate_marketing_content(request: MarketingContentRequest):
+async def generate_marketing_content(request: MarketingContentRequest, accept: Optional[str] = Header(None)):
     """
     Generate marketing long-form copy + multi-channel variations.
+
+    `Accept: text/event-stream` streams the content as server-sent events instead: `outline`, one
+    `section` per long-form section, one `channel_variation` per channel, then `done` with the meta
+    fields (or `error`). Each event's data is one JSON object.
     """
+    if negotiate(accept, CONTENT_MEDIA_TYPES) == SSE_MEDIA_TYPE:
+        events = content_service.stream_marketing_content(**_content_kwargs(request))
+        return StreamingResponse(_sse_stream(events), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
     try:
-        result = await content_service.generate_marketing_content(
-            topic=request.topic,
-            keywords=request.keywords or [],
-            tone=request.tone,
-            length=request.length,
-            include_examples=request.include_examples,
-            target_audience=request.target_audience,
-        )
+        result = await content_service.generate_marketing_content(**_content_kwargs(request))
         return result
     except Exception as exc:  # pragma: no cover
         logger.error("Failed to generate marketing content", error=str(exc))
         raise HTTPException(status_code=500, detail="Unable to generate content at this time.")
 
 
+@router.post("/marketing/campaign")
+async def generate_campaign_content(request: CampaignContentRequest):
+    """
+    Generate marketing content for every item of a campaign concurrently.
+
+    Args:
+        items: Content requests (at most MAX_CAMPAIGN_ITEMS), same fields as /marketing/content
+        concurrency: Items generated at once (capped at CONTENT_CAMPAIGN_CONCURRENCY)
+        item_timeout_sec: Per-item deadline (capped at CONTENT_CAMPAIGN_ITEM_TIMEOUT_SEC)
+
+    Returns:
+        NDJSON stream with one line per item in completion order: `index` into `items`, `topic`,
+        `elapsed_ms`, `status` (ok | timeout | error) and `content` (or `error`).
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Provide at least one item")
+    if len(request.items) > MAX_CAMPAIGN_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CAMPAIGN_ITEMS} items per campaign")
+
+    results = content_service.generate_campaign(
+        [_content_kwargs(item) for item in request.items],
+        concurrency=min(request.concurrency or CAMPAIGN_CONCURRENCY, CAMPAIGN_CONCURRENCY),
+        item_timeout=min(request.item_timeout_sec or CAMPAIGN_ITEM_TIMEOUT_SEC, CAMPAIGN_ITEM_TIMEOUT_SEC),
+    )
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            async for result in results:
+                yield (json.dumps(result) + "\n").encode("utf-8")
+        except Exception as exc:
+            logger.error("Error generating campaign content", error=str(exc))
+            yield (json.dumps({"error": "Internal server error"}) + "\n").encode("utf-8")
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _content_kwargs(request: MarketingContentRequest) -> Dict[str, Any]:
+    return {
+        "topic": request.topic,
+        "keywords": request.keywords or [],
+        "tone": request.tone,
+        "length": request.length,
+        "include_examples": request.include_examples,
+        "target_audience": request.target_audience,
+    }
+
+
+async def _sse_stream(events: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    try:
+        async for event, data in events:
+            yield _sse_event(event, data)
+    except Exception as exc:
+        logger.error("Failed to stream marketing content", error=str(exc))
+        yield _sse_event("error", {"error": "Unable to generate content at this time."})
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    # json.dumps escapes newlines, so every payload fits on a single `data:` line.
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
@@ -3,13 +3,17 @@ Easy11 ML Service - FastAPI Application
 Provides ML endpoints for recommendations, churn prediction, and forecasting
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import os
 import structlog
 
 from src.api import recommendations, churn, forecasting, pricing, generative, governance
+from src.startup import readiness, warm_up
 from src.utils.logger import setup_logging
+from src.utils.metrics import CONTENT_TYPE_LATEST, render_metrics
 
 # Setup structured logging
 setup_logging()
@@ -22,17 +26,17 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 ML Service starting up...")
     
-    # Initialize models (load from MLflow or train if needed)
-    try:
-        # Load models here
-        logger.info("✅ ML models loaded successfully")
-    except Exception as e:
-        logger.error("❌ Failed to load ML models", error=str(e))
+    # Load model artifacts and feature views, then warm every endpoint; /health reports 503 until done
+    startup = asyncio.create_task(warm_up(app))
     
     yield
     
     # Shutdown
     logger.info("🛑 ML Service shutting down...")
+    startup.cancel()
+    with suppress(asyncio.CancelledError):
+        await startup
+    forecasting.forecast_service.shutdown()
 
 
 # Initialize FastAPI app
@@ -75,6 +79,7 @@ async def root():
             "generative": "/api/v1/generative",
             "governance": "/api/v1/governance",
             "health": "/health",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
@@ -82,15 +87,26 @@ async def root():
 
 # Health check
 @app.get("/health")
-async def health_check():
-    """Detailed health check"""
+async def health_check(response: Response):
+    """Readiness check: 503 while artifacts load and endpoints warm up, then per-component status"""
+    if not readiness.ready:
+        response.status_code = 503
     return {
-        "status": "healthy",
+        **readiness.snapshot(),
         "service": "ml-service",
         "version": "1.0.0"
     }
 
 
+# Prometheus metrics (feature retrieval latency, fallbacks, cache outcomes)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    if os.getenv("ENABLE_PROMETHEUS", "true").lower() != "true":
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Include routers
 app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["Recommendations"])
 app.include_router(churn.router, prefix="/api/v1/churn", tags=["Churn Prediction"])
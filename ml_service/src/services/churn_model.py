@@ -0,0 +1,290 @@
+"""
+Churn Model
+Gradient-boosted churn classifier over the RFM features of the `user_behavior_metrics` feature view.
+
+The retrain flow runs `train`, which fits an XGBoost booster on a labelled export (one row per user
+with the feature columns below plus a 0/1 `churned` column) and publishes it under `CHURN_MODEL_DIR`:
+
+    model.json          XGBoost booster (`Booster.save_model` JSON)
+    metadata.json       model version, feature order, per-feature reference values and holdout metrics
+    trees-<version>/    the booster compiled to flat .npy node arrays plus TreeSHAP tables (tree_ensemble)
+
+Serving memory-maps `trees-<version>/` and walks the trees with numpy, so it needs neither xgboost nor a
+booster per worker; a model published without one is compiled from model.json on first load. Until a
+booster is published the service scores with a fixed logistic RFM scorecard. Both models take the same
+(users × features) matrix and are scored in one vectorized call. Key factors are SHAP values: exact
+path-dependent TreeSHAP for the trees, or coefficient × (value − reference) for the scorecard.
+
+Usage:
+    python -m src.services.churn_model train [--data PATH] [--output-dir DIR] [--rounds 300]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from src.services.tree_ensemble import (
+    COMPILED_MANIFEST,
+    CompiledTrees,
+    TreeEnsemble,
+    TreeShapExplainer,
+    load_compiled,
+    save_compiled,
+)
+
+try:
+    import xgboost as xgb  # type: ignore
+except Exception:  # pragma: no cover - optional dependency safeguard
+    xgb = None  # type: ignore
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+CHURN_MODEL_DIR = Path(os.getenv("CHURN_MODEL_DIR", str(BASE_DIR / "artifacts" / "churn")))
+CHURN_TRAINING_PATH = Path(
+    os.getenv("CHURN_TRAINING_PATH", str(BASE_DIR / "feature_store" / "data" / "churn_training.parquet"))
+)
+MODEL_FILE = "model.json"
+METADATA_FILE = "metadata.json"
+COMPILED_PREFIX = "trees-"
+KEEP_COMPILED = 2
+LABEL_COLUMN = "churned"
+
+# Column order of the scoring matrix; names match the user_behavior_metrics feature view.
+CHURN_FEATURES = ("orders_last_30d", "total_orders", "avg_order_value", "lifetime_value_score", "rfm_score")
+FEATURE_LABELS = {
+    "orders_last_30d": "Recent Activity",
+    "total_orders": "Order Frequency",
+    "avg_order_value": "Order Value",
+    "lifetime_value_score": "Lifetime Value",
+    "rfm_score": "RFM Score",
+}
+# Values imputed for missing scorecard features, and the profile its key factors are measured against.
+DEFAULT_PROFILE = {
+    "orders_last_30d": 2.0,
+    "total_orders": 12.0,
+    "avg_order_value": 148.0,
+    "lifetime_value_score": 0.62,
+    "rfm_score": 0.58,
+}
+# Scorecard log-odds per unit of each feature; the intercept puts the default profile at 25% churn.
+SCORECARD_COEFFICIENTS = {
+    "orders_last_30d": -0.45,
+    "total_orders": -0.04,
+    "avg_order_value": -0.002,
+    "lifetime_value_score": -1.2,
+    "rfm_score": -2.0,
+}
+SCORECARD_INTERCEPT = 2.48
+SCORECARD_VERSION = "churn-rfm-scorecard-v1"
+
+BOOSTER_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "auc",
+    "max_depth": 4,
+    "eta": 0.1,
+    "subsample": 0.8,
+    "min_child_weight": 5,
+    "tree_method": "hist",
+}
+
+
+@dataclass
+class ChurnModel:
+    """The published trees or the fallback scorecard, scored on (users × CHURN_FEATURES) matrices."""
+
+    version: str
+    features: Sequence[str]
+    reference: np.ndarray  # (features,) typical profile: scorecard imputation and attribution baseline
+    metrics: Optional[Dict[str, float]] = None
+    trees: Optional[CompiledTrees] = None
+    explainer: Optional[TreeShapExplainer] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.trees is not None
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        """Churn probability per row; NaN features follow the booster's learned missing-value branches."""
+        if self.trees is not None:
+            return self.trees.predict_proba(matrix)
+        coefficients = np.array([SCORECARD_COEFFICIENTS[name] for name in self.features])
+        filled = np.where(np.isnan(matrix), self.reference, matrix)
+        return 1.0 / (1.0 + np.exp(-(SCORECARD_INTERCEPT + filled @ coefficients)))
+
+    def contributions(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        (rows × features) SHAP attributions in probability points: positive raises churn risk, and a row's
+        values sum to its churn probability minus the model's baseline probability.
+
+        SHAP values are additive in log-odds; each row's are rescaled by (p − p₀) / (margin − margin₀) so
+        they add up in probability space too, with ranking and signs unchanged.
+        """
+        if self.explainer is not None:
+            shap = self.explainer.shap_values(matrix)
+            base = self.explainer.expected_value
+        else:
+            coefficients = np.array([SCORECARD_COEFFICIENTS[name] for name in self.features])
+            filled = np.where(np.isnan(matrix), self.reference, matrix)
+            shap = (filled - self.reference) * coefficients
+            base = SCORECARD_INTERCEPT + float(self.reference @ coefficients)
+        delta = shap.sum(axis=1)
+        probability = 1.0 / (1.0 + np.exp(-(base + delta)))
+        base_probability = 1.0 / (1.0 + np.exp(-base))
+        flat = np.abs(delta) < 1e-9
+        slope = (probability - base_probability) / np.where(flat, 1.0, delta)
+        scale = np.where(flat, probability * (1.0 - probability), slope)
+        return shap * scale[:, None]
+
+    @classmethod
+    def scorecard(cls) -> "ChurnModel":
+        return cls(
+            version=SCORECARD_VERSION,
+            features=CHURN_FEATURES,
+            reference=np.array([DEFAULT_PROFILE[name] for name in CHURN_FEATURES]),
+        )
+
+
+def load_churn_model(root: Path = CHURN_MODEL_DIR) -> ChurnModel:
+    """The published trees (memory-mapped, compiled on first use), or the scorecard when there are none."""
+    if not (root / MODEL_FILE).exists():
+        logger.info("No trained churn model published; scoring with the RFM scorecard", path=str(root))
+        return ChurnModel.scorecard()
+    metadata = json.loads((root / METADATA_FILE).read_text())
+    compiled = root / f"{COMPILED_PREFIX}{metadata['version']}"
+    if not (compiled / COMPILED_MANIFEST).exists():
+        compile_churn_model(TreeEnsemble.from_file(root / MODEL_FILE), compiled)
+    trees, explainer = load_compiled(compiled)
+    logger.info("Loaded churn model", version=metadata["version"], trees=len(trees.roots), path=str(compiled))
+    return ChurnModel(
+        version=metadata["version"],
+        features=metadata["features"],
+        reference=np.array(metadata["reference"], dtype=np.float64),
+        metrics=metadata["metrics"],
+        trees=trees,
+        explainer=explainer,
+    )
+
+
+def compile_churn_model(ensemble: TreeEnsemble, path: Path) -> None:
+    save_compiled(path, CompiledTrees.from_ensemble(ensemble), TreeShapExplainer.from_ensemble(ensemble))
+    logger.info("Compiled churn model", trees=len(ensemble), nodes=int(ensemble.feature.shape[0]), path=str(path))
+
+
+def train_churn_model(
+    training_path: Path = CHURN_TRAINING_PATH,
+    root: Path = CHURN_MODEL_DIR,
+    rounds: int = 300,
+    holdout: float = 0.2,
+    seed: int = 7,
+) -> Dict[str, Any]:
+    """Fit the booster with early stopping on a random holdout, then publish it with its holdout metrics."""
+    if xgb is None:
+        raise RuntimeError("xgboost is required to train the churn model")
+    import pandas as pd
+
+    frame = pd.read_parquet(training_path, columns=[*CHURN_FEATURES, LABEL_COLUMN])
+    matrix = frame[list(CHURN_FEATURES)].to_numpy(dtype=np.float32)
+    labels = frame[LABEL_COLUMN].to_numpy(dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    is_holdout = rng.random(len(frame)) < holdout
+    train = xgb.DMatrix(matrix[~is_holdout], label=labels[~is_holdout], feature_names=list(CHURN_FEATURES))
+    valid = xgb.DMatrix(matrix[is_holdout], label=labels[is_holdout], feature_names=list(CHURN_FEATURES))
+    booster = xgb.train(
+        {**BOOSTER_PARAMS, "seed": seed},
+        train,
+        num_boost_round=rounds,
+        evals=[(valid, "holdout")],
+        early_stopping_rounds=25,
+        verbose_eval=False,
+    )
+    best = booster[: booster.best_iteration + 1]
+    metrics = classification_metrics(labels[is_holdout], best.inplace_predict(matrix[is_holdout]))
+
+    version = f"churn-xgboost-{datetime.utcnow():%Y%m%dT%H%M%S}"
+    metadata = {
+        "version": version,
+        "trained_at": datetime.utcnow().isoformat(),
+        "features": list(CHURN_FEATURES),
+        "reference": np.nanmedian(matrix, axis=0).astype(np.float64).tolist(),
+        "rows": int(len(frame)),
+        "holdout_rows": int(is_holdout.sum()),
+        "rounds": int(booster.best_iteration + 1),
+        "metrics": metrics,
+    }
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_model = root / f".{MODEL_FILE}.tmp"
+    best.save_model(str(tmp_model))
+    # Compiled before the version is published, so workers never compile it themselves.
+    compile_churn_model(TreeEnsemble.from_file(tmp_model), root / f"{COMPILED_PREFIX}{version}")
+    os.replace(tmp_model, root / MODEL_FILE)
+    tmp_metadata = root / f".{METADATA_FILE}.tmp"
+    tmp_metadata.write_text(json.dumps(metadata, indent=2))
+    os.replace(tmp_metadata, root / METADATA_FILE)
+    _prune_compiled(root, keep=KEEP_COMPILED)
+    logger.info("Published churn model", version=version, auc=metrics["auc"], rows=metadata["rows"])
+    return metadata
+
+
+def _prune_compiled(root: Path, keep: int) -> None:
+    # Workers still mapping an older model keep their pages; unlinking only drops the names.
+    compiled = sorted(path for path in root.glob(f"{COMPILED_PREFIX}*") if path.is_dir())
+    for stale in compiled[:-keep]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def classification_metrics(labels: np.ndarray, scores: np.ndarray, threshold: float = 0.5) -> Dict[str, float]:
+    """AUC (rank statistic, ties averaged) plus accuracy / precision / recall / F1 at `threshold`."""
+    labels = labels.astype(bool)
+    predicted = scores >= threshold
+    ranks = np.empty(len(scores))
+    order = np.argsort(scores, kind="mergesort")
+    ranks[order] = np.arange(1, len(scores) + 1)
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    ranks = (np.bincount(inverse, weights=ranks) / counts)[inverse]
+    positives, negatives = int(labels.sum()), int((~labels).sum())
+    auc = 0.0
+    if positives and negatives:
+        auc = (ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives)
+    true_positive = int((predicted & labels).sum())
+    precision = true_positive / max(int(predicted.sum()), 1)
+    recall = true_positive / max(positives, 1)
+    return {
+        "auc": round(float(auc), 4),
+        "accuracy": round(float((predicted == labels).mean()), 4),
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1_score": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Churn model maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    train = subcommands.add_parser("train", help="Fit the churn booster on the labelled export and publish it")
+    train.add_argument("--data", default=str(CHURN_TRAINING_PATH), help="Parquet with RFM features and `churned`")
+    train.add_argument("--output-dir", default=str(CHURN_MODEL_DIR))
+    train.add_argument("--rounds", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        if not Path(args.data).exists():
+            # Nothing to learn from yet: keep serving the current model (or the scorecard).
+            print(json.dumps({"status": "skipped", "reason": f"training export missing: {args.data}"}))
+            return
+        metadata = train_churn_model(Path(args.data), Path(args.output_dir), rounds=args.rounds)
+        print(json.dumps({"status": "trained", **{key: metadata[key] for key in ("version", "rows", "rounds", "metrics")}}))
+
+
+if __name__ == "__main__":
+    main()
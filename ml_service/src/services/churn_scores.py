@@ -0,0 +1,219 @@
+"""
+Churn Score Index
+Every customer's churn probability, sorted by score, so at-risk queries are a binary search plus a slice.
+
+The nightly retrain flow runs `build`, which scores the whole user_behavior_metrics source in chunks and
+publishes one version directory:
+
+    manifest.json     data_version, scored_at, model version, user count and risk-level counts
+    scores.npy        float32 (users,) churn probabilities in ascending order
+    id_offsets.npy    int64 (users + 1,) byte offsets of each user id in ids.bin (same order as scores)
+    ids.bin           utf-8 user ids, concatenated
+
+Everything is memory-mapped: a page of `limit` customers touches `limit` scores and ids, whatever the
+customer count. `CURRENT` names the live version and is swapped atomically; the previous version is kept
+so cursors issued against it keep paging until the next refresh.
+
+Usage:
+    python -m src.services.churn_scores build [--output-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+CHURN_SCORE_DIR = Path(os.getenv("CHURN_SCORE_DIR", str(BASE_DIR / "artifacts" / "churn_scores")))
+CURRENT_POINTER = "CURRENT"
+KEEP_VERSIONS = 2
+
+
+class ChurnScoreSnapshot:
+    """One published score index (or an in-memory one built by the service)."""
+
+    def __init__(self, manifest: Dict[str, Any], scores: np.ndarray, id_offsets: np.ndarray, ids: np.ndarray):
+        self.manifest = manifest
+        self.data_version: str = manifest["data_version"]
+        self.scored_at = datetime.fromisoformat(manifest["scored_at"])
+        self.model_version: str = manifest["model_version"]
+        self._scores = scores
+        self._id_offsets = id_offsets
+        self._ids = ids
+
+    @classmethod
+    def load(cls, path: Path) -> "ChurnScoreSnapshot":
+        return cls(
+            json.loads((path / "manifest.json").read_text()),
+            np.load(path / "scores.npy", mmap_mode="r"),
+            np.load(path / "id_offsets.npy", mmap_mode="r"),
+            np.memmap(path / "ids.bin", dtype=np.uint8, mode="r") if (path / "ids.bin").stat().st_size else np.empty(0, np.uint8),
+        )
+
+    @classmethod
+    def from_scores(cls, user_ids: pa.Array, scores: np.ndarray, manifest: Dict[str, Any]) -> "ChurnScoreSnapshot":
+        order, offsets, ids = _sorted_columns(user_ids, scores)
+        return cls(manifest, scores[order].astype(np.float32), offsets, ids)
+
+    def __len__(self) -> int:
+        return self._scores.shape[0]
+
+    def count_at_least(self, threshold: float) -> int:
+        return len(self) - int(np.searchsorted(self._scores, np.float32(threshold), side="left"))
+
+    def page(self, threshold: float, offset: int, limit: int) -> List[Tuple[str, float]]:
+        """Customers ranked `offset` .. `offset + limit` (highest score first) among those scoring ≥ `threshold`."""
+        end = len(self) - offset
+        start = max(len(self) - self.count_at_least(threshold), end - limit)
+        if start >= end:
+            return []
+        offsets = np.asarray(self._id_offsets[start : end + 1])
+        blob = bytes(self._ids[offsets[0] : offsets[-1]])
+        base = offsets[0]
+        rows = [
+            (blob[offsets[idx] - base : offsets[idx + 1] - base].decode("utf-8"), float(score))
+            for idx, score in enumerate(np.asarray(self._scores[start:end]).tolist())
+        ]
+        return rows[::-1]
+
+
+class ChurnScoreIndex:
+    """Reader that follows the `CURRENT` pointer; superseded versions stay readable for open cursors."""
+
+    def __init__(self, root: Path = CHURN_SCORE_DIR, check_interval_sec: float = 1.0):
+        self.root = root
+        self._check_interval = check_interval_sec
+        self._last_check = 0.0
+        self._pointer_mtime: Optional[float] = None
+        self._snapshot: Optional[ChurnScoreSnapshot] = None
+        self._previous: Optional[ChurnScoreSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[ChurnScoreSnapshot]:
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval:
+            return self._snapshot
+        with self._lock:
+            self._last_check = now
+            pointer = self.root / CURRENT_POINTER
+            try:
+                mtime = pointer.stat().st_mtime
+            except OSError:
+                self._snapshot, self._pointer_mtime = None, None
+                return None
+            if mtime != self._pointer_mtime:
+                try:
+                    snapshot = ChurnScoreSnapshot.load(self.root / pointer.read_text().strip())
+                    self._previous, self._snapshot = self._snapshot, snapshot
+                    self._pointer_mtime = mtime
+                    logger.info("Loaded churn score index", data_version=snapshot.data_version, users=len(snapshot))
+                except (OSError, ValueError, KeyError) as exc:
+                    logger.warning("Churn score index unreadable", error=str(exc))
+            return self._snapshot
+
+    def version(self, data_version: str) -> Optional[ChurnScoreSnapshot]:
+        """A specific version: the current one, the one it replaced, or any version still on disk."""
+        current = self.current()
+        for snapshot in (current, self._previous):
+            if snapshot is not None and snapshot.data_version == data_version:
+                return snapshot
+        path = self.root / data_version
+        if data_version and path.parent == self.root and (path / "manifest.json").exists():
+            return ChurnScoreSnapshot.load(path)
+        return None
+
+
+def encode_cursor(data_version: str, threshold: float, offset: int) -> str:
+    payload = json.dumps({"v": data_version, "t": threshold, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, float, int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(payload["v"]), float(payload["t"]), int(payload["o"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def write_churn_scores(
+    user_ids: pa.Array,
+    scores: np.ndarray,
+    manifest: Dict[str, Any],
+    root: Path = CHURN_SCORE_DIR,
+) -> Path:
+    """Write a new version directory (sorted by score) and atomically point `CURRENT` at it."""
+    data_version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    version_dir = root / data_version
+    version_dir.mkdir(parents=True, exist_ok=False)
+
+    order, offsets, ids = _sorted_columns(user_ids, scores)
+    np.save(version_dir / "scores.npy", scores[order].astype(np.float32))
+    np.save(version_dir / "id_offsets.npy", offsets)
+    ids.tofile(version_dir / "ids.bin")
+    (version_dir / "manifest.json").write_text(json.dumps({"data_version": data_version, **manifest}, indent=2))
+
+    tmp_pointer = root / f"{CURRENT_POINTER}.tmp"
+    tmp_pointer.write_text(data_version)
+    os.replace(tmp_pointer, root / CURRENT_POINTER)
+    _prune_versions(root, keep=KEEP_VERSIONS)
+    logger.info("Published churn score index", data_version=data_version, users=len(scores), path=str(version_dir))
+    return version_dir
+
+
+def _sorted_columns(user_ids: pa.Array, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Ascending score order plus the ids in that order as (int64 offsets, utf-8 bytes), without a Python loop."""
+    order = np.argsort(scores, kind="stable")
+    ids = pa.concat_arrays([user_ids]) if isinstance(user_ids, pa.Array) else pa.array(user_ids)
+    ids = ids.cast(pa.large_string()).take(pa.array(order))
+    _, offset_buffer, data_buffer = ids.buffers()
+    offsets = np.frombuffer(offset_buffer, dtype=np.int64)[ids.offset : ids.offset + len(ids) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.empty(0, np.uint8)
+    data = data[offsets[0] : offsets[-1]] if len(offsets) else data[:0]
+    return order, (offsets - offsets[0]).astype(np.int64), data.copy()
+
+
+def _prune_versions(root: Path, keep: int) -> None:
+    # Readers that still map an older version keep their pages; unlinking only drops the names.
+    versions: List[Path] = sorted(path for path in root.iterdir() if path.is_dir())
+    for stale in versions[:-keep]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Churn score index maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Score every customer and publish a new sorted index")
+    build.add_argument("--output-dir", default=str(CHURN_SCORE_DIR))
+    args = parser.parse_args()
+
+    from src.services.churn_service import ChurnService
+
+    if args.command == "build":
+        try:
+            version_dir = ChurnService().build_score_index(Path(args.output_dir))
+        except FileNotFoundError as exc:
+            # No user features exported yet: keep serving the current index.
+            print(json.dumps({"status": "skipped", "reason": f"user features missing: {exc}"}))
+            return
+        manifest = json.loads((version_dir / "manifest.json").read_text())
+        keys = ("data_version", "model_version", "users", "risk_levels", "elapsed_sec")
+        print(json.dumps({"status": "published", **{key: manifest[key] for key in keys}}))
+
+
+if __name__ == "__main__":
+    main()
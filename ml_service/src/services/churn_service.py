@@ -3,19 +3,113 @@ Churn Prediction Service
 Implements XGBoost-based customer churn prediction with RFM features
 """
 
-from typing import List, Dict, Any, Optional
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import structlog
 
+from src.services.churn_model import CHURN_FEATURES, FEATURE_LABELS, load_churn_model
+from src.services.churn_scores import (
+    CHURN_SCORE_DIR,
+    ChurnScoreIndex,
+    ChurnScoreSnapshot,
+    decode_cursor,
+    encode_cursor,
+    write_churn_scores,
+)
+from src.services.embedded_online_store import ONLINE_STORE_BACKEND, EmbeddedOnlineStore
+from src.services.feature_cache import FEATURE_STORE_PATH, online_feature_cache, preload_feature_view
+from src.services.feature_snapshots import FeatureSnapshotLoader, FeatureSnapshotStore
+from src.utils.metrics import record_feature_fallback, track_feature_retrieval
+
+try:
+    from feast import FeatureStore  # type: ignore
+except Exception:  # pragma: no cover - optional dependency safeguard
+    FeatureStore = None  # type: ignore
+
 logger = structlog.get_logger(__name__)
 
+METRICS_SERVICE = "churn"
+USER_VIEW = "user_behavior_metrics"
+KEY_FACTORS = 3
+HIGH_RISK_THRESHOLD = 0.7
+MEDIUM_RISK_THRESHOLD = 0.4
+# Rows scored per call when the whole customer base is scored for the at-risk index.
+SCORE_CHUNK_ROWS = 65536
+# Wait before rescoring after a failed in-memory score index build.
+LIVE_SCORES_RETRY_SEC = float(os.getenv("CHURN_LIVE_SCORES_RETRY_SEC", "60"))
+# Key factors kept per (user, model version); 0 disables the cache.
+ATTRIBUTION_CACHE_SIZE = int(os.getenv("CHURN_ATTRIBUTION_CACHE_SIZE", "100000"))
+
+
+class AttributionCache:
+    """LRU of key factors per (user, model version), valid only while the user's feature row is unchanged."""
+
+    def __init__(self, max_entries: int = ATTRIBUTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, model_version: str, row: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        key = (user_id, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != row.tobytes():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, user_id: str, model_version: str, row: np.ndarray, top: np.ndarray, impacts: np.ndarray) -> None:
+        key = (user_id, model_version)
+        with self._lock:
+            self._entries[key] = (row.tobytes(), top, impacts)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def evict(self, user_ids: Iterable[str]) -> None:
+        wanted = set(user_ids)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in wanted]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class ChurnService:
     """Service for predicting customer churn"""
-    
+
     def __init__(self):
-        self.model_version = "v1.0.0"
-        logger.info("Initialized ChurnService")
-    
+        self.model = load_churn_model()
+        self.model_version = self.model.version
+        self._feature_store = self._init_feature_store()
+        self._score_index = ChurnScoreIndex(CHURN_SCORE_DIR)
+        self._live_scores: Optional[ChurnScoreSnapshot] = None
+        self._live_scores_date: Optional[date] = None
+        self._live_scores_retry_at = 0.0
+        self._live_scores_lock = threading.Lock()
+        self._attributions = AttributionCache()
+        logger.info(
+            "Initialized ChurnService",
+            model_version=self.model_version,
+            trained=self.model.trained,
+            feature_store_ready=self._feature_store is not None,
+        )
+
     async def predict(
         self,
         user_id: Optional[str] = None,
@@ -23,75 +117,315 @@ class ChurnService:
     ) -> Dict[str, Any]:
         """
         Predict churn probability for a customer
-        
+
         Args:
             user_id: User identifier
             features: Customer features (if user_id not provided)
-            
+
         Returns:
             Churn prediction with probability and risk factors
         """
         logger.info("Predicting churn", user_id=user_id)
-        
-        # TODO: Implement actual churn prediction
-        # For now, return mock prediction
-        churn_probability = 0.25  # Mock value
-        
-        risk_level = "low"
-        if churn_probability >= 0.7:
-            risk_level = "high"
-        elif churn_probability >= 0.4:
-            risk_level = "medium"
-        
-        key_factors = [
-            {"factor": "Recent Activity", "impact": -0.15},
-            {"factor": "Order Frequency", "impact": -0.10},
-            {"factor": "Support Tickets", "impact": 0.20}
-        ]
-        
-        return {
-            "user_id": user_id or "unknown",
-            "churn_probability": churn_probability,
-            "risk_level": risk_level,
-            "key_factors": key_factors
-        }
-    
+
+        if features is not None:
+            matrix = self._matrix_from_features([features])
+            return self._score([user_id or "unknown"], matrix)[0]
+        return (await self.predict_batch([user_id]))[user_id]
+
+    async def predict_batch(self, user_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Predict churn for many customers in one pass
+
+        All users' features are fetched with one online-store call, stacked into a
+        (users × features) matrix and scored, key factors included, in vectorized calls.
+
+        Args:
+            user_ids: User identifiers
+
+        Returns:
+            Predictions keyed by user_id (duplicates collapse to one entry)
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        # to_thread carries the request context (metrics skip startup warm-up traffic through it).
+        return await asyncio.to_thread(self._predict_batch, user_ids)
+
     async def get_at_risk_customers(
         self,
         limit: int = 100,
-        threshold: float = 0.7
-    ) -> List[Dict[str, Any]]:
+        threshold: float = 0.7,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Get list of at-risk customers
-        
+        Get at-risk customers, highest churn probability first
+
+        Served from the score-sorted index published by the nightly scoring job: the number of
+        customers at or above `threshold` is one binary search and a page is one slice, so the
+        cost does not grow with the customer base. Without a published index, the service scores
+        every customer once a day in memory.
+
         Args:
-            limit: Maximum number of customers
+            limit: Maximum number of customers per page
             threshold: Minimum churn probability
-            
+            cursor: `next_cursor` from the previous page; pages stay on the index version they started on
+
         Returns:
-            List of at-risk customers
+            Page of customers plus the total above threshold, the index version and the next cursor
         """
-        logger.info("Getting at-risk customers", limit=limit, threshold=threshold)
-        
-        # TODO: Implement actual query
-        # For now, return mock data
-        return [
-            {
-                "user_id": f"user-{i}",
-                "churn_probability": 0.85 - i * 0.01,
-                "risk_level": "high"
-            }
-            for i in range(min(limit, 10))
-        ]
-    
+        logger.info("Getting at-risk customers", limit=limit, threshold=threshold, paged=cursor is not None)
+
+        offset = 0
+        if cursor:
+            data_version, cursor_threshold, offset = decode_cursor(cursor)
+            if cursor_threshold != threshold:
+                raise ValueError("Cursor was issued for a different threshold")
+            snapshot = self._score_snapshot(data_version)
+            if snapshot is None:
+                raise ValueError("Cursor has expired: churn scores were refreshed; restart from the first page")
+        else:
+            snapshot = self._score_snapshot()
+            if snapshot is None:
+                loop = asyncio.get_event_loop()
+                snapshot = await loop.run_in_executor(None, self._get_live_scores)
+
+        if snapshot is None:
+            return {"customers": [], "total": 0, "next_cursor": None, "data_version": None, "scored_at": None}
+
+        total = snapshot.count_at_least(threshold)
+        rows = snapshot.page(threshold, offset, limit)
+        next_offset = offset + len(rows)
+        return {
+            "customers": [
+                {"user_id": user_id, "churn_probability": round(score, 4), "risk_level": _risk_level(score)}
+                for user_id, score in rows
+            ],
+            "total": total,
+            "next_cursor": encode_cursor(snapshot.data_version, threshold, next_offset) if next_offset < total else None,
+            "data_version": snapshot.data_version,
+            "scored_at": snapshot.scored_at.isoformat(),
+        }
+
+    def build_score_index(self, root: Path = CHURN_SCORE_DIR) -> Path:
+        """Score every customer and publish the score-sorted index the at-risk query reads."""
+        user_ids, scores, manifest = self._score_all_customers()
+        return write_churn_scores(user_ids, scores, manifest, root)
+
+    def forget_users(self, user_ids: Iterable[str]) -> None:
+        """Drop the cached key factors of `user_ids` (e.g. the startup warm-up users)."""
+        self._attributions.evict(user_ids)
+
+    def load_artifacts(self) -> Dict[str, Any]:
+        """Open the score index (or build the day's live one) and the user feature view ahead of traffic."""
+        if self._feature_store is not None:
+            preload_feature_view(self._feature_store, USER_VIEW, list(CHURN_FEATURES), "user_id")
+        index = self._score_index.current() or self._get_live_scores()
+        return {
+            "model_version": self.model_version,
+            "trained": self.model.trained,
+            "score_index": index.data_version if index is not None else None,
+            "feature_store_ready": self._feature_store is not None,
+        }
+
     def get_metrics(self) -> Dict[str, Any]:
-        """Get churn model performance metrics"""
+        """Get churn model performance metrics (null until a trained model is published)"""
+        metrics = self.model.metrics or {}
         return {
-            "auc": 0.83,
-            "accuracy": 0.78,
-            "precision": 0.75,
-            "recall": 0.72,
-            "f1_score": 0.73,
+            "auc": metrics.get("auc"),
+            "accuracy": metrics.get("accuracy"),
+            "precision": metrics.get("precision"),
+            "recall": metrics.get("recall"),
+            "f1_score": metrics.get("f1_score"),
             "model_version": self.model_version
         }
 
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _init_feature_store(self) -> Optional["FeatureStore"]:
+        if ONLINE_STORE_BACKEND == "embedded":
+            return EmbeddedOnlineStore()
+        if ONLINE_STORE_BACKEND == "snapshot":
+            return FeatureSnapshotStore()
+
+        if FeatureStore is None:
+            logger.warning("Feast not available - churn features fall back to defaults")
+            return None
+
+        try:
+            if FEATURE_STORE_PATH.exists():
+                store = FeatureStore(repo_path=str(FEATURE_STORE_PATH))
+                store.list_feature_views()
+                return store
+            logger.warning("Feature store directory missing", path=str(FEATURE_STORE_PATH))
+        except Exception as exc:  # pragma: no cover - depends on infrastructure
+            logger.warning("Unable to initialize Feast feature store", error=str(exc))
+        return None
+
+    def _score_snapshot(self, data_version: Optional[str] = None) -> Optional[ChurnScoreSnapshot]:
+        live = self._live_scores
+        if data_version is None:
+            return self._score_index.current()
+        if live is not None and live.data_version == data_version:
+            return live
+        return self._score_index.version(data_version)
+
+    def _get_live_scores(self) -> Optional[ChurnScoreSnapshot]:
+        """
+        Score index built in memory (once per day) when the nightly job hasn't published one.
+
+        A failed build keeps serving the previous index, if any, and is retried after LIVE_SCORES_RETRY_SEC.
+        """
+        with self._live_scores_lock:
+            today = date.today()
+            if self._live_scores_date != today and time.monotonic() >= self._live_scores_retry_at:
+                try:
+                    user_ids, scores, manifest = self._score_all_customers()
+                    manifest["data_version"] = f"live-{today:%Y%m%d}"
+                    self._live_scores = ChurnScoreSnapshot.from_scores(user_ids, scores, manifest)
+                    self._live_scores_date = today
+                except Exception as exc:  # pragma: no cover - depends on the offline source
+                    logger.warning(
+                        "Unable to score customers for the at-risk index",
+                        error=str(exc),
+                        retry_in_sec=LIVE_SCORES_RETRY_SEC,
+                    )
+                    self._live_scores_retry_at = time.monotonic() + LIVE_SCORES_RETRY_SEC
+            return self._live_scores
+
+    def _score_all_customers(self) -> Tuple[pa.Array, np.ndarray, Dict[str, Any]]:
+        """Latest feature row of every customer in the offline source, scored in SCORE_CHUNK_ROWS chunks."""
+        started = time.perf_counter()
+        loader = getattr(self._feature_store, "loader", None) or FeatureSnapshotLoader()
+        snapshot = loader.load(USER_VIEW, columns=list(CHURN_FEATURES))
+        table = snapshot.table.take(pa.array(np.sort(snapshot.rows)))
+
+        scores = np.empty(table.num_rows)
+        for start in range(0, table.num_rows, SCORE_CHUNK_ROWS):
+            chunk = table.slice(start, SCORE_CHUNK_ROWS)
+            matrix = np.full((chunk.num_rows, len(CHURN_FEATURES)), np.nan)
+            for col, name in enumerate(CHURN_FEATURES):
+                if name in chunk.column_names:
+                    matrix[:, col] = pc.cast(chunk.column(name), pa.float64()).to_numpy()  # nulls -> NaN
+            scores[start : start + chunk.num_rows] = self.model.predict_proba(matrix)
+
+        user_ids = table.column(snapshot.join_key).combine_chunks()
+        manifest = {
+            "scored_at": datetime.utcnow().isoformat(),
+            "model_version": self.model_version,
+            "source": snapshot.source,
+            "users": int(table.num_rows),
+            "risk_levels": {
+                "high": int((scores >= HIGH_RISK_THRESHOLD).sum()),
+                "medium": int(((scores >= MEDIUM_RISK_THRESHOLD) & (scores < HIGH_RISK_THRESHOLD)).sum()),
+                "low": int((scores < MEDIUM_RISK_THRESHOLD).sum()),
+            },
+            "elapsed_sec": round(time.perf_counter() - started, 3),
+        }
+        logger.info("Scored all customers", users=manifest["users"], elapsed_sec=manifest["elapsed_sec"])
+        return user_ids, scores, manifest
+
+    def _predict_batch(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return dict(zip(user_ids, self._score(user_ids, self._feature_matrix(user_ids))))
+
+    def _feature_matrix(self, user_ids: List[str]) -> np.ndarray:
+        """(users × CHURN_FEATURES) from one online-store call; NaN where a value is missing."""
+        matrix = np.full((len(user_ids), len(CHURN_FEATURES)), np.nan)
+        if not self._feature_store:
+            record_feature_fallback(METRICS_SERVICE, USER_VIEW, "store_unavailable", len(user_ids))
+            return matrix
+
+        try:
+            with track_feature_retrieval(METRICS_SERVICE, USER_VIEW, entities=len(user_ids)):
+                columns = online_feature_cache.get_online_features(
+                    self._feature_store,
+                    features=[f"{USER_VIEW}:{name}" for name in CHURN_FEATURES],
+                    entity_rows=[{"user_id": user_id} for user_id in user_ids],
+                )
+                for col, name in enumerate(CHURN_FEATURES):
+                    values = columns.get(f"{USER_VIEW}__{name}")
+                    if values is not None:
+                        matrix[:, col] = np.array(values, dtype=np.float64)  # None -> NaN
+                missing = int(np.isnan(matrix).sum())
+                if missing:
+                    record_feature_fallback(METRICS_SERVICE, USER_VIEW, "missing_value", missing)
+        except Exception as exc:  # pragma: no cover - depends on Feast availability
+            record_feature_fallback(METRICS_SERVICE, USER_VIEW, "error", len(user_ids))
+            logger.warning("Failed to fetch churn features, using defaults", users=len(user_ids), error=str(exc))
+        return matrix
+
+    @staticmethod
+    def _matrix_from_features(rows: List[Dict[str, Any]]) -> np.ndarray:
+        return np.array(
+            [[row.get(name) for name in CHURN_FEATURES] for row in rows], dtype=np.float64
+        ).reshape(len(rows), len(CHURN_FEATURES))
+
+    def _score(self, user_ids: List[str], matrix: np.ndarray) -> List[Dict[str, Any]]:
+        probabilities = self.model.predict_proba(matrix)
+        factor_index, impacts = self._key_factors(user_ids, matrix)
+        risk_levels = np.where(
+            probabilities >= HIGH_RISK_THRESHOLD,
+            "high",
+            np.where(probabilities >= MEDIUM_RISK_THRESHOLD, "medium", "low"),
+        )
+        # A user with no feature row is scored on the reference profile, which no feature explains.
+        has_features = (~np.isnan(matrix)).any(axis=1)
+        labels = [FEATURE_LABELS[name] for name in CHURN_FEATURES]
+        return [
+            {
+                "user_id": user_id or "unknown",
+                "churn_probability": round(probability, 4),
+                "risk_level": risk_level,
+                "key_factors": [
+                    {"factor": labels[col], "impact": round(impact, 4) + 0.0}  # + 0.0 turns -0.0 into 0.0
+                    for col, impact in zip(columns, row_impacts)
+                ]
+                if known
+                else [],
+            }
+            for user_id, probability, risk_level, columns, row_impacts, known in zip(
+                user_ids,
+                probabilities.tolist(),
+                risk_levels.tolist(),
+                factor_index.tolist(),
+                impacts.tolist(),
+                has_features.tolist(),
+            )
+        ]
+
+    def _key_factors(self, user_ids: List[str], matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top KEY_FACTORS features per user by absolute SHAP attribution (positive impact = the feature
+        raises churn risk), in probability points.
+
+        Attributions for all cache misses come from one batched call; results are cached per
+        (user, model version) and reused while the user's feature row is unchanged.
+        """
+        n, n_features = matrix.shape
+        factors = min(KEY_FACTORS, n_features)
+        top = np.zeros((n, factors), dtype=np.int64)
+        impacts = np.zeros((n, factors))
+        use_cache = self._attributions.max_entries > 0
+        misses = []
+        for row, user_id in enumerate(user_ids):
+            cached = self._attributions.get(user_id, self.model_version, matrix[row]) if use_cache else None
+            if cached is None:
+                misses.append(row)
+            else:
+                top[row], impacts[row] = cached
+        if not misses:
+            return top, impacts
+
+        contributions = self.model.contributions(matrix[misses])
+        miss_top = np.argsort(-np.abs(contributions), axis=1, kind="stable")[:, :factors]
+        top[misses] = miss_top
+        impacts[misses] = np.take_along_axis(contributions, miss_top, axis=1)
+        if use_cache:
+            for row in misses:
+                key = (user_ids[row], self.model_version, matrix[row])
+                self._attributions.put(*key, top[row].copy(), impacts[row].copy())
+        return top, impacts
+
+
+def _risk_level(probability: float) -> str:
+    if probability >= HIGH_RISK_THRESHOLD:
+        return "high"
+    return "medium" if probability >= MEDIUM_RISK_THRESHOLD else "low"
@@ -5,21 +5,141 @@ Simulates generative AI outputs for marketing copy, blog posts, and multi-channe
 
 from __future__ import annotations
 
+import asyncio
+import os
 import random
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from textwrap import dedent
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+# Generated bodies kept per normalized (topic, tone, length, audience, include_examples); 0 disables the cache.
+CONTENT_CACHE_SIZE = int(os.getenv("CONTENT_CACHE_SIZE", "1024"))
+# Campaign batches: items generated at once, and each item's deadline (time spent queued for a slot excluded).
+CAMPAIGN_CONCURRENCY = int(os.getenv("CONTENT_CAMPAIGN_CONCURRENCY", "8"))
+CAMPAIGN_ITEM_TIMEOUT_SEC = float(os.getenv("CONTENT_CAMPAIGN_ITEM_TIMEOUT_SEC", "30"))
+
+# Templates are dedented and split once at import; a request only fills in `str.format` fields.
+TITLE_SUFFIXES = {
+    "friendly": "that Customers Love",
+    "professional": "for Scaled Commerce Teams",
+    "playful": "with a WOW Factor",
+    "technical": "Engineered for Revenue Teams",
+}
+DEFAULT_TITLE_SUFFIX = "that Converts"
+WORD_COUNTS = {"short": 650, "long": 1200}
+DEFAULT_WORD_COUNT = 900
+OUTLINE_TEMPLATES = (
+    "Why {topic_title} matters for {audience}",
+    "Audience pain points & opportunity matrix",
+    "Signature Easy11 differentiators",
+    "Campaign ideas & activation plan",
+    "Success metrics and next steps",
+)
+SECTION_TEMPLATE = dedent(
+    """
+    ## {heading}
+
+    {tone_label} insight: {topic_title} accelerates adoption by aligning merchandising,
+    retention, and campaign automation. Easy11 surfaces the exact signals that show when
+    to launch, what to feature, and how to personalize offers.
+    """
+).strip()
+EXAMPLE_BLOCK = dedent(
+    """
+
+    **Example activation:** Launch a segmented email journey with dynamic product
+    blocks, then retarget high-intent shoppers via push notifications that highlight
+    inventory freshness and loyalty rewards.
+    """
+)
+CONCLUSION = dedent(
+    """
+    ## Bring it to life
+
+    Ship this playbook via the Easy11 Command Center: align the brief, sync the campaign, and
+    launch with full attribution tracking. Activate referrals, loyalty boosts, and post-purchase
+    flows to keep the momentum compounding.
+    """
+).strip()
+CHANNEL_TEMPLATES: Tuple[Dict[str, str], ...] = (
+    {
+        "channel": "email",
+        "headline": "{topic_title} — Ready in One Click",
+        "subheadline": "Your weekly growth play is pre-written and pre-personalized.",
+        "body": (
+            "Hi there,\n\nYour shoppers are signalling fresh intent. "
+            "Use this {tone} sequence to spotlight trending products, "
+            "tight inventory, and loyalty boosts.\n\nPreview the journey today."
+        ),
+        "call_to_action": "{cta}",
+    },
+    {
+        "channel": "sms",
+        "headline": "{short_title} → Live in minutes",
+        "body": (
+            "{topic_title} is live. Tap to drop AI-personalized offers before your "
+            "competition does. Easy11 keeps attribution clean."
+        ),
+        "call_to_action": "{cta}",
+    },
+    {
+        "channel": "social",
+        "headline": "{topic_title} Playbook",
+        "body": (
+            "Merchants using Easy11 see +18% lift after launching this play. "
+            "Personalize, launch, measure—without heavy lifting."
+        ),
+        "call_to_action": "#Easy11Growth",
+    },
+)
+
+ContentKey = Tuple[str, str, str, str, bool]
+
+
+class ContentCache:
+    """LRU of generated response bodies; entries are shared, so callers copy before changing them."""
+
+    def __init__(self, max_entries: int = CONTENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[ContentKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: ContentKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: ContentKey, body: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class ContentService:
     """Generative content service returning rich marketing collateral."""
 
     def __init__(self):
         self.model_version = "gpt-marketing-suite-v0.9"
+        self._bodies = ContentCache()
         logger.info("Initialized ContentService", model_version=self.model_version)
 
     async def generate_marketing_content(
@@ -39,42 +159,142 @@ class ContentService:
             target=target_audience,
         )
 
-        outline = self._create_outline(topic, target_audience)
-        content = self._create_long_form_content(topic, outline, tone, include_examples)
-        channel_variations = self._create_channel_variations(topic, tone, target_audience)
+        # Every generated field depends on the topic only through .title()/.lower(), so the case-folded,
+        # whitespace-collapsed topic is a complete key and repeats are a dictionary lookup.
+        topic = " ".join(topic.split())
+        key = (topic.lower(), tone, length, target_audience, include_examples)
+        body = self._bodies.get(key)
+        if body is None:
+            body = self._render_body(topic, tone, length, include_examples, target_audience)
+            self._bodies.put(key, body)
+
         seo_score = 82 + random.randint(-5, 7)
+        return {
+            **body,
+            "suggested_keywords": self._suggest_keywords(topic, keywords),
+            "seo_score": min(max(seo_score, 65), 98),
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+        }
 
-        response = {
+    async def stream_marketing_content(
+        self,
+        topic: str,
+        keywords: List[str],
+        tone: str,
+        length: str,
+        include_examples: bool,
+        target_audience: str,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Generate the same content as `generate_marketing_content` as (event, data) pairs, piece by piece.
+
+        Emits `outline` (title and outline), one `section` per long-form section, one `channel_variation`
+        per channel and finally `done` with the meta fields. Each piece is rendered when it is about to be
+        sent and never accumulated, so a stream holds at most one section; it bypasses the body cache.
+        """
+        logger.info(
+            "Streaming marketing content",
+            topic=topic,
+            tone=tone,
+            length=length,
+            target=target_audience,
+        )
+        topic = " ".join(topic.split())
+        outline = self._create_outline(topic, target_audience)
+        yield "outline", {
             "title": self._compose_title(topic, tone),
             "outline": outline,
-            "content": content,
+            "tone": tone,
+            "length": length,
+            "target_audience": target_audience,
+            "model_version": self.model_version,
+        }
+        for index, section in enumerate(self._iter_sections(topic, outline, tone, include_examples)):
+            await asyncio.sleep(0)
+            yield "section", {"index": index, "content": section}
+        for variation in self._iter_channel_variations(topic, tone, target_audience):
+            await asyncio.sleep(0)
+            yield "channel_variation", variation
+
+        seo_score = 82 + random.randint(-5, 7)
+        yield "done", {
             "meta_title": self._compose_meta_title(topic),
             "meta_description": self._compose_meta_description(topic, target_audience),
             "suggested_keywords": self._suggest_keywords(topic, keywords),
             "seo_score": min(max(seo_score, 65), 98),
-            "estimated_word_count": 650 if length == "short" else 1200 if length == "long" else 900,
+            "estimated_word_count": WORD_COUNTS.get(length, DEFAULT_WORD_COUNT),
             "generated_at": datetime.utcnow().isoformat() + "Z",
+            "image_prompt": self._image_prompt(topic, tone, target_audience),
+        }
+
+    async def generate_campaign(
+        self,
+        items: Sequence[Dict[str, Any]],
+        concurrency: int = CAMPAIGN_CONCURRENCY,
+        item_timeout: float = CAMPAIGN_ITEM_TIMEOUT_SEC,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate content for many requests concurrently, yielding each result as it finishes.
+
+        At most `concurrency` items generate at once; an item that runs longer than `item_timeout` seconds
+        is cancelled and reported with status `timeout`, and one that raises with status `error`, without
+        affecting the rest. Every result carries the item's `index` in `items`. Closing the iterator
+        early cancels whatever is still queued or running.
+        """
+        logger.info("Generating campaign content", items=len(items), concurrency=concurrency)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def generate(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            async with slots:
+                start = asyncio.get_running_loop().time()
+                try:
+                    content = await asyncio.wait_for(self.generate_marketing_content(**item), item_timeout)
+                    result: Dict[str, Any] = {"status": "ok", "content": content}
+                except asyncio.TimeoutError:
+                    result = {"status": "timeout", "error": f"Generation exceeded {item_timeout:g}s"}
+                except Exception as exc:
+                    logger.warning("Campaign item failed", index=index, topic=item.get("topic"), error=str(exc))
+                    result = {"status": "error", "error": "Unable to generate content at this time."}
+                elapsed = asyncio.get_running_loop().time() - start
+            return {"index": index, "topic": item.get("topic"), "elapsed_ms": round(elapsed * 1000, 2), **result}
+
+        pending = [asyncio.ensure_future(generate(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                yield await next_done
+        finally:
+            for future in pending:
+                future.cancel()
+
+    # ------------------------------------------------------------------
+    # Helper methods
+    # ------------------------------------------------------------------
+    def _render_body(
+        self, topic: str, tone: str, length: str, include_examples: bool, target_audience: str
+    ) -> Dict[str, Any]:
+        """Everything but the per-request fields, in response order (those are filled in by the caller)."""
+        outline = self._create_outline(topic, target_audience)
+        return {
+            "title": self._compose_title(topic, tone),
+            "outline": outline,
+            "content": self._create_long_form_content(topic, outline, tone, include_examples),
+            "meta_title": self._compose_meta_title(topic),
+            "meta_description": self._compose_meta_description(topic, target_audience),
+            "suggested_keywords": None,
+            "seo_score": None,
+            "estimated_word_count": WORD_COUNTS.get(length, DEFAULT_WORD_COUNT),
+            "generated_at": None,
             "tone": tone,
             "length": length,
             "target_audience": target_audience,
-            "channel_variations": channel_variations,
+            "channel_variations": self._create_channel_variations(topic, tone, target_audience),
             "image_prompt": self._image_prompt(topic, tone, target_audience),
             "model_version": self.model_version,
         }
-        return response
 
-    # ------------------------------------------------------------------
-    # Helper methods
-    # ------------------------------------------------------------------
     @staticmethod
     def _compose_title(topic: str, tone: str) -> str:
-        suffix = {
-            "friendly": "that Customers Love",
-            "professional": "for Scaled Commerce Teams",
-            "playful": "with a WOW Factor",
-            "technical": "Engineered for Revenue Teams",
-        }.get(tone, "that Converts")
-        return f"{topic.title()} {suffix}"
+        return f"{topic.title()} {TITLE_SUFFIXES.get(tone, DEFAULT_TITLE_SUFFIX)}"
 
     @staticmethod
     def _compose_meta_title(topic: str) -> str:
@@ -89,89 +309,41 @@ class ContentService:
 
     @staticmethod
     def _create_outline(topic: str, audience: str) -> List[str]:
-        return [
-            f"Why {topic.title()} matters for {audience}",
-            "Audience pain points & opportunity matrix",
-            "Signature Easy11 differentiators",
-            "Campaign ideas & activation plan",
-            "Success metrics and next steps",
-        ]
+        topic_title = topic.title()
+        return [template.format(topic_title=topic_title, audience=audience) for template in OUTLINE_TEMPLATES]
+
+    @classmethod
+    def _create_long_form_content(cls, topic: str, outline: List[str], tone: str, include_examples: bool) -> str:
+        return "\n\n".join(cls._iter_sections(topic, outline, tone, include_examples))
 
     @staticmethod
-    def _create_long_form_content(topic: str, outline: List[str], tone: str, include_examples: bool) -> str:
-        tone_label = tone.title()
-        sections = []
+    def _iter_sections(topic: str, outline: List[str], tone: str, include_examples: bool) -> Iterator[str]:
+        """Long-form sections in order: one per outline item, then the conclusion."""
+        tone_label, topic_title = tone.title(), topic.title()
+        example = EXAMPLE_BLOCK if include_examples else ""
         for item in outline:
-            paragraph = dedent(
-                f"""
-                ## {item}
-
-                {tone_label} insight: {topic.title()} accelerates adoption by aligning merchandising,
-                retention, and campaign automation. Easy11 surfaces the exact signals that show when
-                to launch, what to feature, and how to personalize offers.
-                """
-            ).strip()
-            if include_examples:
-                paragraph += dedent(
-                    """
-
-                    **Example activation:** Launch a segmented email journey with dynamic product
-                    blocks, then retarget high-intent shoppers via push notifications that highlight
-                    inventory freshness and loyalty rewards.
-                    """
-                )
-            sections.append(paragraph)
-        conclusion = dedent(
-            """
-            ## Bring it to life
-
-            Ship this playbook via the Easy11 Command Center: align the brief, sync the campaign, and
-            launch with full attribution tracking. Activate referrals, loyalty boosts, and post-purchase
-            flows to keep the momentum compounding.
-            """
-        ).strip()
-        sections.append(conclusion)
-        return "\n\n".join(sections)
+            yield SECTION_TEMPLATE.format(heading=item, tone_label=tone_label, topic_title=topic_title) + example
+        yield CONCLUSION
 
     @staticmethod
     def _suggest_keywords(topic: str, keywords: List[str]) -> List[str]:
         base = [topic.lower(), f"{topic.lower()} strategy", "commerce ai", "easy11 campaigns"]
         return list(dict.fromkeys(base + keywords))
 
+    @classmethod
+    def _create_channel_variations(cls, topic: str, tone: str, audience: str) -> List[Dict[str, Any]]:
+        return list(cls._iter_channel_variations(topic, tone, audience))
+
     @staticmethod
-    def _create_channel_variations(topic: str, tone: str, audience: str) -> List[Dict[str, Any]]:
-        base_cta = "Launch with Easy11" if audience == "vendors" else "Explore Easy11"
-        return [
-            {
-                "channel": "email",
-                "headline": f"{topic.title()} — Ready in One Click",
-                "subheadline": "Your weekly growth play is pre-written and pre-personalized.",
-                "body": (
-                    "Hi there,\n\nYour shoppers are signalling fresh intent. "
-                    f"Use this {tone} sequence to spotlight trending products, "
-                    "tight inventory, and loyalty boosts.\n\nPreview the journey today."
-                ),
-                "call_to_action": base_cta,
-            },
-            {
-                "channel": "sms",
-                "headline": f"{topic[:35].title()} → Live in minutes",
-                "body": (
-                    f"{topic.title()} is live. Tap to drop AI-personalized offers before your "
-                    "competition does. Easy11 keeps attribution clean."
-                ),
-                "call_to_action": base_cta,
-            },
-            {
-                "channel": "social",
-                "headline": f"{topic.title()} Playbook",
-                "body": (
-                    "Merchants using Easy11 see +18% lift after launching this play. "
-                    "Personalize, launch, measure—without heavy lifting."
-                ),
-                "call_to_action": "#Easy11Growth",
-            },
-        ]
+    def _iter_channel_variations(topic: str, tone: str, audience: str) -> Iterator[Dict[str, Any]]:
+        fields = {
+            "topic_title": topic.title(),
+            "short_title": topic[:35].title(),
+            "tone": tone,
+            "cta": "Launch with Easy11" if audience == "vendors" else "Explore Easy11",
+        }
+        for template in CHANNEL_TEMPLATES:
+            yield {name: value.format(**fields) for name, value in template.items()}
 
     @staticmethod
     def _image_prompt(topic: str, tone: str, audience: str) -> str:
@@ -182,5 +354,3 @@ class ContentService:
 
 
 content_service = ContentService()
-
-
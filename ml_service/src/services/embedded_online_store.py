@@ -0,0 +1,391 @@
+"""
+Embedded Online Store
+File-backed alternative to the Feast Postgres online store: one compact key-value file per feature
+view, memory-mapped for reads and replaced atomically on each materialization.
+
+File layout (little endian, sections 8-byte aligned):
+    magic (8 bytes) | header length (uint32) | JSON header
+    hashes      uint64[rows]              sorted blake2b-64 of the entity key
+    key_offsets uint64[rows + 1]          offsets into the key blob
+    event_ts    int64[rows]               feature row event timestamp (epoch seconds)
+    values      float64[rows, features]   NaN marks a missing value; the header keeps each feature's source
+                                          dtype so lookups return ints as ints
+    keys        utf-8 blob                entity keys, used to resolve hash collisions
+
+Usage:
+    python -m src.services.embedded_online_store materialize [--output-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from src.services.feature_cache import FEATURE_STORE_PATH, FEATURE_VIEW_TTLS
+
+logger = structlog.get_logger(__name__)
+
+ONLINE_STORE_BACKEND = os.getenv("FEATURE_ONLINE_STORE", "feast").lower()
+EMBEDDED_STORE_DIR = Path(os.getenv("EMBEDDED_ONLINE_STORE_DIR", str(FEATURE_STORE_PATH / "data" / "online")))
+
+MAGIC = b"E11KV\x00\x00\x01"
+FILE_SUFFIX = ".kv"
+
+
+@dataclass(frozen=True)
+class EmbeddedViewSpec:
+    join_key: str
+    source_path: str
+    features: Sequence[str]
+
+
+# Mirrors feature_store/feature_views and feature_store/sources.py (paths are relative to the Feast repo).
+EMBEDDED_VIEW_SPECS: Dict[str, EmbeddedViewSpec] = {
+    "user_behavior_metrics": EmbeddedViewSpec(
+        join_key="user_id",
+        source_path="data/user_behavior_features.parquet",
+        features=("orders_last_30d", "total_orders", "avg_order_value", "lifetime_value_score", "rfm_score"),
+    ),
+    "product_performance_metrics": EmbeddedViewSpec(
+        join_key="product_id",
+        source_path="data/product_performance_features.parquet",
+        features=("views_7d", "add_to_cart_7d", "orders_7d", "conversion_rate", "return_rate", "stock_velocity"),
+    ),
+    "vendor_operations_metrics": EmbeddedViewSpec(
+        join_key="vendor_id",
+        source_path="data/vendor_operations_features.parquet",
+        features=(
+            "gmv_7d",
+            "net_revenue_7d",
+            "refund_rate_30d",
+            "on_time_fulfillment_rate",
+            "churn_risk_score",
+            "active_products",
+        ),
+    ),
+}
+
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _python_cast(dtype: np.dtype) -> Any:
+    """Python type matching what Feast returns for a feature stored with `dtype`."""
+    if dtype.kind == "b":
+        return bool
+    if dtype.kind in "iu":
+        return int
+    return float
+
+
+def write_feature_view_file(
+    path: Path,
+    feature_view: str,
+    join_key: str,
+    features: Sequence[str],
+    keys: Sequence[str],
+    values: np.ndarray,
+    event_ts: np.ndarray,
+    dtypes: Optional[Sequence[str]] = None,
+) -> Path:
+    """
+    Write one feature view to `path`, replacing any previous file atomically.
+
+    Args:
+        path: Destination `.kv` file
+        feature_view: Feature view name recorded in the header
+        join_key: Entity join key column (e.g. "product_id")
+        features: Feature names, one per column of `values`
+        keys: Entity key per row
+        values: float64 matrix of shape (rows, features)
+        event_ts: Event timestamp per row in epoch seconds
+        dtypes: Source numpy dtype name per feature (default float64), restored on lookup
+
+    Returns:
+        Path of the written file
+    """
+    keys = [str(key) for key in keys]
+    hashes = np.fromiter((_key_hash(key) for key in keys), dtype=np.uint64, count=len(keys))
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    values = np.ascontiguousarray(np.asarray(values, dtype=np.float64).reshape(len(keys), len(features))[order])
+    event_ts = np.ascontiguousarray(np.asarray(event_ts, dtype=np.int64)[order])
+    encoded = [keys[idx].encode("utf-8") for idx in order]
+    key_offsets = np.zeros(len(keys) + 1, dtype=np.uint64)
+    np.cumsum([len(key) for key in encoded], out=key_offsets[1:])
+
+    sections = [
+        ("hashes", hashes.tobytes()),
+        ("key_offsets", key_offsets.tobytes()),
+        ("event_ts", event_ts.tobytes()),
+        ("values", values.tobytes()),
+        ("keys", b"".join(encoded)),
+    ]
+    header = {
+        "feature_view": feature_view,
+        "join_key": join_key,
+        "features": list(features),
+        "dtypes": list(dtypes) if dtypes is not None else ["float64"] * len(features),
+        "rows": len(keys),
+        "written_at": datetime.now(timezone.utc).isoformat(),
+        "sections": {},
+    }
+    # Section offsets depend on the header length, so size the header with placeholder offsets first.
+    header["sections"] = {name: [0, len(payload)] for name, payload in sections}
+    header_len = len(json.dumps(header).encode("utf-8")) + 256
+    offset = _align(len(MAGIC) + 4 + header_len)
+    for name, payload in sections:
+        header["sections"][name] = [offset, len(payload)]
+        offset = _align(offset + len(payload))
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as handle:
+        handle.write(MAGIC)
+        handle.write(len(header_bytes).to_bytes(4, "little"))
+        handle.write(header_bytes)
+        for name, payload in sections:
+            handle.seek(header["sections"][name][0])
+            handle.write(payload)
+        handle.truncate(offset)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+class EmbeddedFeatureViewFile:
+    """Read-only memory-mapped view over one `.kv` file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as handle:
+            stat = os.fstat(handle.fileno())
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an embedded online store file")
+        header_len = int.from_bytes(self._mmap[len(MAGIC) : len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(self._mmap[start : start + header_len]).decode("utf-8"))
+        self.features: List[str] = self.header["features"]
+        self.rows: int = self.header["rows"]
+        self._feature_index = {name: idx for idx, name in enumerate(self.features)}
+        # Files written before dtypes were recorded hold float features only.
+        dtypes = self.header.get("dtypes") or ["float64"] * len(self.features)
+        self._casts = [_python_cast(np.dtype(dtype)) for dtype in dtypes]
+
+        sections = self.header["sections"]
+        self._hashes = self._section(sections["hashes"], np.uint64)
+        self._key_offsets = self._section(sections["key_offsets"], np.uint64)
+        self._event_ts = self._section(sections["event_ts"], np.int64)
+        self._values = self._section(sections["values"], np.float64).reshape(self.rows, len(self.features))
+        self._keys_start = sections["keys"][0]
+
+    def _section(self, section: List[int], dtype: Any) -> np.ndarray:
+        offset, length = section
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def find(self, key: str) -> int:
+        """Row index for `key`, or -1 when absent."""
+        target = _key_hash(key)
+        encoded = key.encode("utf-8")
+        idx = int(np.searchsorted(self._hashes, np.uint64(target)))
+        while idx < self.rows and int(self._hashes[idx]) == target:
+            start = self._keys_start + int(self._key_offsets[idx])
+            end = self._keys_start + int(self._key_offsets[idx + 1])
+            if self._mmap[start:end] == encoded:
+                return idx
+            idx += 1
+        return -1
+
+    def lookup(self, key: str, features: Sequence[str], min_event_ts: Optional[int] = None) -> Dict[str, Any]:
+        idx = self.find(key)
+        if idx < 0 or (min_event_ts is not None and int(self._event_ts[idx]) < min_event_ts):
+            return {feature: None for feature in features}
+        row = self._values[idx]
+        result: Dict[str, Any] = {}
+        for feature in features:
+            column = self._feature_index.get(feature)
+            value = float(row[column]) if column is not None else float("nan")
+            result[feature] = None if value != value else self._casts[column](value)
+        return result
+
+
+class _OnlineResponse:
+    """Minimal stand-in for Feast's OnlineResponse."""
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        self._columns = columns
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        return self._columns
+
+
+class EmbeddedOnlineStore:
+    """
+    Serves `get_online_features` from memory-mapped `.kv` files.
+
+    Files are re-checked at most every `reload_interval_sec`; a replaced file (new inode/mtime) is
+    re-mapped so materialization can swap data underneath running services.
+    """
+
+    # Lookups are local memory reads; batching them behind a wait window would only add latency.
+    coalesce_lookups = False
+
+    def __init__(self, directory: Path = EMBEDDED_STORE_DIR, reload_interval_sec: float = 0.5):
+        self.directory = Path(directory)
+        self.reload_interval_sec = reload_interval_sec
+        self._files: Dict[str, EmbeddedFeatureViewFile] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def list_feature_views(self) -> List[SimpleNamespace]:
+        return [self.get_feature_view(path.stem) for path in sorted(self.directory.glob(f"*{FILE_SUFFIX}"))]
+
+    def get_feature_view(self, name: str) -> SimpleNamespace:
+        view_file = self._view_file(name)
+        if view_file is None:
+            raise ValueError(f"Feature view {name} has not been materialized to {self.directory}")
+        return SimpleNamespace(
+            name=name,
+            ttl=FEATURE_VIEW_TTLS.get(name),
+            features=[SimpleNamespace(name=feature) for feature in view_file.features],
+        )
+
+    def get_online_features(
+        self,
+        features: List[str],
+        entity_rows: List[Dict[str, Any]],
+        full_feature_names: bool = False,
+    ) -> _OnlineResponse:
+        columns: Dict[str, List[Any]] = {}
+        for join_key in {name for row in entity_rows for name in row}:
+            columns[join_key] = [row.get(join_key) for row in entity_rows]
+
+        requested: Dict[str, List[str]] = {}
+        for ref in features:
+            view, feature = ref.split(":", 1)
+            requested.setdefault(view, []).append(feature)
+
+        for view, view_features in requested.items():
+            view_file = self._view_file(view)
+            ttl = FEATURE_VIEW_TTLS.get(view)
+            min_event_ts = int(time.time() - ttl.total_seconds()) if ttl else None
+            join_key = view_file.header["join_key"] if view_file else None
+            rows = [
+                view_file.lookup(str(row[join_key]), view_features, min_event_ts)
+                if view_file is not None and row.get(join_key) is not None
+                else {feature: None for feature in view_features}
+                for row in entity_rows
+            ]
+            for feature in view_features:
+                name = f"{view}__{feature}" if full_feature_names else feature
+                columns[name] = [row[feature] for row in rows]
+        return _OnlineResponse(columns)
+
+    def _view_file(self, view: str) -> Optional[EmbeddedFeatureViewFile]:
+        now = time.monotonic()
+        current = self._files.get(view)
+        if current is not None and now - self._checked_at.get(view, 0.0) < self.reload_interval_sec:
+            return current
+
+        with self._lock:
+            self._checked_at[view] = now
+            path = self.directory / f"{view}{FILE_SUFFIX}"
+            try:
+                stat = path.stat()
+            except OSError:
+                self._files.pop(view, None)
+                return None
+            if current is None or current.signature != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                # Readers holding the old mapping keep it alive until they finish.
+                current = EmbeddedFeatureViewFile(path)
+                self._files[view] = current
+                logger.info("Mapped embedded feature view", feature_view=view, rows=current.rows, path=str(path))
+            return current
+
+
+def materialize_embedded_store(
+    output_dir: Path = EMBEDDED_STORE_DIR,
+    repo_path: Path = FEATURE_STORE_PATH,
+    as_of: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Write the latest row per entity (within the view TTL) from the offline Parquet sources.
+
+    Returns:
+        Row count per materialized feature view
+    """
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    as_of = as_of or datetime.now(timezone.utc)
+    written: Dict[str, int] = {}
+    for view, spec in EMBEDDED_VIEW_SPECS.items():
+        source = Path(repo_path) / spec.source_path
+        if not source.exists():
+            logger.warning("Offline source missing; skipping embedded materialization", feature_view=view, path=str(source))
+            continue
+
+        table = pq.read_table(source, columns=[spec.join_key, "event_timestamp", *spec.features])
+        # Read dtypes from the Arrow schema: pandas turns int columns with nulls into float64.
+        dtypes = [np.dtype(table.schema.field(feature).type.to_pandas_dtype()).name for feature in spec.features]
+        frame = table.to_pandas()
+        event_ts = pd.to_datetime(frame["event_timestamp"], utc=True)
+        frame["_event_ts"] = (event_ts - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+        ttl = FEATURE_VIEW_TTLS.get(view)
+        if ttl is not None:
+            frame = frame[frame["_event_ts"] >= int((as_of - ttl).timestamp())]
+        frame = frame.sort_values("_event_ts").drop_duplicates(spec.join_key, keep="last")
+
+        write_feature_view_file(
+            Path(output_dir) / f"{view}{FILE_SUFFIX}",
+            feature_view=view,
+            join_key=spec.join_key,
+            features=spec.features,
+            keys=frame[spec.join_key].astype(str).tolist(),
+            values=frame[list(spec.features)].to_numpy(dtype=np.float64, na_value=np.nan),
+            event_ts=frame["_event_ts"].to_numpy(dtype=np.int64),
+            dtypes=dtypes,
+        )
+        written[view] = len(frame)
+        logger.info("Materialized embedded feature view", feature_view=view, rows=len(frame))
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedded online store maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    materialize = subcommands.add_parser("materialize", help="Write .kv files from the offline Parquet sources")
+    materialize.add_argument("--output-dir", default=str(EMBEDDED_STORE_DIR))
+    materialize.add_argument("--repo-path", default=str(FEATURE_STORE_PATH))
+    args = parser.parse_args()
+
+    if args.command == "materialize":
+        written = materialize_embedded_store(Path(args.output_dir), Path(args.repo_path))
+        print(json.dumps({"materialized": written}))
+
+
+if __name__ == "__main__":
+    main()
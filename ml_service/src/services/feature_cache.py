@@ -0,0 +1,308 @@
+"""
+Online Feature Cache
+Read-through L1 cache in front of Feast `get_online_features`, keyed by feature view and entity key.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from src.services.feature_loader import FeatureBatchLoader, feature_batch_loader
+from src.utils.metrics import is_warmup, record_cache_outcome, record_feature_fallback
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+FEATURE_STORE_PATH = BASE_DIR / "feature_store"
+# Written by `materialize_feature_store` in prefect_flows/etl_flow.py once Feast materialization completes.
+MATERIALIZATION_MARKER = Path(
+    os.getenv("FEATURE_CACHE_INVALIDATION_MARKER", str(FEATURE_STORE_PATH / "data" / "materialization.json"))
+)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Rows that came back all None (entities the online store doesn't know yet) are kept this long instead of the
+# view TTL, so an entity first seen between materializations is picked up soon after; 0 disables caching them.
+NEGATIVE_TTL_SEC = float(os.getenv("FEATURE_CACHE_NEGATIVE_TTL_SEC", "60"))
+# Placeholder entity for startup lookups, which go straight to the store (no cache entry, no metrics).
+WARMUP_ENTITY_ID = "__warmup__"
+
+# Mirrors the TTLs declared in feature_store/feature_views; used when the Feast registry can't be read.
+FEATURE_VIEW_TTLS: Dict[str, timedelta] = {
+    "user_behavior_metrics": timedelta(days=30),
+    "product_performance_metrics": timedelta(days=14),
+    "vendor_operations_metrics": timedelta(days=7),
+}
+
+EntityKey = Tuple[Tuple[str, Any], ...]
+
+
+@dataclass
+class _CacheEntry:
+    values: Dict[str, Any]
+    expires_at: float
+    size: int
+
+
+class OnlineFeatureCache:
+    """In-process LRU cache of online feature rows with per-view TTL expiry and a memory ceiling."""
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        marker_path: Path = MATERIALIZATION_MARKER,
+        marker_check_interval_sec: float = 1.0,
+        loader: FeatureBatchLoader = feature_batch_loader,
+    ):
+        self.max_bytes = max_bytes or int(os.getenv("FEATURE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self._marker_path = marker_path
+        self._marker_check_interval = marker_check_interval_sec
+        self._marker_mtime = self._read_marker_mtime()
+        self._last_marker_check = time.monotonic()
+        self._loader = loader
+
+        self._entries: "OrderedDict[Tuple[str, EntityKey], _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._ttls: Dict[str, float] = {}
+        self._view_features: Dict[str, List[str]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get_online_features(
+        self,
+        store: Any,
+        features: List[str],
+        entity_rows: List[Dict[str, Any]],
+    ) -> Dict[str, List[Any]]:
+        """
+        Read-through equivalent of `store.get_online_features(...).to_dict()` with full feature names.
+
+        Args:
+            store: Feast FeatureStore (or compatible) used to load misses
+            features: Feature references in `view:feature` form
+            entity_rows: Entity join key rows, e.g. [{"product_id": "prod-1"}]
+
+        Returns:
+            Column dictionary keyed by join key and `view__feature`
+        """
+        self._maybe_invalidate_from_marker()
+
+        requested: Dict[str, List[str]] = {}
+        for ref in features:
+            view, feature = ref.split(":", 1)
+            requested.setdefault(view, []).append(feature)
+
+        keys = [self._entity_key(row) for row in entity_rows]
+        result: Dict[str, List[Any]] = {}
+        for join_key in {name for row in entity_rows for name in row}:
+            result[join_key] = [row.get(join_key) for row in entity_rows]
+
+        for view, view_features in requested.items():
+            rows = self._rows_for_view(store, view, view_features, keys, entity_rows)
+            for feature in view_features:
+                result[f"{view}__{feature}"] = [row.get(feature) for row in rows]
+        return result
+
+    def invalidate(self, feature_view: Optional[str] = None) -> int:
+        """Drop cached rows for one feature view (or all of them). Returns the number of entries removed."""
+        with self._lock:
+            if feature_view is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            stale = [key for key in self._entries if key[0] == feature_view]
+            for key in stale:
+                self._bytes -= self._entries.pop(key).size
+            return len(stale)
+
+    def evict_entities(self, entity_ids: Iterable[Any]) -> int:
+        """Drop cached rows of any view whose entity key holds one of `entity_ids`. Returns the number removed."""
+        wanted = set(entity_ids)
+        with self._lock:
+            stale = [key for key in self._entries if any(value in wanted for _, value in key[1])]
+            for key in stale:
+                self._bytes -= self._entries.pop(key).size
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and eviction counters per feature view."""
+        with self._lock:
+            views = {}
+            for view, counters in self._stats.items():
+                lookups = counters["hits"] + counters["misses"]
+                views[view] = {
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                }
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "feature_views": views,
+                "loader": self._loader.stats(),
+            }
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _rows_for_view(
+        self,
+        store: Any,
+        view: str,
+        view_features: List[str],
+        keys: List[EntityKey],
+        entity_rows: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        rows: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+        missing: Dict[EntityKey, List[int]] = {}
+
+        with self._lock:
+            counters = self._counters(view)
+            hits = misses = expired = 0
+            for idx, key in enumerate(keys):
+                entry = self._entries.get((view, key))
+                if entry is not None and entry.expires_at <= now:
+                    self._bytes -= self._entries.pop((view, key)).size
+                    expired += 1
+                    entry = None
+                if entry is not None and all(feature in entry.values for feature in view_features):
+                    self._entries.move_to_end((view, key))
+                    hits += 1
+                    rows[idx] = entry.values
+                else:
+                    misses += 1
+                    missing.setdefault(key, []).append(idx)
+            if not is_warmup():
+                counters["hits"] += hits
+                counters["misses"] += misses
+                counters["expired"] += expired
+        record_cache_outcome(view, "hit", hits)
+        record_cache_outcome(view, "miss", misses)
+        record_cache_outcome(view, "expired", expired)
+
+        if missing:
+            fetch_features = self._features_to_fetch(store, view, view_features)
+            fetch_rows = [entity_rows[indices[0]] for indices in missing.values()]
+            fetched = self._loader.load(store, view, fetch_features, fetch_rows)
+
+            now = time.monotonic()
+            expires_at = now + self._ttl_seconds(store, view)
+            with self._lock:
+                for (key, indices), values in zip(missing.items(), fetched):
+                    if any(value is not None for value in values.values()):
+                        self._store_entry(view, key, values, expires_at)
+                    elif NEGATIVE_TTL_SEC > 0:
+                        self._store_entry(view, key, values, now + NEGATIVE_TTL_SEC)
+                    for idx in indices:
+                        rows[idx] = values
+
+        return [row or {} for row in rows]
+
+    def _store_entry(self, view: str, key: EntityKey, values: Dict[str, Any], expires_at: float) -> None:
+        size = self._estimate_size(key, values)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop((view, key), None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[(view, key)] = _CacheEntry(values=values, expires_at=expires_at, size=size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            (evicted_view, _), evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._counters(evicted_view)["evictions"] += 1
+            record_cache_outcome(evicted_view, "eviction")
+
+    def _features_to_fetch(self, store: Any, view: str, view_features: List[str]) -> List[str]:
+        """Load the whole view row on a miss so later requests for sibling features are hits."""
+        if view not in self._view_features:
+            try:
+                self._view_features[view] = [field.name for field in store.get_feature_view(view).features]
+            except Exception:  # pragma: no cover - depends on Feast registry availability
+                self._view_features[view] = []
+        schema = self._view_features[view]
+        return schema + [feature for feature in view_features if feature not in schema]
+
+    def _ttl_seconds(self, store: Any, view: str) -> float:
+        if view not in self._ttls:
+            ttl: Optional[timedelta] = None
+            try:
+                ttl = store.get_feature_view(view).ttl
+            except Exception:  # pragma: no cover - depends on Feast registry availability
+                pass
+            ttl = ttl or FEATURE_VIEW_TTLS.get(view) or timedelta(days=1)
+            self._ttls[view] = ttl.total_seconds()
+        return self._ttls[view]
+
+    def _counters(self, view: str) -> Dict[str, int]:
+        if view not in self._stats:
+            self._stats[view] = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        return self._stats[view]
+
+    def _maybe_invalidate_from_marker(self) -> None:
+        now = time.monotonic()
+        if now - self._last_marker_check < self._marker_check_interval:
+            return
+        self._last_marker_check = now
+        mtime = self._read_marker_mtime()
+        if mtime != self._marker_mtime:
+            self._marker_mtime = mtime
+            removed = self.invalidate()
+            logger.info("Feature materialization detected; online feature cache cleared", removed=removed)
+
+    def _read_marker_mtime(self) -> Optional[float]:
+        try:
+            return self._marker_path.stat().st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def _entity_key(row: Dict[str, Any]) -> EntityKey:
+        return tuple(sorted(row.items()))
+
+    @staticmethod
+    def _estimate_size(key: EntityKey, values: Dict[str, Any]) -> int:
+        size = sys.getsizeof(values) + sum(sys.getsizeof(name) + sys.getsizeof(value) for name, value in key)
+        size += sum(sys.getsizeof(name) + sys.getsizeof(value) for name, value in values.items())
+        return size
+
+
+def feature_value(
+    columns: Dict[str, List[Any]],
+    feature_view: str,
+    feature: str,
+    idx: int,
+    default: float,
+    service: str,
+) -> float:
+    """Read one value from `get_online_features` output, counting a fallback when it is missing."""
+    values = columns.get(f"{feature_view}__{feature}")
+    value = values[idx] if values is not None else None
+    if value is None:
+        record_feature_fallback(service, feature_view, "missing_value")
+        return default
+    return float(value)
+
+
+def preload_feature_view(store: Any, feature_view: str, features: List[str], join_key: str) -> None:
+    """Open a view's online data (snapshot columns, mapped files or the Feast connection) before traffic arrives."""
+    store.get_online_features(
+        features=[f"{feature_view}:{name}" for name in features],
+        entity_rows=[{join_key: WARMUP_ENTITY_ID}],
+    )
+
+
+online_feature_cache = OnlineFeatureCache()
@@ -0,0 +1,158 @@
+"""
+Online Feature Batch Loader
+DataLoader-style coalescing for Feast lookups: identical in-flight entity keys share one fetch and
+distinct keys arriving within a short window are merged into a single multi-entity call.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH_SIZE = 512
+
+EntityKey = Tuple[Tuple[str, Any], ...]
+BatchKey = Tuple[int, str, Tuple[str, ...]]
+
+
+@dataclass
+class _PendingBatch:
+    rows: Dict[EntityKey, Dict[str, Any]] = field(default_factory=dict)
+    futures: Dict[EntityKey, Future] = field(default_factory=dict)
+    full: threading.Event = field(default_factory=threading.Event)
+
+
+class FeatureBatchLoader:
+    """
+    Coalesces concurrent online feature lookups issued from worker threads.
+
+    The first thread to request a key for a (store, view, features) combination becomes the batch
+    leader: it waits up to `window_ms` (or until `max_batch_size` keys are queued) and then issues
+    one `get_online_features` call on behalf of every waiting thread.
+    """
+
+    def __init__(self, window_ms: Optional[float] = None, max_batch_size: Optional[int] = None):
+        if window_ms is None:
+            window_ms = float(os.getenv("FEATURE_BATCH_WINDOW_MS", DEFAULT_WINDOW_MS))
+        self.window_sec = max(window_ms, 0.0) / 1000.0
+        self.max_batch_size = max_batch_size or int(os.getenv("FEATURE_BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE))
+        self._lock = threading.Lock()
+        self._pending: Dict[BatchKey, _PendingBatch] = {}
+        self._inflight: Dict[Tuple[BatchKey, EntityKey], Future] = {}
+        self._stats = {"keys_requested": 0, "keys_coalesced": 0, "batches": 0, "rows_fetched": 0}
+
+    def load(
+        self,
+        store: Any,
+        view: str,
+        features: List[str],
+        entity_rows: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch one feature view for many entities, sharing work with concurrent callers.
+
+        Args:
+            store: Feast FeatureStore (or compatible)
+            view: Feature view name
+            features: Feature names within the view
+            entity_rows: Entity join key rows
+
+        Returns:
+            Feature values per entity row, in input order
+        """
+        if not getattr(store, "coalesce_lookups", True):
+            batch = _PendingBatch(rows={tuple(sorted(row.items())): row for row in entity_rows})
+            batch.futures = {key: Future() for key in batch.rows}
+            self._dispatch(store, view, features, None, batch)
+            return [batch.futures[tuple(sorted(row.items()))].result() for row in entity_rows]
+
+        batch_key: BatchKey = (id(store), view, tuple(features))
+        futures: List[Future] = []
+        led_batches: List[_PendingBatch] = []
+
+        with self._lock:
+            for row in entity_rows:
+                entity_key = tuple(sorted(row.items()))
+                self._stats["keys_requested"] += 1
+                future = self._inflight.get((batch_key, entity_key))
+                if future is not None:
+                    self._stats["keys_coalesced"] += 1
+                    futures.append(future)
+                    continue
+
+                batch = self._pending.get(batch_key)
+                if batch is None:
+                    batch = _PendingBatch()
+                    self._pending[batch_key] = batch
+                    led_batches.append(batch)
+                future = Future()
+                batch.rows[entity_key] = row
+                batch.futures[entity_key] = future
+                self._inflight[(batch_key, entity_key)] = future
+                if len(batch.rows) >= self.max_batch_size:
+                    # Close the batch; the next key opens a fresh one.
+                    del self._pending[batch_key]
+                    batch.full.set()
+                futures.append(future)
+
+        for batch in led_batches:
+            if self.window_sec:
+                batch.full.wait(self.window_sec)
+            with self._lock:
+                if self._pending.get(batch_key) is batch:
+                    del self._pending[batch_key]
+            self._dispatch(store, view, features, batch_key, batch)
+
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        requested = stats["keys_requested"]
+        stats["avg_batch_size"] = round(stats["rows_fetched"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["coalesced_ratio"] = round(stats["keys_coalesced"] / requested, 4) if requested else 0.0
+        return stats
+
+    def _dispatch(
+        self,
+        store: Any,
+        view: str,
+        features: List[str],
+        batch_key: Optional[BatchKey],
+        batch: _PendingBatch,
+    ) -> None:
+        keys = list(batch.rows)
+        try:
+            fetched = store.get_online_features(
+                features=[f"{view}:{feature}" for feature in features],
+                entity_rows=[batch.rows[key] for key in keys],
+                full_feature_names=True,
+            ).to_dict()
+            missing = [None] * len(keys)
+            columns = [fetched.get(f"{view}__{feature}", missing) for feature in features]
+            for position, key in enumerate(keys):
+                batch.futures[key].set_result(
+                    {feature: column[position] for feature, column in zip(features, columns)}
+                )
+        except Exception as exc:
+            logger.warning("Batched online feature fetch failed", feature_view=view, rows=len(keys), error=str(exc))
+            for key in keys:
+                batch.futures[key].set_exception(exc)
+        finally:
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["rows_fetched"] += len(keys)
+                for key in keys:
+                    if self._inflight.get((batch_key, key)) is batch.futures[key]:
+                        del self._inflight[(batch_key, key)]
+
+
+feature_batch_loader = FeatureBatchLoader()
@@ -0,0 +1,354 @@
+"""
+Feature Snapshot Loader
+Loads the offline feature sources (feature_store/sources.py) as memory-mapped Arrow tables so the
+ML service can read feature columns without copying them into Python objects.
+
+The ETL flow exports each Parquet source to an uncompressed Arrow IPC file sorted by
+`event_timestamp`. Mapping that file costs no memory up front: only the pages of the columns that
+are actually read get faulted in, and the event-time predicate becomes a zero-copy slice. When no
+export exists yet, the loader falls back to reading the Parquet source with column projection and
+the `event_timestamp` predicate pushed down to row-group statistics.
+
+Usage:
+    python -m src.services.feature_snapshots export [--output-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import structlog
+
+from src.services.embedded_online_store import EMBEDDED_VIEW_SPECS, EmbeddedViewSpec, _OnlineResponse
+from src.services.feature_cache import FEATURE_STORE_PATH, FEATURE_VIEW_TTLS
+
+logger = structlog.get_logger(__name__)
+
+SNAPSHOT_DIR = Path(os.getenv("FEATURE_SNAPSHOT_DIR", str(FEATURE_STORE_PATH / "data" / "snapshots")))
+TIMESTAMP_FIELD = "event_timestamp"
+
+
+def _source_fingerprint(source: Path) -> List[List[Any]]:
+    files = sorted(source.rglob("*.parquet")) if source.is_dir() else [source]
+    return [[str(path), path.stat().st_size, path.stat().st_mtime_ns] for path in files if path.is_file()]
+
+
+def _timestamp_scalar(field_type: pa.DataType, moment: datetime) -> pa.Scalar:
+    if getattr(field_type, "tz", None):
+        return pa.scalar(moment.astimezone(timezone.utc), type=field_type)
+    return pa.scalar(moment.astimezone(timezone.utc).replace(tzinfo=None), type=field_type)
+
+
+_UNITS_PER_SECOND = {"s": 1, "ms": 1_000, "us": 1_000_000, "ns": 1_000_000_000}
+
+
+def _epoch_seconds(column: pa.ChunkedArray) -> np.ndarray:
+    values = column.cast(pa.int64()).to_numpy()
+    if pa.types.is_timestamp(column.type):
+        return values // _UNITS_PER_SECOND[column.type.unit]
+    return values
+
+
+def _latest_rows(keys: pa.ChunkedArray, event_seconds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct non-null keys in sorted order and each one's latest row (the later row on a timestamp tie)."""
+    table = pa.table({"key": keys, "ts": event_seconds, "row": np.arange(len(event_seconds), dtype=np.int64)})
+    table = table.filter(pc.is_valid(table.column("key")))
+    order = pc.sort_indices(table, sort_keys=[("key", "ascending"), ("ts", "ascending"), ("row", "ascending")])
+    sorted_keys = table.column("key").take(order).combine_chunks()
+    rows = table.column("row").take(order).to_numpy()
+    # Each key's latest row is the last of its run in the sorted order.
+    last = np.ones(len(sorted_keys), dtype=bool)
+    if len(sorted_keys) > 1:
+        last[:-1] = pc.not_equal(sorted_keys[1:], sorted_keys[:-1]).to_numpy(zero_copy_only=False)
+    return sorted_keys.filter(pa.array(last)).to_numpy(zero_copy_only=False), rows[last]
+
+
+@dataclass
+class FeatureSnapshot:
+    """
+    Projected, time-filtered feature table plus a latest-row-per-entity index: the sorted distinct `keys`
+    and, aligned with them, the table `rows` holding each entity's latest values.
+    """
+
+    feature_view: str
+    join_key: str
+    table: pa.Table
+    keys: np.ndarray
+    rows: np.ndarray
+    source: str
+    zero_copy: bool
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    @property
+    def entities(self) -> int:
+        return len(self.keys)
+
+    def rows_for(self, keys: Sequence[Any]) -> np.ndarray:
+        """Latest row of each key (-1 where the key has none), by binary search over the sorted keys."""
+        out = np.full(len(keys), -1, dtype=np.int64)
+        if not self.entities:
+            return out
+        kind = type(self.keys[:1].tolist()[0])  # keys of any other type (or None) never match
+        present = np.array([idx for idx, key in enumerate(keys) if isinstance(key, kind)], dtype=np.int64)
+        if not present.size:
+            return out
+        query = np.array([keys[idx] for idx in present], dtype=self.keys.dtype)
+        pos = np.minimum(np.searchsorted(self.keys, query), self.entities - 1)
+        hit = np.asarray(self.keys[pos] == query, dtype=bool)
+        out[present[hit]] = self.rows[pos[hit]]
+        return out
+
+    def column(self, feature: str) -> np.ndarray:
+        """Column values as numpy; a view over the mapped file when the column has one chunk and no nulls."""
+        chunked = self.table.column(feature)
+        if chunked.num_chunks == 1 and chunked.null_count == 0:
+            return chunked.chunk(0).to_numpy(zero_copy_only=False)
+        return chunked.to_numpy()
+
+    def lookup_many(self, keys: Sequence[Any], features: Sequence[str]) -> Dict[str, List[Any]]:
+        """Column lists for many keys at once (None where a key or feature is missing), via one `take` per column."""
+        rows = self.rows_for(keys)
+        indices = pa.array(rows, mask=rows < 0)  # missing keys become nulls, which `take` passes through
+        columns = self.columns
+        return {
+            feature: self.table.column(feature).take(indices).to_pylist() if feature in columns else [None] * len(rows)
+            for feature in features
+        }
+
+    def lookup(self, key: Any, features: Sequence[str]) -> Dict[str, Any]:
+        idx = int(self.rows_for([key])[0])
+        if idx < 0:
+            return {feature: None for feature in features}
+        return {
+            feature: self.table.column(feature)[idx].as_py() if feature in self.columns else None
+            for feature in features
+        }
+
+
+class FeatureSnapshotLoader:
+    """Loads `FeatureSnapshot`s for the offline sources backing each feature view."""
+
+    def __init__(
+        self,
+        repo_path: Path = FEATURE_STORE_PATH,
+        snapshot_dir: Path = SNAPSHOT_DIR,
+        specs: Dict[str, EmbeddedViewSpec] = EMBEDDED_VIEW_SPECS,
+    ):
+        self.repo_path = Path(repo_path)
+        self.snapshot_dir = Path(snapshot_dir)
+        self.specs = specs
+
+    def source_path(self, feature_view: str) -> Path:
+        return self.repo_path / self.specs[feature_view].source_path
+
+    def load(
+        self,
+        feature_view: str,
+        columns: Optional[Iterable[str]] = None,
+        since: Optional[datetime] = None,
+    ) -> FeatureSnapshot:
+        """
+        Load the latest snapshot of one feature view's offline source.
+
+        Args:
+            feature_view: Feature view name (e.g. "product_performance_metrics")
+            columns: Feature columns to project (defaults to every feature in the view)
+            since: Drop rows with `event_timestamp` before this instant (defaults to now - view TTL)
+
+        Returns:
+            FeatureSnapshot with the join key, timestamp and requested feature columns
+        """
+        spec = self.specs[feature_view]
+        features = list(columns) if columns is not None else list(spec.features)
+        projection = [spec.join_key, TIMESTAMP_FIELD, *[f for f in features if f not in (spec.join_key, TIMESTAMP_FIELD)]]
+        if since is None and FEATURE_VIEW_TTLS.get(feature_view):
+            since = datetime.now(timezone.utc) - FEATURE_VIEW_TTLS[feature_view]
+
+        ipc_path = self.snapshot_dir / f"{feature_view}.arrow"
+        if self._ipc_is_current(feature_view, ipc_path):
+            table = self._load_ipc(ipc_path, projection, since)
+            zero_copy, source = True, str(ipc_path)
+        else:
+            table = self._load_parquet(self.source_path(feature_view), projection, since)
+            zero_copy, source = False, str(self.source_path(feature_view))
+
+        keys, rows = _latest_rows(table.column(spec.join_key), _epoch_seconds(table.column(TIMESTAMP_FIELD)))
+        logger.info(
+            "Loaded feature snapshot",
+            feature_view=feature_view,
+            rows=table.num_rows,
+            entities=len(keys),
+            columns=len(projection),
+            zero_copy=zero_copy,
+        )
+        return FeatureSnapshot(feature_view, spec.join_key, table, keys, rows, source, zero_copy)
+
+    def export(self, feature_view: str) -> Optional[Path]:
+        """Rewrite the Arrow IPC snapshot for one view from its Parquet source (sorted by event time)."""
+        source = self.source_path(feature_view)
+        if not source.exists():
+            logger.warning("Offline source missing; skipping snapshot export", feature_view=feature_view, path=str(source))
+            return None
+
+        table = ds.dataset(str(source), format="parquet").to_table()
+        table = table.take(pc.sort_indices(table, sort_keys=[(TIMESTAMP_FIELD, "ascending")]))
+        table = table.combine_chunks()
+
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        ipc_path = self.snapshot_dir / f"{feature_view}.arrow"
+        tmp_path = ipc_path.with_name(f".{ipc_path.name}.{os.getpid()}.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, ipc_path)
+        meta = {"source": _source_fingerprint(source), "rows": table.num_rows, "exported_at": time.time()}
+        self._meta_path(ipc_path).write_text(json.dumps(meta))
+        logger.info("Exported feature snapshot", feature_view=feature_view, rows=table.num_rows, path=str(ipc_path))
+        return ipc_path
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _meta_path(ipc_path: Path) -> Path:
+        return ipc_path.with_name(ipc_path.name + ".json")
+
+    def _ipc_is_current(self, feature_view: str, ipc_path: Path) -> bool:
+        try:
+            meta = json.loads(self._meta_path(ipc_path).read_text())
+        except (OSError, ValueError):
+            return False
+        source = self.source_path(feature_view)
+        return ipc_path.exists() and (not source.exists() or meta.get("source") == _source_fingerprint(source))
+
+    @staticmethod
+    def _load_ipc(path: Path, projection: List[str], since: Optional[datetime]) -> pa.Table:
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        table = table.select([name for name in projection if name in table.column_names])
+        if since is not None and table.num_rows:
+            # Rows are sorted by event time, so the predicate is a binary search plus a zero-copy slice.
+            event_seconds = _epoch_seconds(table.column(TIMESTAMP_FIELD))
+            start = int(np.searchsorted(event_seconds, int(since.timestamp()), side="left"))
+            table = table.slice(start)
+        return table
+
+    @staticmethod
+    def _load_parquet(source: Path, projection: List[str], since: Optional[datetime]) -> pa.Table:
+        dataset = ds.dataset(str(source), format="parquet")
+        columns = [name for name in projection if name in dataset.schema.names]
+        predicate = None
+        if since is not None:
+            field_type = dataset.schema.field(TIMESTAMP_FIELD).type
+            predicate = ds.field(TIMESTAMP_FIELD) >= _timestamp_scalar(field_type, since)
+        return dataset.to_table(columns=columns, filter=predicate)
+
+
+class FeatureSnapshotStore:
+    """
+    Serves `get_online_features` from feature snapshots (latest row per entity within the view TTL).
+
+    Snapshots are projected to the features callers have asked for so far and reloaded when the
+    exported snapshot or Parquet source changes.
+    """
+
+    coalesce_lookups = False
+
+    def __init__(self, loader: Optional[FeatureSnapshotLoader] = None, reload_interval_sec: float = 30.0):
+        self.loader = loader or FeatureSnapshotLoader()
+        self.reload_interval_sec = reload_interval_sec
+        self._snapshots: Dict[str, FeatureSnapshot] = {}
+        self._fingerprints: Dict[str, Any] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def list_feature_views(self) -> List[SimpleNamespace]:
+        return [self.get_feature_view(name) for name in self.loader.specs]
+
+    def get_feature_view(self, name: str) -> SimpleNamespace:
+        spec = self.loader.specs[name]
+        return SimpleNamespace(
+            name=name,
+            ttl=FEATURE_VIEW_TTLS.get(name),
+            features=[SimpleNamespace(name=feature) for feature in spec.features],
+        )
+
+    def get_online_features(
+        self,
+        features: List[str],
+        entity_rows: List[Dict[str, Any]],
+        full_feature_names: bool = False,
+    ) -> _OnlineResponse:
+        columns: Dict[str, List[Any]] = {}
+        for join_key in {name for row in entity_rows for name in row}:
+            columns[join_key] = [row.get(join_key) for row in entity_rows]
+
+        requested: Dict[str, List[str]] = {}
+        for ref in features:
+            view, feature = ref.split(":", 1)
+            requested.setdefault(view, []).append(feature)
+
+        for view, view_features in requested.items():
+            snapshot = self.snapshot(view, view_features)
+            values = snapshot.lookup_many([row.get(snapshot.join_key) for row in entity_rows], view_features)
+            for feature in view_features:
+                columns[f"{view}__{feature}" if full_feature_names else feature] = values[feature]
+        return _OnlineResponse(columns)
+
+    def snapshot(self, view: str, features: Sequence[str]) -> FeatureSnapshot:
+        now = time.monotonic()
+        current = self._snapshots.get(view)
+        if (
+            current is not None
+            and all(feature in current.columns for feature in features)
+            and now - self._checked_at.get(view, 0.0) < self.reload_interval_sec
+        ):
+            return current
+
+        with self._lock:
+            self._checked_at[view] = now
+            source = self.loader.source_path(view)
+            ipc_path = self.loader.snapshot_dir / f"{view}.arrow"
+            fingerprint = (
+                _source_fingerprint(source) if source.exists() else None,
+                ipc_path.stat().st_mtime_ns if ipc_path.exists() else None,
+            )
+            wanted = set(features) | (set(current.columns) if current is not None else set())
+            if current is None or fingerprint != self._fingerprints.get(view) or not wanted <= set(current.columns):
+                current = self.loader.load(view, columns=sorted(wanted))
+                self._snapshots[view] = current
+                self._fingerprints[view] = fingerprint
+            return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Feature snapshot maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export", help="Export Parquet sources to memory-mappable Arrow IPC files")
+    export.add_argument("--output-dir", default=str(SNAPSHOT_DIR))
+    export.add_argument("--repo-path", default=str(FEATURE_STORE_PATH))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        loader = FeatureSnapshotLoader(repo_path=Path(args.repo_path), snapshot_dir=Path(args.output_dir))
+        exported = {view: str(path) for view in loader.specs if (path := loader.export(view)) is not None}
+        print(json.dumps({"exported": exported}))
+
+
+if __name__ == "__main__":
+    main()
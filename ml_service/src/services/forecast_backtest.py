@@ -0,0 +1,428 @@
+"""
+Rolling-Origin Forecast Backtest
+Scores the forecasting engine the way it is used: refit at an origin, forecast the next `horizon`
+days, move the origin forward by `step` days and repeat.
+
+Errors are reduced to additive sufficient statistics (sums and counts per horizon step and per SKU).
+Shards of SKUs can then be scored in separate processes and merged exactly. `write_backtest_results`
+publishes the merged summary that `/api/v1/forecast/metrics` serves. `run_backtest` shards the SKUs
+across a process pool.
+
+`incremental_parity` checks the nightly refresh path instead. On a sample of stored SKUs it compares
+forecasts from a state updated day by day against a full refit on the same history.
+
+Usage:
+    python -m src.services.forecast_backtest evaluate [--products N] [--origins 52] [--step 7] [--horizon 28]
+    python -m src.services.forecast_backtest parity [--products N] [--update-days 28] [--horizon 28]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from src.services.forecast_engine import ForecastBatch, ForecastEngine, incremental_parity_backtest, stable_seed
+from src.services.forecast_store import BATCH_CHUNK_SIZE, BATCH_WORKERS, MODEL_VERSIONS
+from src.services.sales_history import (
+    HISTORY_DAYS,
+    product_catalog,
+    sales_history_store,
+    synthetic_sales,
+)
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+BACKTEST_DIR = Path(os.getenv("FORECAST_BACKTEST_DIR", str(BASE_DIR / "artifacts" / "backtests")))
+BACKTEST_SUMMARY = "latest.json"
+BACKTEST_SKU_METRICS = "latest_skus.npz"
+MIN_TRAIN_DAYS = 56
+REPORT_HORIZONS = (7, 14, 28)
+BACKTEST_ORIGINS = int(os.getenv("FORECAST_BACKTEST_ORIGINS", "52"))
+BACKTEST_STEP_DAYS = int(os.getenv("FORECAST_BACKTEST_STEP_DAYS", "7"))
+BACKTEST_HORIZON = int(os.getenv("FORECAST_BACKTEST_HORIZON", "28"))
+
+
+def rolling_origins(days: int, n_origins: int, step: int, horizon: int, min_train: int = MIN_TRAIN_DAYS) -> List[int]:
+    """The last `n_origins` origins spaced `step` days apart whose horizon still fits inside `days`."""
+    last = days - horizon
+    origins = [last - step * idx for idx in range(n_origins)][::-1]
+    if origins[0] < min_train:
+        raise ValueError(
+            f"{n_origins} origins every {step} days with a {horizon}-day horizon need "
+            f"{history_days_required(n_origins, step, horizon, min_train)} days of history, got {days}"
+        )
+    return origins
+
+
+def history_days_required(n_origins: int, step: int, horizon: int, min_train: int = MIN_TRAIN_DAYS) -> int:
+    return min_train + step * (n_origins - 1) + horizon
+
+
+def origins_available(days: int, step: int, horizon: int, min_train: int = MIN_TRAIN_DAYS) -> int:
+    """How many origins `days` of history can hold (the inverse of `history_days_required`)."""
+    return max((days - min_train - horizon) // step + 1, 0)
+
+
+@dataclass
+class BacktestStats:
+    """Additive error statistics; per-step arrays are (horizon,), per-SKU arrays are (n,)."""
+
+    product_ids: List[str]
+    count: np.ndarray  # scored (SKU, origin) pairs per step
+    abs_pct_sum: np.ndarray  # Σ |e| / |y| over days with y ≠ 0
+    abs_pct_count: np.ndarray
+    smape_sum: np.ndarray  # Σ 2|e| / (|y| + |ŷ|) over days where the denominator is non-zero
+    smape_count: np.ndarray
+    sq_sum: np.ndarray  # Σ e²
+    covered: np.ndarray  # days with lower ≤ y ≤ upper
+    sku_smape_sum: np.ndarray
+    sku_smape_count: np.ndarray
+    sku_covered: np.ndarray
+    sku_count: np.ndarray
+
+    @classmethod
+    def from_forecasts(cls, product_ids: Sequence[str], actual: np.ndarray, forecasts: ForecastBatch) -> "BacktestStats":
+        """
+        Reduce (n × origins × horizon) actuals and forecasts to error statistics.
+
+        NaN actuals (days without a reading) are skipped.
+        """
+        observed = ~np.isnan(actual)
+        actual = np.where(observed, actual, 0.0)
+        error = np.abs(forecasts.values - actual)
+        magnitude = np.abs(actual)
+        nonzero = observed & (magnitude > 0)
+        denom = magnitude + np.abs(forecasts.values)
+        symmetric = observed & (denom > 0)
+        covered = observed & (actual >= forecasts.lower) & (actual <= forecasts.upper)
+
+        ape = np.divide(error, magnitude, out=np.zeros_like(error), where=nonzero)
+        sape = np.divide(2.0 * error, denom, out=np.zeros_like(error), where=symmetric)
+        squared = np.where(observed, error * error, 0.0)
+        return cls(
+            product_ids=list(product_ids),
+            count=observed.sum(axis=(0, 1)),
+            abs_pct_sum=ape.sum(axis=(0, 1)),
+            abs_pct_count=nonzero.sum(axis=(0, 1)),
+            smape_sum=sape.sum(axis=(0, 1)),
+            smape_count=symmetric.sum(axis=(0, 1)),
+            sq_sum=squared.sum(axis=(0, 1)),
+            covered=covered.sum(axis=(0, 1)),
+            sku_smape_sum=sape.sum(axis=(1, 2)),
+            sku_smape_count=symmetric.sum(axis=(1, 2)),
+            sku_covered=covered.sum(axis=(1, 2)),
+            sku_count=observed.sum(axis=(1, 2)),
+        )
+
+    @classmethod
+    def empty(cls, horizon: int) -> "BacktestStats":
+        """Statistics of a backtest that scored nothing; every metric comes out null."""
+        return cls(
+            product_ids=[],
+            **{name: np.zeros(horizon) for name in _STEP_FIELDS},
+            **{name: np.zeros(0) for name in _SKU_FIELDS},
+        )
+
+    @classmethod
+    def merge(cls, shards: Sequence["BacktestStats"]) -> "BacktestStats":
+        """Combine shards scored over disjoint SKUs with the same origins and horizon."""
+        return cls(
+            product_ids=[product_id for shard in shards for product_id in shard.product_ids],
+            **{name: np.sum([getattr(shard, name) for shard in shards], axis=0) for name in _STEP_FIELDS},
+            **{name: np.concatenate([getattr(shard, name) for shard in shards]) for name in _SKU_FIELDS},
+        )
+
+    def metrics(self, steps: Optional[int] = None) -> Dict[str, Optional[float]]:
+        """MAPE / sMAPE (percent), RMSE and interval coverage over the first `steps` horizon days."""
+        window = slice(0, steps)
+        count = float(self.count[window].sum())
+        abs_pct_count = float(self.abs_pct_count[window].sum())
+        smape_count = float(self.smape_count[window].sum())
+        return {
+            "mape": _ratio(100.0 * self.abs_pct_sum[window].sum(), abs_pct_count, 3),
+            "smape": _ratio(100.0 * self.smape_sum[window].sum(), smape_count, 3),
+            "rmse": round(float(np.sqrt(self.sq_sum[window].sum() / count)), 3) if count else None,
+            "coverage_95pct": _ratio(self.covered[window].sum(), count, 4),
+        }
+
+    def sku_smape(self) -> np.ndarray:
+        return 100.0 * np.divide(
+            self.sku_smape_sum,
+            self.sku_smape_count,
+            out=np.full(self.sku_smape_sum.shape, np.nan),
+            where=self.sku_smape_count > 0,
+        )
+
+    def sku_coverage(self) -> np.ndarray:
+        return np.divide(
+            self.sku_covered, self.sku_count, out=np.full(self.sku_count.shape, np.nan), where=self.sku_count > 0
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        horizon = self.count.shape[0]
+        sku_smape = self.sku_smape()
+        scored = sku_smape[~np.isnan(sku_smape)]
+        return {
+            **self.metrics(),
+            "products": len(self.product_ids),
+            "products_scored": int(np.count_nonzero(self.sku_count)),
+            "by_horizon": {str(steps): self.metrics(steps) for steps in REPORT_HORIZONS if steps < horizon},
+            "sku_smape_percentiles": (
+                {f"p{q}": round(float(value), 3) for q, value in zip((50, 90, 99), np.percentile(scored, [50, 90, 99]))}
+                if scored.size
+                else {}
+            ),
+        }
+
+
+_STEP_FIELDS = ("count", "abs_pct_sum", "abs_pct_count", "smape_sum", "smape_count", "sq_sum", "covered")
+_SKU_FIELDS = ("sku_smape_sum", "sku_smape_count", "sku_covered", "sku_count")
+
+
+def _ratio(numerator: float, denominator: float, digits: int) -> Optional[float]:
+    return round(float(numerator) / denominator, digits) if denominator else None
+
+
+def write_backtest_results(
+    stats: BacktestStats,
+    settings: Dict[str, Any],
+    root: Path = BACKTEST_DIR,
+) -> Dict[str, Any]:
+    """Publish the summary (atomically replacing the previous one) plus per-SKU sMAPE and coverage."""
+    root.mkdir(parents=True, exist_ok=True)
+    summary = {
+        "evaluated_at": datetime.utcnow().isoformat(),
+        **settings,
+        **stats.summary(),
+    }
+    sku_path = root / BACKTEST_SKU_METRICS
+    with open(root / f"{BACKTEST_SKU_METRICS}.tmp", "wb") as handle:
+        np.savez(
+            handle,
+            product_ids=np.asarray(stats.product_ids, dtype=str),
+            smape=stats.sku_smape(),
+            coverage=stats.sku_coverage(),
+        )
+    os.replace(root / f"{BACKTEST_SKU_METRICS}.tmp", sku_path)
+    tmp_summary = root / f"{BACKTEST_SUMMARY}.tmp"
+    tmp_summary.write_text(json.dumps(summary, indent=2))
+    os.replace(tmp_summary, root / BACKTEST_SUMMARY)
+    return summary
+
+
+class BacktestResults:
+    """Reader for the published summary; re-reads when the file changes."""
+
+    def __init__(self, root: Path = BACKTEST_DIR):
+        self.path = root / BACKTEST_SUMMARY
+        self._mtime: Optional[float] = None
+        self._summary: Optional[Dict[str, Any]] = None
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            self._summary = json.loads(self.path.read_text())
+            self._mtime = mtime
+        return self._summary
+
+
+def run_backtest(
+    products: Optional[int] = None,
+    n_origins: int = BACKTEST_ORIGINS,
+    step: int = BACKTEST_STEP_DAYS,
+    horizon: int = BACKTEST_HORIZON,
+    workers: Optional[int] = None,
+    root: Path = BACKTEST_DIR,
+    model_versions: Dict[str, str] = MODEL_VERSIONS,
+) -> Dict[str, Any]:
+    """
+    Rolling-origin backtest over the catalog SKUs in the sales history store (or `products` synthetic ones),
+    sharded across a process pool.
+
+    Only stored readings are scored: catalog SKUs the store hasn't seen are left out, and the origins are
+    cut back to what the stored days can hold. `products_scored` counts the SKUs with at least one scored
+    day; when there are none, every metric is null. Each shard returns additive error statistics, so
+    merging them gives the same numbers as a single pass.
+    """
+    if products is None:
+        history = sales_history_store.current()
+        catalog = list(dict.fromkeys(product_id for product_id, _ in product_catalog()))
+        product_ids, days, end = [], 0, None
+        if history is not None:
+            product_ids = [product_id for product_id, row in zip(catalog, history.rows(catalog)) if row >= 0]
+            days, end = history.days, history.end_date.isoformat()
+        else:
+            logger.warning("No sales history store; the backtest has nothing to score")
+        available = origins_available(days, step, horizon)
+        if history is not None and available < n_origins:
+            logger.warning(
+                "Stored history too short for every backtest origin",
+                days=days,
+                origins=n_origins,
+                available=available,
+            )
+            n_origins = available
+        if not n_origins:
+            product_ids = []
+    else:
+        product_ids = [f"backtest-{idx}" for idx in range(products)]
+        days, end = max(HISTORY_DAYS, history_days_required(n_origins, step, horizon)), None
+    workers = max(1, workers or BATCH_WORKERS)
+    started = time.perf_counter()
+
+    chunks = [product_ids[idx : idx + BATCH_CHUNK_SIZE] for idx in range(0, len(product_ids), BATCH_CHUNK_SIZE)]
+    args = (n_origins, step, horizon, days, end)
+    if workers == 1 or len(chunks) <= 1:
+        shards = [_backtest_partition(chunk, *args) for chunk in chunks]
+    else:
+        # spawn, like the service's batch pool: workers import this module rather than inherit the parent
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as pool:
+            futures = [pool.submit(_backtest_partition, chunk, *args) for chunk in chunks]
+            shards = [future.result() for future in as_completed(futures)]
+
+    elapsed = time.perf_counter() - started
+    settings = {
+        "origins": n_origins,
+        "step_days": step,
+        "horizon": horizon,
+        "history_days": days,
+        "history_end": end,
+        "workers": workers,
+        "elapsed_sec": round(elapsed, 2),
+        "model_versions": model_versions,
+    }
+    stats = BacktestStats.merge(shards) if shards else BacktestStats.empty(horizon)
+    summary = write_backtest_results(stats, settings, root)
+    logger.info(
+        "Forecast backtest published",
+        products=len(product_ids),
+        scored=summary["products_scored"],
+        origins=n_origins,
+        smape=summary["smape"],
+        coverage=summary["coverage_95pct"],
+        elapsed_sec=settings["elapsed_sec"],
+    )
+    return summary
+
+
+def incremental_parity(
+    products: int = 2000, update_days: int = 28, horizon: int = 28, engine: Optional[ForecastEngine] = None
+) -> Dict[str, Any]:
+    """
+    Accuracy parity of incremental state updates vs a full refit, on up to `products` catalog SKUs sampled
+    from the sales history store over its last HISTORY_DAYS days.
+
+    The sample is seeded by the store's last day, so each night checks a different set of SKUs against the
+    newest readings and a rerun of the same night reproduces it. Without enough stored history there is
+    nothing to compare and the sMAPE fields are null.
+    """
+    engine = engine or ForecastEngine()
+    history = sales_history_store.current()
+    result: Dict[str, Any] = {
+        "series": 0,
+        "update_days": update_days,
+        "horizon": horizon,
+        "history_end": history.end_date.isoformat() if history is not None else None,
+        "incremental_smape": None,
+        "refit_smape": None,
+        "smape_gap": None,
+    }
+    catalog = list(dict.fromkeys(product_id for product_id, _ in product_catalog()))
+    stored = [product_id for product_id, row in zip(catalog, history.rows(catalog)) if row >= 0] if history else []
+    days = min(history.days, HISTORY_DAYS) if history is not None else 0
+    if not stored or days - update_days - horizon < 2 * engine.season_length:
+        logger.warning(
+            "Not enough stored sales history for the incremental parity check", products=len(stored), days=days
+        )
+        return result
+
+    rng = np.random.default_rng(stable_seed(result["history_end"]))
+    sample = np.sort(rng.choice(len(stored), size=min(products, len(stored)), replace=False))
+    readings = history.read([stored[idx] for idx in sample], days)
+    return {**result, **incremental_parity_backtest(engine, readings, update_days, horizon)}
+
+
+_worker_engine: Optional[ForecastEngine] = None
+
+
+def _backtest_partition(
+    product_ids: List[str], n_origins: int, step: int, horizon: int, days: int, end: Optional[str]
+) -> BacktestStats:
+    """
+    Process-pool task: rolling-origin forecasts for one shard of SKUs, reduced to error statistics.
+
+    The `days` up to `end` come from the sales history store; without an `end` the SKUs are synthetic.
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = ForecastEngine()
+    if end is None:
+        history = synthetic_sales(product_ids, days)
+    else:
+        history = sales_history_store.current().read(product_ids, days, date.fromisoformat(end))
+    origins = rolling_origins(history.shape[1], n_origins, step, horizon)
+    forecasts = _worker_engine.rolling_origin_forecasts(history, origins, horizon)
+    actual = history[:, np.asarray(origins)[:, None] + np.arange(horizon)[None, :]]
+    return BacktestStats.from_forecasts(product_ids, actual, forecasts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Forecast backtests")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    evaluate = subcommands.add_parser(
+        "evaluate", help="Rolling-origin backtest of every SKU; publishes the metrics served by /forecast/metrics"
+    )
+    evaluate.add_argument("--products", type=int, default=None, help="Synthetic SKU count (default: the catalog)")
+    evaluate.add_argument("--origins", type=int, default=None)
+    evaluate.add_argument("--step", type=int, default=None)
+    evaluate.add_argument("--horizon", type=int, default=None)
+    evaluate.add_argument("--workers", type=int, default=None)
+    evaluate.add_argument("--output-dir", default=str(BACKTEST_DIR))
+    parity = subcommands.add_parser("parity", help="Compare incremental updates against a full refit")
+    parity.add_argument("--products", type=int, default=2000, help="Stored catalog SKUs to sample")
+    parity.add_argument("--update-days", type=int, default=28)
+    parity.add_argument("--horizon", type=int, default=28)
+    args = parser.parse_args()
+
+    if args.command == "parity":
+        print(json.dumps(incremental_parity(args.products, args.update_days, args.horizon)))
+        return
+    options = {"n_origins": args.origins, "step": args.step, "horizon": args.horizon}
+    summary = run_backtest(
+        args.products,
+        workers=args.workers,
+        root=Path(args.output_dir),
+        **{key: value for key, value in options.items() if value is not None},
+    )
+    keys = (
+        "evaluated_at",
+        "products",
+        "products_scored",
+        "origins",
+        "mape",
+        "smape",
+        "rmse",
+        "coverage_95pct",
+        "elapsed_sec",
+    )
+    print(json.dumps({key: summary[key] for key in keys}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+Vectorized Forecast Engine
+Additive Holt-Winters (level + trend + weekly seasonality) fitted for many SKU series at once.
+
+Every operation works on 2-D arrays shaped (SKUs × days): the recursion loops over time only, with
+each step updating all SKUs (and all candidate smoothing parameters) in a single numpy expression.
+
+A fitted state can absorb new days of actuals with `update`, which costs O(1) per SKU per day
+regardless of history length. `drifted` flags SKUs whose recent one-step errors have outgrown
+their fit-time error, so only those need a full refit.
+
+`simulate_quantiles` turns a state into demand quantiles by bootstrapping each SKU's own one-step
+residuals through the recursion, so errors compound the way they do in the model.
+"""
+
+from __future__ import annotations
+
+import itertools
+import warnings
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_ALPHAS = (0.1, 0.3, 0.5)
+DEFAULT_BETAS = (0.01, 0.05)
+DEFAULT_GAMMAS = (0.05, 0.2)
+DRIFT_DECAY = 0.2  # EWMA weight of the newest squared one-step error
+DEFAULT_DRIFT_THRESHOLD = 4.0  # EWMA squared error vs fit-time MSE (error RMS doubled)
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+DEFAULT_PATHS = 500
+SIMULATION_MAX_BYTES = 64 * 1024 * 1024  # per SKU chunk of simulated paths
+
+
+@dataclass
+class HoltWintersState:
+    """Per-SKU model state after folding in `observations` days of history."""
+
+    level: np.ndarray  # (n,)
+    trend: np.ndarray  # (n,)
+    season: np.ndarray  # (n, season_length), indexed by day position modulo season_length
+    alpha: np.ndarray  # (n,)
+    beta: np.ndarray  # (n,)
+    gamma: np.ndarray  # (n,)
+    observations: int
+    residual_quantiles: np.ndarray  # (n, 2) lower/upper one-step residual quantiles
+    error_scale: np.ndarray  # (n,) fit-time one-step MSE
+    error_ewma: np.ndarray  # (n,) running EWMA of squared one-step errors since the fit
+
+    @property
+    def season_length(self) -> int:
+        return self.season.shape[1]
+
+    def __len__(self) -> int:
+        return self.level.shape[0]
+
+    def take(self, rows: np.ndarray) -> "HoltWintersState":
+        """Subset (or reorder) SKUs."""
+        return HoltWintersState(
+            **{name: getattr(self, name)[rows] for name in _PER_SKU_FIELDS},
+            observations=self.observations,
+        )
+
+    def merge(self, rows: np.ndarray, other: "HoltWintersState") -> None:
+        """Overwrite `rows` in place with a state fitted on a different history length."""
+        # Season slots are indexed by day position modulo m; realign `other` onto this state's calendar.
+        shift = (self.observations - other.observations) % self.season_length
+        for name in _PER_SKU_FIELDS:
+            values = getattr(other, name)
+            getattr(self, name)[rows] = np.roll(values, shift, axis=1) if name == "season" else values
+
+    def to_arrays(self) -> dict:
+        return {**{name: getattr(self, name) for name in _PER_SKU_FIELDS}, "observations": np.int64(self.observations)}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "HoltWintersState":
+        return cls(
+            **{name: np.array(arrays[name]) for name in _PER_SKU_FIELDS},
+            observations=int(arrays["observations"]),
+        )
+
+    @classmethod
+    def concatenate(cls, states: Sequence["HoltWintersState"]) -> "HoltWintersState":
+        """Stack states fitted on the same history length."""
+        return cls(
+            **{name: np.concatenate([getattr(state, name) for state in states]) for name in _PER_SKU_FIELDS},
+            observations=states[0].observations,
+        )
+
+
+_PER_SKU_FIELDS = (
+    "level",
+    "trend",
+    "season",
+    "alpha",
+    "beta",
+    "gamma",
+    "residual_quantiles",
+    "error_scale",
+    "error_ewma",
+)
+
+
+@dataclass
+class ForecastBatch:
+    """Point forecasts and interval bounds for a batch of SKUs, each shaped (n, horizon)."""
+
+    values: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+@dataclass
+class QuantileForecast:
+    """Bootstrapped demand quantiles for a batch of SKUs."""
+
+    levels: np.ndarray  # (q,)
+    values: np.ndarray  # (n, q, horizon) per-day quantiles
+    cumulative: np.ndarray  # (n, q) quantiles of total demand over the first `cumulative_days` days
+    cumulative_days: int
+
+
+def stable_seed(key: str) -> int:
+    """Deterministic per-key seed (Python's hash() is salted per process)."""
+    return zlib.crc32(key.encode("utf-8"))
+
+
+def synthetic_history(
+    n_series: int,
+    days: int,
+    base: float = 1000.0,
+    growth: float = 3.0,
+    noise: float = 18.0,
+    weekly_seasonality: bool = True,
+    seeds: Optional[Sequence[int]] = None,
+) -> np.ndarray:
+    """
+    Generate demo demand histories (n_series × days) ending the day before the forecast start.
+
+    Used until the sales history store is populated; each row gets its own noise stream when
+    `seeds` is given so SKUs differ deterministically.
+    """
+    offsets = np.arange(-days, 0, dtype=np.float64)  # days before the forecast start
+    # Exponential ramp: reaches `base` at the forecast start with slope `growth`, stays positive further back.
+    trend = base * np.exp(growth / base * offsets)
+    seasonal = np.zeros(days)
+    if weekly_seasonality:
+        seasonal = 0.06 * trend * np.sin(2 * np.pi * (offsets % 7) / 7)
+    if seeds is None:
+        rng = np.random.default_rng(42)
+        noise_terms = rng.uniform(-noise, noise, size=(n_series, days))
+    else:
+        noise_terms = np.stack([np.random.default_rng(seed).uniform(-noise, noise, size=days) for seed in seeds])
+    return np.maximum(trend[None, :] + seasonal[None, :] + noise_terms, 0.0)
+
+
+class ForecastEngine:
+    """Fits additive Holt-Winters per SKU with a vectorized grid search over smoothing parameters."""
+
+    def __init__(
+        self,
+        season_length: int = 7,
+        interval: float = 0.95,
+        alphas: Iterable[float] = DEFAULT_ALPHAS,
+        betas: Iterable[float] = DEFAULT_BETAS,
+        gammas: Iterable[float] = DEFAULT_GAMMAS,
+    ):
+        self.season_length = season_length
+        self.interval = interval
+        self.param_grid = np.array(list(itertools.product(alphas, betas, gammas)), dtype=np.float64)
+
+    # ------------------------------------------------------------------
+    # Fitting
+    # ------------------------------------------------------------------
+    def fit(self, history: np.ndarray) -> HoltWintersState:
+        """
+        Fit every row of `history` (n × T, NaN for missing days) and return the end-of-history state.
+
+        The smoothing parameters are chosen per SKU from the grid by one-step-ahead SSE.
+        """
+        return self.fit_with_residuals(history, window=0)[0]
+
+    def fit_with_residuals(self, history: np.ndarray, window: int) -> Tuple[HoltWintersState, np.ndarray]:
+        """`fit`, plus the last `window` one-step residuals per row (n × window; 0 for missing days)."""
+        history = np.asarray(history, dtype=np.float64)
+        if history.ndim == 1:
+            history = history[None, :]
+        m = self.season_length
+        if history.shape[1] < 2 * m:
+            raise ValueError(f"At least {2 * m} days of history are required, got {history.shape[1]}")
+
+        level0, trend0, season0 = self._initial_state(history)
+        grid = self.param_grid[:, :, None]  # (G, 3, 1) broadcasts over SKUs
+        _, _, _, sse, _ = self._run(history, level0, trend0, season0, grid[:, 0], grid[:, 1], grid[:, 2])
+        best = np.argmin(sse, axis=0)  # (n,)
+        alpha, beta, gamma = (self.param_grid[best, k] for k in range(3))
+
+        level, trend, season, _, residuals = self._run(
+            history, level0, trend0, season0, alpha[None], beta[None], gamma[None], keep_residuals=True
+        )
+        tail = (1.0 - self.interval) / 2.0
+        residuals = residuals[0][:, m:]  # skip the initialisation season
+        quantiles = np.nanquantile(residuals, [tail, 1.0 - tail], axis=1).T if residuals.size else np.zeros((len(alpha), 2))
+        mse = np.nan_to_num(np.mean(residuals * residuals, axis=1)) if residuals.size else np.zeros(len(alpha))
+        state = HoltWintersState(
+            level=level[0],
+            trend=trend[0],
+            season=season[0],
+            alpha=alpha,
+            beta=beta,
+            gamma=gamma,
+            observations=history.shape[1],
+            residual_quantiles=np.nan_to_num(quantiles),
+            error_scale=mse,
+            error_ewma=mse.copy(),
+        )
+        return state, np.ascontiguousarray(residuals[:, residuals.shape[1] - min(window, residuals.shape[1]) :])
+
+    def update(self, state: HoltWintersState, actuals: np.ndarray) -> np.ndarray:
+        """
+        Fold new days of actuals into `state` in place and return their one-step errors (n × k).
+
+        `actuals` is (n,) for one day or (n, k) for k consecutive days, rows aligned with `state`;
+        NaN marks a SKU with no reading that day (its components advance on the forecast alone, error 0).
+        """
+        actuals = np.asarray(actuals, dtype=np.float64)
+        if actuals.ndim == 1:
+            actuals = actuals[:, None]
+        if actuals.shape[0] != len(state):
+            raise ValueError(f"Expected actuals for {len(state)} SKUs, got {actuals.shape[0]}")
+
+        m = state.season_length
+        level, trend = state.level, state.trend
+        errors = np.empty_like(actuals)
+        for day in range(actuals.shape[1]):
+            pos = state.observations % m
+            level, trend, error = self._step(
+                level, trend, state.season, actuals[:, day], state.alpha, state.beta, state.gamma, pos
+            )
+            errors[:, day] = error
+            observed = ~np.isnan(actuals[:, day])
+            state.error_ewma[observed] = (1.0 - DRIFT_DECAY) * state.error_ewma[observed] + DRIFT_DECAY * np.square(
+                error[observed]
+            )
+            state.observations += 1
+        state.level, state.trend = level, trend
+        return errors
+
+    @staticmethod
+    def drifted(state: HoltWintersState, threshold: float = DEFAULT_DRIFT_THRESHOLD) -> np.ndarray:
+        """Rows whose recent squared one-step error exceeds `threshold` × the fit-time MSE."""
+        floor = np.maximum(state.error_scale, 1e-9)
+        return np.flatnonzero(state.error_ewma > threshold * floor)
+
+    def _initial_state(self, history: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        m = self.season_length
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN warm-up seasons fall back to zero
+            level0 = np.nan_to_num(np.nanmean(history[:, :m], axis=1))
+            second = np.nan_to_num(np.nanmean(history[:, m : 2 * m], axis=1))
+        trend0 = (second - level0) / m
+        season0 = np.nan_to_num(history[:, :m] - level0[:, None])
+        return level0, trend0, season0
+
+    def _run(
+        self,
+        history: np.ndarray,
+        level0: np.ndarray,
+        trend0: np.ndarray,
+        season0: np.ndarray,
+        alpha: np.ndarray,
+        beta: np.ndarray,
+        gamma: np.ndarray,
+        keep_residuals: bool = False,
+    ):
+        """Run the recursion for G parameter sets at once; arrays are shaped (G, n[, m])."""
+        groups = alpha.shape[0]
+        n, days = history.shape
+        m = self.season_length
+        level = np.broadcast_to(level0, (groups, n)).copy()
+        trend = np.broadcast_to(trend0, (groups, n)).copy()
+        season = np.broadcast_to(season0, (groups, n, m)).copy()
+        sse = np.zeros((groups, n))
+        residuals = np.empty((groups, n, days)) if keep_residuals else None
+
+        for t in range(days):
+            level, trend, error = self._step(level, trend, season, history[:, t], alpha, beta, gamma, t % m)
+            if t >= m:
+                sse += error * error
+            if keep_residuals:
+                residuals[:, :, t] = error
+
+        return level, trend, season, sse, residuals
+
+    @staticmethod
+    def _step(level, trend, season, observed, alpha, beta, gamma, pos):
+        """One Holt-Winters step for every SKU; updates `season[..., pos]` in place."""
+        seasonal = season[..., pos].copy()
+        fitted = level + trend + seasonal
+        observed = np.where(np.isnan(observed), fitted, observed)
+        error = observed - fitted
+        new_level = alpha * (observed - seasonal) + (1.0 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1.0 - beta) * trend
+        season[..., pos] = gamma * (observed - new_level) + (1.0 - gamma) * seasonal
+        return new_level, trend, error
+
+    # ------------------------------------------------------------------
+    # Projection
+    # ------------------------------------------------------------------
+    def forecast(self, state: HoltWintersState, horizon: int) -> ForecastBatch:
+        """Project `horizon` days ahead for every SKU in `state`."""
+        m = state.season_length
+        steps = np.arange(1, horizon + 1)
+        positions = (state.observations + steps - 1) % m
+        values = state.level[:, None] + state.trend[:, None] * steps[None, :] + state.season[:, positions]
+        # One-step residual quantiles widened with the usual sqrt(h) growth of accumulated error.
+        spread = np.sqrt(steps)[None, :]
+        lower = values + state.residual_quantiles[:, :1] * spread
+        upper = values + state.residual_quantiles[:, 1:] * spread
+        return ForecastBatch(values=values, lower=np.minimum(lower, values), upper=np.maximum(upper, values))
+
+    def fit_forecast(self, history: np.ndarray, horizon: int) -> ForecastBatch:
+        return self.forecast(self.fit(history), horizon)
+
+    def simulate_quantiles(
+        self,
+        state: HoltWintersState,
+        residuals: np.ndarray,
+        horizon: int,
+        levels: Sequence[float] = DEFAULT_QUANTILES,
+        paths: int = DEFAULT_PATHS,
+        cumulative_days: Optional[int] = None,
+        seed: int = 0,
+        max_bytes: int = SIMULATION_MAX_BYTES,
+    ) -> QuantileForecast:
+        """
+        Demand quantiles from `paths` simulated futures per SKU.
+
+        Each path draws one-step errors from that SKU's row of `residuals` (n × window) with replacement
+        and feeds the simulated demand back through the recursion. SKUs without residuals fall back to
+        Gaussian errors at the fit-time MSE. Negative simulated demand is clipped to zero.
+        Cumulative quantiles (over the first `cumulative_days` days, default the horizon) are taken
+        per path, so they are not the sum of the per-day quantiles.
+
+        SKUs are simulated in chunks sized so one chunk's paths fit in `max_bytes`.
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        cumulative_days = min(cumulative_days or horizon, horizon)
+        n, m = len(state), state.season_length
+        rng = np.random.default_rng(seed)
+        values = np.empty((n, levels.shape[0], horizon))
+        cumulative = np.empty((n, levels.shape[0]))
+        chunk = max(1, max_bytes // (3 * 8 * paths * horizon))
+        for first in range(0, n, chunk):
+            rows = np.arange(first, min(first + chunk, n))
+            width = rows.shape[0]
+            level = np.broadcast_to(state.level[rows], (paths, width)).copy()
+            trend = np.broadcast_to(state.trend[rows], (paths, width)).copy()
+            season = np.broadcast_to(state.season[rows], (paths, width, m)).copy()
+            if residuals.shape[1]:
+                draws = rng.integers(0, residuals.shape[1], size=(horizon, paths, width))
+                errors = residuals[rows[None, None, :], draws]
+            else:
+                errors = rng.standard_normal((horizon, paths, width)) * np.sqrt(state.error_scale[rows])
+            demand = np.empty((paths, width, horizon))
+            for step in range(horizon):
+                pos = (state.observations + step) % m
+                simulated = level + trend + season[..., pos] + errors[step]
+                demand[..., step] = np.maximum(simulated, 0.0)
+                level, trend, _ = self._step(
+                    level, trend, season, simulated, state.alpha[rows], state.beta[rows], state.gamma[rows], pos
+                )
+            values[rows] = np.quantile(demand, levels, axis=0).transpose(1, 0, 2)
+            cumulative[rows] = np.quantile(demand[..., :cumulative_days].sum(axis=2), levels, axis=0).T
+        return QuantileForecast(levels=levels, values=values, cumulative=cumulative, cumulative_days=cumulative_days)
+
+    def rolling_origin_forecasts(self, history: np.ndarray, origins: Sequence[int], horizon: int) -> ForecastBatch:
+        """
+        Forecasts from every origin in `origins` as if the model were refit on `history[:, :origin]`.
+
+        Returns a ForecastBatch whose arrays are shaped (n, len(origins), horizon).
+
+        A refit on a prefix starts from the same initial state and sees the same steps as a longer fit, so a
+        single pass over the history with every grid candidate running is enough. At each origin the per-SKU
+        argmin of the SSE so far selects the parameters, that candidate's state and residuals are taken, and
+        the result is projected. The cost is one fit, not one fit per origin.
+        """
+        history = np.asarray(history, dtype=np.float64)
+        origins = sorted(int(origin) for origin in origins)
+        m = self.season_length
+        if not origins or origins[0] < 2 * m or origins[-1] > history.shape[1]:
+            raise ValueError(f"Origins must lie within [{2 * m}, {history.shape[1]}]")
+
+        n = history.shape[0]
+        rows = np.arange(n)
+        tail = (1.0 - self.interval) / 2.0
+        grid = self.param_grid[:, :, None]
+        alpha, beta, gamma = grid[:, 0], grid[:, 1], grid[:, 2]
+        level0, trend0, season0 = self._initial_state(history)
+        groups = self.param_grid.shape[0]
+        level = np.broadcast_to(level0, (groups, n)).copy()
+        trend = np.broadcast_to(trend0, (groups, n)).copy()
+        season = np.broadcast_to(season0, (groups, n, m)).copy()
+        sse = np.zeros((groups, n))
+        residuals = np.empty((groups, n, origins[-1]))
+
+        shape = (n, len(origins), horizon)
+        values, lower, upper = np.empty(shape), np.empty(shape), np.empty(shape)
+        next_origin = 0
+        for t in range(origins[-1]):
+            level, trend, error = self._step(level, trend, season, history[:, t], alpha, beta, gamma, t % m)
+            if t >= m:
+                sse += error * error
+            residuals[:, :, t] = error
+            while next_origin < len(origins) and origins[next_origin] == t + 1:
+                best = np.argmin(sse, axis=0)
+                chosen = residuals[best, rows, m : t + 1]
+                state = HoltWintersState(
+                    level=level[best, rows],
+                    trend=trend[best, rows],
+                    season=season[best, rows],
+                    alpha=self.param_grid[best, 0],
+                    beta=self.param_grid[best, 1],
+                    gamma=self.param_grid[best, 2],
+                    observations=t + 1,
+                    residual_quantiles=np.quantile(chosen, [tail, 1.0 - tail], axis=1).T,
+                    error_scale=np.mean(chosen * chosen, axis=1),
+                    error_ewma=np.zeros(n),
+                )
+                batch = self.forecast(state, horizon)
+                values[:, next_origin], lower[:, next_origin], upper[:, next_origin] = batch.values, batch.lower, batch.upper
+                next_origin += 1
+        return ForecastBatch(values=values, lower=lower, upper=upper)
+
+
+def smape(actual: np.ndarray, forecast: np.ndarray) -> float:
+    """Symmetric MAPE in percent, ignoring NaN actuals and 0/0 days."""
+    denom = np.abs(actual) + np.abs(forecast)
+    mask = ~np.isnan(actual) & (denom > 0)
+    return float(200.0 * np.mean(np.abs(forecast[mask] - actual[mask]) / denom[mask])) if mask.any() else 0.0
+
+
+def incremental_parity_backtest(
+    engine: ForecastEngine,
+    history: np.ndarray,
+    update_days: int = 28,
+    horizon: int = 28,
+) -> dict:
+    """
+    Compare incremental updates against a full refit on the same data.
+
+    The first T - update_days - horizon days are fitted, the next `update_days` are folded in
+    with `update`, and the last `horizon` days score both that state and a full refit over the
+    first T - horizon days.
+    """
+    history = np.asarray(history, dtype=np.float64)
+    train_end = history.shape[1] - update_days - horizon
+    if train_end < 2 * engine.season_length:
+        raise ValueError("History too short for the requested update and evaluation windows")
+    actual = history[:, -horizon:]
+
+    state = engine.fit(history[:, :train_end])
+    engine.update(state, history[:, train_end : train_end + update_days])
+    incremental = engine.forecast(state, horizon).values
+    refit = engine.fit_forecast(history[:, : train_end + update_days], horizon).values
+
+    incremental_smape = smape(actual, incremental)
+    refit_smape = smape(actual, refit)
+    return {
+        "series": history.shape[0],
+        "update_days": update_days,
+        "horizon": horizon,
+        "incremental_smape": round(incremental_smape, 3),
+        "refit_smape": round(refit_smape, 3),
+        "smape_gap": round(incremental_smape - refit_smape, 3),
+    }
@@ -0,0 +1,221 @@
+"""
+Hierarchical Forecast Reconciliation
+Makes SKU, category and total forecasts add up (total = Σ categories = Σ SKUs).
+
+Nodes are ordered [total, categories..., SKUs] and the summing matrix S = [A; I] maps SKU-level
+forecasts onto every node, with A the sparse (1 + categories) × SKUs aggregation block.
+
+Methods:
+    bottom_up    ỹ = S ŷ_bottom
+    mint_diag    MinT with W = diag(one-step residual variances) (WLS)
+    mint_shrink  MinT with W = λ·diag(Σ̂) + (1 − λ)·Σ̂, the Schäfer–Strimmer shrinkage of the
+                 residual covariance Σ̂ = E Eᵀ / T
+
+MinT needs (Sᵀ W⁻¹ S)⁻¹, an SKUs × SKUs inverse. Here W⁻¹ and Sᵀ W⁻¹ S are both
+"diagonal + low rank": rank 1 + categories from A, plus rank T from the residual window under
+shrinkage. Both are inverted with the Woodbury identity, so 100k SKUs only ever solve a
+(1 + categories + T)-sized dense system and the cost stays linear in the number of SKUs.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+RECONCILIATION_METHODS = ("bottom_up", "mint_diag", "mint_shrink")
+TOTAL_NODE = "total"
+_VARIANCE_FLOOR = 1e-8
+
+
+def category_node(category: str) -> str:
+    return f"category:{category}"
+
+
+@dataclass
+class Hierarchy:
+    """Two-level product hierarchy: every SKU belongs to exactly one category."""
+
+    product_ids: List[str]
+    categories: List[str]
+    category_index: np.ndarray  # (SKUs,) int index into `categories`
+
+    @classmethod
+    def from_pairs(cls, pairs: Sequence[Tuple[str, str]]) -> "Hierarchy":
+        """Build from (product_id, category) pairs; the first category seen for a product wins."""
+        first: Dict[str, str] = {}
+        for product_id, category in pairs:
+            first.setdefault(product_id, category)
+        categories = sorted(set(first.values()))
+        lookup = {category: idx for idx, category in enumerate(categories)}
+        return cls(
+            product_ids=list(first),
+            categories=categories,
+            category_index=np.array([lookup[category] for category in first.values()], dtype=np.int64),
+        )
+
+    @property
+    def n_bottom(self) -> int:
+        return len(self.product_ids)
+
+    @property
+    def n_aggregate(self) -> int:
+        return 1 + len(self.categories)
+
+    def aggregate_labels(self) -> List[str]:
+        return [TOTAL_NODE] + [category_node(category) for category in self.categories]
+
+    def aggregation_matrix(self) -> sp.csr_matrix:
+        """A: (1 + categories) × SKUs, a row of ones for the total and one indicator row per category."""
+        n = self.n_bottom
+        rows = np.concatenate([np.zeros(n, dtype=np.int64), 1 + self.category_index])
+        cols = np.concatenate([np.arange(n), np.arange(n)])
+        return sp.csr_matrix((np.ones(2 * n), (rows, cols)), shape=(self.n_aggregate, n))
+
+    def summing_matrix(self) -> sp.csr_matrix:
+        return sp.vstack([self.aggregation_matrix(), sp.identity(self.n_bottom, format="csr")], format="csr")
+
+    def take(self, rows: np.ndarray) -> "Hierarchy":
+        """Subset or reorder SKUs (categories are kept)."""
+        return Hierarchy(
+            product_ids=[self.product_ids[row] for row in rows],
+            categories=self.categories,
+            category_index=self.category_index[rows],
+        )
+
+
+def aggregate(hierarchy: Hierarchy, bottom: np.ndarray) -> np.ndarray:
+    """Aggregate-node series for SKU-level rows `bottom` (SKUs × T), NaN treated as zero."""
+    return hierarchy.aggregation_matrix() @ np.nan_to_num(bottom)
+
+
+def reconcile(
+    hierarchy: Hierarchy,
+    base: np.ndarray,
+    residuals: Optional[np.ndarray] = None,
+    method: str = "mint_shrink",
+) -> np.ndarray:
+    """
+    Reconcile base forecasts for every node.
+
+    Args:
+        hierarchy: SKU → category mapping
+        base: (nodes × horizon) base forecasts, rows ordered [total, categories..., SKUs]
+        residuals: (nodes × T) in-sample one-step residuals, same row order (MinT only)
+        method: one of RECONCILIATION_METHODS
+
+    Returns:
+        (nodes × horizon) coherent forecasts
+    """
+    if method not in RECONCILIATION_METHODS:
+        raise ValueError(f"Unknown reconciliation method '{method}'. Use one of {RECONCILIATION_METHODS}")
+    n_agg = hierarchy.n_aggregate
+    if base.shape[0] != n_agg + hierarchy.n_bottom:
+        raise ValueError(f"Expected {n_agg + hierarchy.n_bottom} base forecast rows, got {base.shape[0]}")
+    A = hierarchy.aggregation_matrix()
+
+    if method == "bottom_up" or residuals is None or residuals.shape[1] == 0:
+        bottom = base[n_agg:]
+    else:
+        variances = np.maximum(np.mean(residuals * residuals, axis=1), _VARIANCE_FLOOR)
+        if method == "mint_diag":
+            diagonal, low_rank = variances, None
+        else:
+            shrinkage = shrinkage_intensity(residuals, variances)
+            diagonal = np.maximum(shrinkage * variances, _VARIANCE_FLOOR)
+            low_rank = np.sqrt((1.0 - shrinkage) / residuals.shape[1]) * residuals if shrinkage < 1.0 else None
+        bottom = _mint_bottom(A, base, diagonal, low_rank)
+
+    return np.vstack([A @ bottom, bottom])
+
+
+def shrinkage_intensity(residuals: np.ndarray, variances: Optional[np.ndarray] = None) -> float:
+    """
+    Schäfer–Strimmer λ for shrinking the residual correlation matrix towards the identity.
+
+    λ = Σ_{i≠j} Var(r_ij) / Σ_{i≠j} r_ij², computed from T × T Gram matrices rather than the
+    nodes × nodes correlation matrix.
+    """
+    T = residuals.shape[1]
+    if T < 2:
+        return 1.0
+    if variances is None:
+        variances = np.maximum(np.mean(residuals * residuals, axis=1), _VARIANCE_FLOOR)
+    X = residuals / np.sqrt(variances)[:, None]  # standardised, nodes × T
+
+    squares = X * X
+    per_day = squares.sum(axis=0)  # Σ_i x_ti²
+    w_sq_all = float(np.sum(per_day * per_day))  # Σ_{i,j} Σ_t (x_ti x_tj)²
+    w_sq_diag = float(np.sum(squares * squares))
+    gram = X.T @ X  # T × T; ||XᵀX||_F = ||X Xᵀ||_F
+    r_sq_all = float(np.sum(gram * gram)) / (T * T)  # Σ_{i,j} r_ij² with r_ij = mean_t x_ti x_tj
+    r_sq_diag = float(np.sum(np.square(squares.mean(axis=1))))
+
+    r_sq_off = r_sq_all - r_sq_diag
+    if r_sq_off <= 0:
+        return 1.0
+    var_off = T / (T - 1) ** 3 * ((w_sq_all - w_sq_diag) - T * r_sq_off)
+    return float(np.clip(var_off / r_sq_off, 0.0, 1.0))
+
+
+def _mint_bottom(
+    A: sp.csr_matrix,
+    base: np.ndarray,
+    diagonal: np.ndarray,
+    low_rank: Optional[np.ndarray],
+) -> np.ndarray:
+    """ŷ_bottom = (Sᵀ W⁻¹ S)⁻¹ Sᵀ W⁻¹ ŷ with W = diag(diagonal) + U Uᵀ and S = [A; I]."""
+    n_agg = A.shape[0]
+    d_inv = 1.0 / diagonal
+
+    # W⁻¹ = D⁻¹ − D⁻¹ U K Uᵀ D⁻¹ with K = (I + Uᵀ D⁻¹ U)⁻¹
+    weighted = d_inv[:, None] * base
+    V = None
+    if low_rank is not None:
+        U = low_rank
+        DU = d_inv[:, None] * U
+        K = np.linalg.inv(np.eye(U.shape[1]) + U.T @ DU)
+        weighted = weighted - DU @ (K @ (U.T @ weighted))
+        V = A.T @ DU[:n_agg] + DU[n_agg:]  # Sᵀ D⁻¹ U, SKUs × T
+
+    rhs = A.T @ weighted[:n_agg] + weighted[n_agg:]  # Sᵀ W⁻¹ ŷ
+
+    # Sᵀ W⁻¹ S = Db + L C Lᵀ with Db = D⁻¹ over SKUs, L = [Aᵀ | V], C = blockdiag(D⁻¹ over aggregates, −K).
+    db_inv = diagonal[n_agg:]
+    c_inv_blocks = [np.diag(diagonal[:n_agg])]
+    if V is not None:
+        c_inv_blocks.append(-np.linalg.inv(K))
+
+    def l_t(x: np.ndarray) -> np.ndarray:
+        parts = [A @ x]
+        if V is not None:
+            parts.append(V.T @ x)
+        return np.vstack(parts)
+
+    def l(y: np.ndarray) -> np.ndarray:
+        out = A.T @ y[:n_agg]
+        if V is not None:
+            out = out + V @ y[n_agg:]
+        return out
+
+    # Woodbury: (Db + L C Lᵀ)⁻¹ = Db⁻¹ − Db⁻¹ L (C⁻¹ + Lᵀ Db⁻¹ L)⁻¹ Lᵀ Db⁻¹
+    size = sum(block.shape[0] for block in c_inv_blocks)
+    c_inv = np.zeros((size, size))
+    offset = 0
+    for block in c_inv_blocks:
+        c_inv[offset : offset + block.shape[0], offset : offset + block.shape[0]] = block
+        offset += block.shape[0]
+    lt_db_l = l_t(db_inv[:, None] * _dense_l(A, V))
+    inner = c_inv + lt_db_l
+    x = db_inv[:, None] * rhs
+    return x - db_inv[:, None] * l(np.linalg.solve(inner, l_t(x)))
+
+
+def _dense_l(A: sp.csr_matrix, V: Optional[np.ndarray]) -> np.ndarray:
+    """L = [Aᵀ | V] as a dense SKUs × (aggregates + T) block."""
+    blocks = [A.T.toarray()]
+    if V is not None:
+        blocks.append(V)
+    return np.hstack(blocks)
@@ -0,0 +1,518 @@
+"""
+Precomputed Forecast Store
+Columnar, memory-mapped store of the forecasts produced by the retrain flow.
+
+`train_forecasting_model` in prefect_flows/ml_retrain.py runs `refresh`. Each run writes one version
+directory holding every SKU's forecast path out to the longest standard horizon. A full `build` refits
+every SKU. Between builds, `refresh` folds the new days of actuals into the stored per-SKU state and
+refits only the SKUs flagged for drift. The same hierarchy fit and reconciliation back the forecasts
+the service computes live when no store covers a request.
+
+Holt-Winters projections do not depend on the requested horizon, so 7/30/60-day forecasts are
+prefixes of the 90-day path and are served as slices. Only horizons beyond the stored one are
+computed per request.
+
+Layout of a version directory:
+    manifest.json     data_version, start_date, horizon, model versions
+    product_ids.npy   sorted fixed-width unicode keys (binary-searched, memory-mapped)
+    products.npy      float32 (products, 3, horizon): value / lower / upper
+    aggregates.npy    float32 (aggregates, 3, horizon) for the total and per-category series
+    state.npz         per-SKU Holt-Winters state, so the next run can fold in new actuals instead of refitting
+    aggregate_state.npz, category_index.npy, residuals.npy
+                      aggregate-node state, SKU → category mapping and the recent one-step residual
+                      window used for MinT reconciliation (see forecast_reconciliation.py)
+    lead_time.npy     float32 (products, levels) bootstrapped quantiles of each SKU's lead-time demand,
+                      which size the restock recommendation; days and levels are in the manifest
+
+Stored forecasts are reconciled: each SKU sums into its category and the categories sum into the total.
+
+`CURRENT` names the live version and is swapped atomically, so readers never see a partial write.
+
+Usage:
+    python -m src.services.forecast_store build [--output-dir DIR]
+    python -m src.services.forecast_store refresh [--actuals PATH] [--output-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from src.services.forecast_engine import (
+    DEFAULT_DRIFT_THRESHOLD,
+    DEFAULT_PATHS,
+    DEFAULT_QUANTILES,
+    ForecastBatch,
+    ForecastEngine,
+    HoltWintersState,
+    QuantileForecast,
+)
+from src.services.forecast_reconciliation import Hierarchy, aggregate, reconcile
+from src.services.sales_history import (
+    DAILY_ACTUALS_PATH,
+    HISTORY_DAYS,
+    history_end,
+    load_daily_actuals,
+    product_catalog,
+    product_history,
+    sales_history_store,
+)
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+FORECAST_STORE_DIR = Path(os.getenv("FORECAST_STORE_DIR", str(BASE_DIR / "artifacts" / "forecasts")))
+STANDARD_HORIZONS = (7, 30, 60, 90)
+CURRENT_POINTER = "CURRENT"
+KEEP_VERSIONS = 2
+MODEL_VERSIONS = {"prophet": "prophet-seasonal-v1.3", "xgboost": "xgboost-demand-v0.9"}
+REFIT_INTERVAL_DAYS = int(os.getenv("FORECAST_REFIT_INTERVAL_DAYS", "7"))
+DRIFT_THRESHOLD = float(os.getenv("FORECAST_DRIFT_THRESHOLD", str(DEFAULT_DRIFT_THRESHOLD)))
+RECONCILIATION_METHOD = os.getenv("FORECAST_RECONCILIATION", "mint_shrink")
+RESIDUAL_WINDOW = 56  # one-step residual days kept per node for the MinT covariance
+BATCH_WORKERS = int(os.getenv("FORECAST_BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_CHUNK_SIZE = int(os.getenv("FORECAST_BATCH_CHUNK_SIZE", "256"))
+FORECAST_QUANTILES = tuple(
+    float(level) for level in os.getenv("FORECAST_QUANTILES", ",".join(map(str, DEFAULT_QUANTILES))).split(",")
+)
+QUANTILE_PATHS = int(os.getenv("FORECAST_QUANTILE_PATHS", str(DEFAULT_PATHS)))
+# Restock units cover the RESTOCK_SERVICE_LEVEL quantile of demand over the next RESTOCK_LEAD_DAYS days.
+RESTOCK_LEAD_DAYS = int(os.getenv("FORECAST_RESTOCK_LEAD_DAYS", "7"))
+RESTOCK_SERVICE_LEVEL = float(os.getenv("FORECAST_RESTOCK_SERVICE_LEVEL", "0.9"))
+RESTOCK_LEVELS = tuple(sorted({*FORECAST_QUANTILES, 0.5, RESTOCK_SERVICE_LEVEL}))
+
+
+@dataclass
+class HierarchyModel:
+    """Fitted state for every node of the product hierarchy, persisted so refreshes can update it in place."""
+
+    hierarchy: Hierarchy
+    sku_state: HoltWintersState  # rows follow hierarchy.product_ids
+    aggregate_state: HoltWintersState  # rows follow hierarchy.aggregate_labels()
+    residuals: np.ndarray  # (nodes × window) one-step residuals, rows [total, categories..., SKUs]
+
+
+@dataclass
+class LeadTimeDemand:
+    """Quantiles (n × levels) of each SKU's total demand over the next `days` days."""
+
+    days: int
+    levels: Tuple[float, ...]
+    quantiles: np.ndarray
+
+    def at(self, row: int) -> Dict[float, float]:
+        return dict(zip(self.levels, self.quantiles[row].tolist()))
+
+
+class ForecastSnapshot:
+    """One published forecast version, memory-mapped."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.manifest: Dict[str, Any] = json.loads((path / "manifest.json").read_text())
+        self.data_version: str = self.manifest["data_version"]
+        self.start_date = datetime.fromisoformat(self.manifest["start_date"])
+        self.horizon: int = self.manifest["horizon"]
+        self.fitted_at = datetime.fromisoformat(self.manifest.get("fitted_at", self.manifest["start_date"]))
+        self._product_ids = np.load(path / "product_ids.npy", mmap_mode="r")
+        self._products = np.load(path / "products.npy", mmap_mode="r")
+        self._aggregates = np.load(path / "aggregates.npy", mmap_mode="r")
+        self._aggregate_rows = {name: idx for idx, name in enumerate(self.manifest["aggregates"])}
+        lead_time = self.manifest.get("lead_time")
+        self._lead_time = np.load(path / "lead_time.npy", mmap_mode="r") if lead_time else None
+
+    def __len__(self) -> int:
+        return self._product_ids.shape[0]
+
+    @property
+    def product_ids(self) -> List[str]:
+        return self._product_ids.tolist()
+
+    @property
+    def aggregate_labels(self) -> List[str]:
+        return list(self._aggregate_rows)
+
+    def load_model(self) -> Optional[HierarchyModel]:
+        """Fitted hierarchy state (SKU rows in `product_ids` order), or None for versions written without one."""
+        try:
+            with np.load(self.path / "state.npz") as arrays:
+                sku_state = HoltWintersState.from_arrays(arrays)
+            with np.load(self.path / "aggregate_state.npz") as arrays:
+                aggregate_state = HoltWintersState.from_arrays(arrays)
+            category_index = np.load(self.path / "category_index.npy")
+            residuals = np.load(self.path / "residuals.npy")
+        except OSError:
+            return None
+        hierarchy = Hierarchy(
+            product_ids=self.product_ids,
+            categories=self.manifest["categories"],
+            category_index=category_index,
+        )
+        return HierarchyModel(hierarchy, sku_state, aggregate_state, residuals)
+
+    def covers(self, horizon: int) -> bool:
+        return horizon <= self.horizon
+
+    def product_row(self, product_id: str) -> Optional[int]:
+        idx = int(np.searchsorted(self._product_ids, product_id))
+        if idx < len(self) and self._product_ids[idx] == product_id:
+            return idx
+        return None
+
+    def products(self, product_ids: Sequence[str], horizon: int) -> Dict[str, ForecastBatch]:
+        """Forecasts for the stored subset of `product_ids` (missing ids are simply absent)."""
+        rows = {product_id: row for product_id in product_ids if (row := self.product_row(product_id)) is not None}
+        return {product_id: self._batch(self._products[row : row + 1], horizon) for product_id, row in rows.items()}
+
+    def lead_time_demand(self, product_ids: Sequence[str]) -> Optional[LeadTimeDemand]:
+        """Stored lead-time demand quantiles with rows following `product_ids` (all of which must be stored)."""
+        if self._lead_time is None:
+            return None
+        rows = [self.product_row(product_id) for product_id in product_ids]
+        meta = self.manifest["lead_time"]
+        return LeadTimeDemand(
+            days=meta["days"],
+            levels=tuple(meta["levels"]),
+            quantiles=np.asarray(self._lead_time[rows], dtype=np.float64),
+        )
+
+    def aggregate(self, name: str, horizon: int) -> Optional[ForecastBatch]:
+        row = self._aggregate_rows.get(name)
+        if row is None:
+            return None
+        return self._batch(self._aggregates[row : row + 1], horizon)
+
+    @staticmethod
+    def _batch(block: np.ndarray, horizon: int) -> ForecastBatch:
+        block = np.asarray(block[:, :, :horizon], dtype=np.float64)
+        return ForecastBatch(values=block[:, 0], lower=block[:, 1], upper=block[:, 2])
+
+
+class ForecastStore:
+    """Reader that follows the `CURRENT` pointer and re-maps when the retrain flow publishes."""
+
+    def __init__(self, root: Path = FORECAST_STORE_DIR, check_interval_sec: float = 1.0):
+        self.root = root
+        self._check_interval = check_interval_sec
+        self._last_check = 0.0
+        self._pointer_mtime: Optional[float] = None
+        self._snapshot: Optional[ForecastSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[ForecastSnapshot]:
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval:
+            return self._snapshot
+        with self._lock:
+            self._last_check = now
+            pointer = self.root / CURRENT_POINTER
+            try:
+                mtime = pointer.stat().st_mtime
+            except OSError:
+                self._snapshot, self._pointer_mtime = None, None
+                return None
+            if mtime != self._pointer_mtime:
+                try:
+                    self._snapshot = ForecastSnapshot(self.root / pointer.read_text().strip())
+                    self._pointer_mtime = mtime
+                    logger.info(
+                        "Loaded forecast store",
+                        data_version=self._snapshot.data_version,
+                        products=len(self._snapshot),
+                        horizon=self._snapshot.horizon,
+                    )
+                except (OSError, ValueError, KeyError) as exc:
+                    logger.warning("Forecast store unreadable; computing on demand", error=str(exc))
+                    self._snapshot = None
+            return self._snapshot
+
+
+def write_forecast_store(
+    model: HierarchyModel,
+    products: ForecastBatch,
+    aggregates: Dict[str, ForecastBatch],
+    start_date: datetime,
+    model_versions: Dict[str, str],
+    root: Path = FORECAST_STORE_DIR,
+    fitted_at: Optional[datetime] = None,
+    extra: Optional[Dict[str, Any]] = None,
+    lead_time: Optional[LeadTimeDemand] = None,
+) -> Path:
+    """
+    Write a new version directory and atomically point `CURRENT` at it.
+
+    Rows of `products` (and `lead_time`) follow `model.hierarchy.product_ids`; `fitted_at` is when the
+    state was last fully refit.
+    """
+    data_version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    version_dir = root / data_version
+    version_dir.mkdir(parents=True, exist_ok=False)
+
+    hierarchy = model.hierarchy
+    ids = np.asarray(hierarchy.product_ids, dtype=str)
+    order = np.argsort(ids, kind="stable")
+    n_agg = hierarchy.n_aggregate
+    np.save(version_dir / "product_ids.npy", ids[order])
+    np.save(version_dir / "products.npy", _stack(products)[order])
+    np.save(version_dir / "aggregates.npy", np.concatenate([_stack(batch) for batch in aggregates.values()]))
+    np.savez(version_dir / "state.npz", **model.sku_state.take(order).to_arrays())
+    np.savez(version_dir / "aggregate_state.npz", **model.aggregate_state.to_arrays())
+    np.save(version_dir / "category_index.npy", hierarchy.category_index[order])
+    np.save(version_dir / "residuals.npy", np.concatenate([model.residuals[:n_agg], model.residuals[n_agg:][order]]))
+    if lead_time is not None:
+        np.save(version_dir / "lead_time.npy", lead_time.quantiles[order].astype(np.float32))
+    manifest = {
+        "data_version": data_version,
+        "start_date": start_date.isoformat(),
+        "fitted_at": (fitted_at or datetime.utcnow()).isoformat(),
+        "horizon": products.values.shape[1],
+        "standard_horizons": list(STANDARD_HORIZONS),
+        "products": len(ids),
+        "categories": hierarchy.categories,
+        "aggregates": list(aggregates),
+        "model_versions": model_versions,
+        "lead_time": {"days": lead_time.days, "levels": list(lead_time.levels)} if lead_time is not None else None,
+        **(extra or {}),
+    }
+    (version_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    tmp_pointer = root / f"{CURRENT_POINTER}.tmp"
+    tmp_pointer.write_text(data_version)
+    os.replace(tmp_pointer, root / CURRENT_POINTER)
+    _prune_versions(root, keep=KEEP_VERSIONS)
+    logger.info("Published forecast store", data_version=data_version, products=len(ids), path=str(version_dir))
+    return version_dir
+
+
+def build_forecast_store(
+    root: Path = FORECAST_STORE_DIR,
+    engine: Optional[ForecastEngine] = None,
+    model_versions: Dict[str, str] = MODEL_VERSIONS,
+) -> Path:
+    """Forecast and reconcile every catalog node to the longest standard horizon and publish the result."""
+    engine = engine or ForecastEngine()
+    horizon = max(STANDARD_HORIZONS)
+    hierarchy = Hierarchy.from_pairs(product_catalog())
+    start_date = datetime.combine(history_end() + timedelta(days=1), datetime.min.time())
+    logger.info("Building forecast store", products=hierarchy.n_bottom, horizon=horizon)
+
+    model = fit_hierarchy(engine, hierarchy)
+    products, aggregates = reconciled_forecasts(engine, model, horizon)
+    return write_forecast_store(
+        model,
+        products,
+        aggregates,
+        start_date,
+        model_versions,
+        root,
+        extra={"refresh": {"mode": "full", "products_refit": hierarchy.n_bottom}},
+        lead_time=model_lead_time(engine, model, products),
+    )
+
+
+def refresh_forecast_store(
+    root: Path = FORECAST_STORE_DIR,
+    actuals_path: Optional[Path] = None,
+    engine: Optional[ForecastEngine] = None,
+    model_versions: Dict[str, str] = MODEL_VERSIONS,
+) -> Path:
+    """
+    Nightly refresh: fold new daily actuals into the stored per-node state and republish.
+
+    Cost scales with the number of new days, not with history length. A full rebuild runs when no
+    state exists or the last full fit is older than FORECAST_REFIT_INTERVAL_DAYS; otherwise only
+    SKUs whose recent errors drifted past FORECAST_DRIFT_THRESHOLD are refit. SKUs added to the
+    catalog since the last full fit are served on demand until the next one.
+    """
+    engine = engine or ForecastEngine()
+    snapshot = ForecastStore(root, check_interval_sec=0).current()
+    model = snapshot.load_model() if snapshot is not None else None
+    if model is None or datetime.utcnow() - snapshot.fitted_at >= timedelta(days=REFIT_INTERVAL_DAYS):
+        logger.info("Scheduled full forecast refit", has_state=model is not None)
+        return build_forecast_store(root, engine, model_versions)
+
+    hierarchy = model.hierarchy
+    n_agg = hierarchy.n_aggregate
+    actuals = _new_actuals(hierarchy.product_ids, snapshot.start_date.date(), actuals_path)
+    new_days = actuals.shape[1]
+    if new_days:
+        sku_errors = engine.update(model.sku_state, actuals)
+        aggregate_errors = engine.update(model.aggregate_state, _aggregate_actuals(hierarchy, actuals))
+        window = model.residuals.shape[1]
+        model.residuals = np.hstack([model.residuals, np.vstack([aggregate_errors, sku_errors])])[:, -window:]
+    drifted = engine.drifted(model.sku_state, DRIFT_THRESHOLD)
+    if drifted.size:
+        refit, refit_residuals = engine.fit_with_residuals(
+            product_history([hierarchy.product_ids[row] for row in drifted]), model.residuals.shape[1]
+        )
+        model.sku_state.merge(drifted, refit)
+        model.residuals[n_agg + drifted] = refit_residuals
+    logger.info(
+        "Incremental forecast refresh", products=hierarchy.n_bottom, new_days=new_days, drifted=int(drifted.size)
+    )
+
+    products, aggregates = reconciled_forecasts(engine, model, snapshot.horizon)
+    return write_forecast_store(
+        model,
+        products,
+        aggregates,
+        snapshot.start_date + timedelta(days=new_days),
+        model_versions,
+        root,
+        fitted_at=snapshot.fitted_at,
+        extra={"refresh": {"mode": "incremental", "new_days": new_days, "products_refit": int(drifted.size)}},
+        lead_time=model_lead_time(engine, model, products),
+    )
+
+
+def fit_hierarchy(engine: ForecastEngine, hierarchy: Hierarchy) -> HierarchyModel:
+    """Fit every SKU (in chunks) plus the category and total series aggregated from the same histories."""
+    n_agg = hierarchy.n_aggregate
+    states, residuals = [], []
+    aggregate_history = np.zeros((n_agg, HISTORY_DAYS))
+    for i in range(0, hierarchy.n_bottom, BATCH_CHUNK_SIZE):
+        rows = np.arange(i, min(i + BATCH_CHUNK_SIZE, hierarchy.n_bottom))
+        history = product_history(hierarchy.product_ids[i : i + BATCH_CHUNK_SIZE])
+        aggregate_history += aggregate(hierarchy.take(rows), history)
+        state, window = engine.fit_with_residuals(history, RESIDUAL_WINDOW)
+        states.append(state)
+        residuals.append(window)
+    aggregate_state, aggregate_residuals = engine.fit_with_residuals(aggregate_history, RESIDUAL_WINDOW)
+    return HierarchyModel(
+        hierarchy=hierarchy,
+        sku_state=HoltWintersState.concatenate(states),
+        aggregate_state=aggregate_state,
+        residuals=np.vstack([aggregate_residuals, *residuals]),
+    )
+
+
+def reconciled_forecasts(
+    engine: ForecastEngine, model: HierarchyModel, horizon: int
+) -> Tuple[ForecastBatch, Dict[str, ForecastBatch]]:
+    """
+    Base forecasts for every node, reconciled with FORECAST_RECONCILIATION.
+
+    Interval bands keep each node's base width and move with its reconciled point forecast.
+    """
+    n_agg = model.hierarchy.n_aggregate
+    sku = engine.forecast(model.sku_state, horizon)
+    agg = engine.forecast(model.aggregate_state, horizon)
+    base = np.vstack([agg.values, sku.values])
+    shift = reconcile(model.hierarchy, base, model.residuals, RECONCILIATION_METHOD) - base
+    lower = np.vstack([agg.lower, sku.lower]) + shift
+    upper = np.vstack([agg.upper, sku.upper]) + shift
+    values = base + shift
+
+    products = ForecastBatch(values=values[n_agg:], lower=lower[n_agg:], upper=upper[n_agg:])
+    aggregates = {
+        label: ForecastBatch(values=values[row : row + 1], lower=lower[row : row + 1], upper=upper[row : row + 1])
+        for row, label in enumerate(model.hierarchy.aggregate_labels())
+    }
+    return products, aggregates
+
+
+def model_lead_time(engine: ForecastEngine, model: HierarchyModel, products: ForecastBatch) -> LeadTimeDemand:
+    """Lead-time demand quantiles for every SKU of a fitted hierarchy, around its reconciled forecasts."""
+    residuals = model.residuals[model.hierarchy.n_aggregate :]
+    return as_lead_time(
+        simulate_demand(engine, model.sku_state, residuals, products.values[:, :RESTOCK_LEAD_DAYS], RESTOCK_LEVELS)
+    )
+
+
+def simulate_demand(
+    engine: ForecastEngine,
+    state: HoltWintersState,
+    residuals: np.ndarray,
+    served: np.ndarray,
+    levels: Sequence[float],
+) -> QuantileForecast:
+    """
+    Bootstrapped demand quantiles over the days of `served` (n × days), moved onto the served forecast.
+
+    Served forecasts may be reconciled away from the state's own projection, so each day's quantiles
+    shift by that day's adjustment and the lead-time quantiles by the adjustment summed over the lead time.
+    """
+    horizon = served.shape[1]
+    simulated = engine.simulate_quantiles(
+        state, residuals, horizon, levels, QUANTILE_PATHS, cumulative_days=min(RESTOCK_LEAD_DAYS, horizon)
+    )
+    shift = served - engine.forecast(state, horizon).values
+    lead_shift = shift[:, : simulated.cumulative_days].sum(axis=1)
+    return QuantileForecast(
+        levels=simulated.levels,
+        values=np.maximum(simulated.values + shift[:, None, :], 0.0),
+        cumulative=np.maximum(simulated.cumulative + lead_shift[:, None], 0.0),
+        cumulative_days=simulated.cumulative_days,
+    )
+
+
+def as_lead_time(simulated: QuantileForecast) -> LeadTimeDemand:
+    return LeadTimeDemand(
+        days=simulated.cumulative_days, levels=tuple(simulated.levels.tolist()), quantiles=simulated.cumulative
+    )
+
+
+def _new_actuals(product_ids: List[str], first_day: date, actuals_path: Optional[Path]) -> np.ndarray:
+    """Actuals from `first_day` on: stored sales history when there is a store, else the daily export."""
+    history = sales_history_store.current()
+    if history is None:
+        return load_daily_actuals(actuals_path or DAILY_ACTUALS_PATH, product_ids, first_day)
+    new_days = (history.end_date - first_day).days + 1
+    if new_days <= 0:
+        return np.empty((len(product_ids), 0))
+    return history.read(product_ids, new_days)
+
+
+def _aggregate_actuals(hierarchy: Hierarchy, actuals: np.ndarray) -> np.ndarray:
+    """Sum SKU actuals per aggregate node; a node-day with no reporting SKU stays NaN."""
+    sums = aggregate(hierarchy, actuals)
+    reported = aggregate(hierarchy, (~np.isnan(actuals)).astype(np.float64))
+    sums[reported == 0] = np.nan
+    return sums
+
+
+def _stack(batch: ForecastBatch) -> np.ndarray:
+    return np.stack([batch.values, batch.lower, batch.upper], axis=1).astype(np.float32)
+
+
+def _prune_versions(root: Path, keep: int) -> None:
+    # Readers that still map an older version keep their pages; unlinking only drops the names.
+    versions: List[Path] = sorted(path for path in root.iterdir() if path.is_dir())
+    for stale in versions[:-keep]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precomputed forecast store maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Forecast every known SKU and publish a new version")
+    build.add_argument("--output-dir", default=str(FORECAST_STORE_DIR))
+    refresh = subcommands.add_parser(
+        "refresh", help="Fold new daily actuals into the stored state (full build when due or missing)"
+    )
+    refresh.add_argument("--output-dir", default=str(FORECAST_STORE_DIR))
+    refresh.add_argument("--actuals", default=None, help="Parquet with product_id, date, units")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        version_dir = build_forecast_store(Path(args.output_dir))
+    else:
+        version_dir = refresh_forecast_store(Path(args.output_dir), Path(args.actuals) if args.actuals else None)
+    manifest = json.loads((version_dir / "manifest.json").read_text())
+    keys = ("data_version", "products", "horizon", "fitted_at", "refresh")
+    print(json.dumps({key: manifest[key] for key in keys if key in manifest}))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,48 @@ Forecasting Service
 Implements Prophet and XGBoost-based demand forecasting
 """
 
+import asyncio
 import math
-import random
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 import structlog
 
+from src.services.forecast_backtest import BacktestResults
+from src.services.forecast_engine import ForecastBatch, ForecastEngine, HoltWintersState
+from src.services.forecast_reconciliation import RECONCILIATION_METHODS, TOTAL_NODE, Hierarchy, category_node
+from src.services.forecast_store import (
+    BATCH_CHUNK_SIZE,
+    BATCH_WORKERS,
+    MODEL_VERSIONS,
+    RECONCILIATION_METHOD,
+    RESIDUAL_WINDOW,
+    RESTOCK_LEAD_DAYS,
+    RESTOCK_LEVELS,
+    RESTOCK_SERVICE_LEVEL,
+    ForecastStore,
+    HierarchyModel,
+    LeadTimeDemand,
+    as_lead_time,
+    fit_hierarchy,
+    model_lead_time,
+    reconciled_forecasts,
+    simulate_demand,
+)
+from src.services.sales_history import product_catalog, product_history, sales_history_store
+from src.services.trend_index import TrendIndex, TrendSnapshot, TrendWindow, history_trends
+
 logger = structlog.get_logger(__name__)
 
+FORECAST_LAYOUTS = ("records", "columnar")
+
 
 @dataclass
 class ForecastPoint:
@@ -22,33 +54,125 @@ class ForecastPoint:
     upper: float
 
 
+@dataclass
+class ForecastSeries:
+    """Daily forecast path starting at `start_date`, kept as arrays until it is serialized."""
+
+    start_date: datetime
+    values: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    quantiles: Optional[Dict[float, np.ndarray]] = None  # per-day demand quantiles, quantile mode only
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def date(self, idx: int) -> datetime:
+        return self.start_date + timedelta(days=idx)
+
+    def points(self) -> List[ForecastPoint]:
+        return [
+            ForecastPoint(date=self.date(idx), value=value, lower=lower, upper=upper)
+            for idx, (value, lower, upper) in enumerate(
+                zip(self.values.tolist(), self.lower.tolist(), self.upper.tolist())
+            )
+        ]
+
+    def columnar(self) -> Dict[str, Any]:
+        """Parallel arrays (rounded like the record layout); numpy arrays are left to the serializer."""
+        return {
+            "start_date": self.start_date.strftime("%Y-%m-%d"),
+            "freq": "D",
+            "value": np.round(self.values, 2),
+            "lower_bound": np.round(self.lower, 2),
+            "upper_bound": np.round(self.upper, 2),
+            **{_quantile_key(level): np.round(path, 2) for level, path in (self.quantiles or {}).items()},
+        }
+
+
+@dataclass
+class LiveForecasts:
+    """
+    Reconciled forecasts of a hierarchy fitted in-process, read like a forecast store snapshot.
+
+    They are computed once for the longest horizon asked so far; shorter horizons are prefixes of it.
+    """
+
+    model: HierarchyModel
+    start_date: datetime
+    rows: Dict[str, int]
+    forecasts: ForecastBatch
+    aggregates: Dict[str, ForecastBatch]
+    lead_time: LeadTimeDemand
+
+    @property
+    def horizon(self) -> int:
+        return self.forecasts.values.shape[1]
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self.rows
+
+    def products(self, product_ids: Sequence[str], horizon: int) -> Dict[str, ForecastBatch]:
+        """Forecasts for the catalog subset of `product_ids` (missing ids are simply absent)."""
+        return {
+            product_id: _head(self.forecasts, horizon, self.rows[product_id])
+            for product_id in product_ids
+            if product_id in self.rows
+        }
+
+    def lead_time_demand(self, product_ids: Sequence[str]) -> LeadTimeDemand:
+        """Lead-time demand quantiles with rows following `product_ids` (all of which must be in the catalog)."""
+        rows = [self.rows[product_id] for product_id in product_ids]
+        return LeadTimeDemand(
+            days=self.lead_time.days, levels=self.lead_time.levels, quantiles=self.lead_time.quantiles[rows]
+        )
+
+    def aggregate(self, name: str, horizon: int) -> Optional[ForecastBatch]:
+        batch = self.aggregates.get(name)
+        return _head(batch, horizon) if batch is not None else None
+
+
 class ForecastingService:
     """Service for demand forecasting"""
 
     def __init__(self):
-        self.model_versions = {
-            "prophet": "prophet-seasonal-v1.3",
-            "xgboost": "xgboost-demand-v0.9",
-        }
+        self.model_versions = dict(MODEL_VERSIONS)
+        self.engine = ForecastEngine()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self.forecast_store = ForecastStore()
+        self._live_model: Optional[Tuple[date, HierarchyModel]] = None
+        self._live_forecasts: Optional[LiveForecasts] = None
+        self._live_lock = threading.Lock()
+        self.backtest_results = BacktestResults()
+        self.trend_index = TrendIndex()
+        self._live_trends: Optional[Tuple[date, TrendSnapshot]] = None
+        if RECONCILIATION_METHOD not in RECONCILIATION_METHODS:
+            raise ValueError(f"FORECAST_RECONCILIATION must be one of {RECONCILIATION_METHODS}")
+        if not all(0.0 < level < 1.0 for level in RESTOCK_LEVELS):
+            raise ValueError("FORECAST_QUANTILES and FORECAST_RESTOCK_SERVICE_LEVEL must lie strictly between 0 and 1")
         logger.info("Initialized ForecastingService", model_versions=self.model_versions)
 
     async def forecast_demand(
         self,
         horizon: int = 30,
         algorithm: str = "prophet",
+        layout: str = "records",
     ) -> Dict[str, Any]:
         logger.info("Forecasting demand", horizon=horizon, algorithm=algorithm)
-        base_series = self._synthetic_series(horizon, base=1040, weekly_seasonality=True)
+        loop = asyncio.get_running_loop()
+        base_series, data_version = await loop.run_in_executor(None, self._aggregate_series, TOTAL_NODE, horizon)
         scenarios = self._scenario_projection(base_series)
 
         return {
-            "forecast": [self._point_to_dict(point) for point in base_series],
+            "forecast": self._series_payload(base_series, layout),
             "algo": algorithm,
             "horizon": horizon,
             "generated_at": datetime.utcnow().isoformat() + "Z",
             "summary": self._summary_from_series(base_series),
             "scenarios": scenarios,
             "model_versions": self.model_versions,
+            "data_version": data_version,
         }
 
     async def forecast_product(
@@ -56,33 +180,81 @@ class ForecastingService:
         product_id: str,
         horizon: int = 30,
         algorithm: str = "prophet",
+        layout: str = "records",
+        quantiles: Optional[Sequence[float]] = None,
     ) -> Dict[str, Any]:
+        """
+        Reconciled product forecast with a restock recommendation sized from bootstrapped lead-time demand.
+
+        With `quantiles` (e.g. [0.1, 0.5, 0.9]) the forecast also carries per-day demand quantile paths
+        (`p10`, `p50`, ...), simulated from the SKU's own residuals around the served point forecast.
+        """
         logger.info("Forecasting product demand", product_id=product_id, horizon=horizon)
-        base_series = self._synthetic_series(horizon, base=68, growth=1.6, noise=8.5, weekly_seasonality=True)
+        if quantiles and not all(0.0 < level < 1.0 for level in quantiles):
+            raise ValueError("Quantiles must lie strictly between 0 and 1")
+        # A store miss fits or reconciles in-process, so it runs off the event loop.
+        loop = asyncio.get_running_loop()
+        base_series, lead_time, data_version = await loop.run_in_executor(
+            None, self._product_series, product_id, horizon, tuple(sorted(set(quantiles or ())))
+        )
         scenarios = self._scenario_projection(base_series, scale_factor=0.18)
-
-        recommendation = self._product_recommendation(base_series)
+        recommendation = self._product_recommendation(base_series, lead_time)
 
         return {
             "product_id": product_id,
-            "forecast": [self._point_to_dict(point) for point in base_series],
+            "forecast": self._series_payload(base_series, layout),
             "algo": algorithm,
             "horizon": horizon,
             "generated_at": datetime.utcnow().isoformat() + "Z",
             "scenarios": scenarios,
             "recommendation": recommendation,
             "model_versions": self.model_versions,
+            "data_version": data_version,
         }
 
-    async def get_trends(self, period: str = "30d") -> Dict[str, Any]:
-        logger.info("Getting demand trends", period=period)
-        period_days = self._period_to_days(period)
-        base_series = self._synthetic_series(period_days, base=960, growth=2.2, weekly_seasonality=True)
+    async def get_trends(
+        self,
+        period: str = "30d",
+        category: Optional[str] = None,
+        product_id: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sales trend over the last `period` (or the [start, end] range) against the window just before it.
+
+        Totals, growth and peak/trough days are lookups in the trend index, so no history is scanned.
+        A window reaching back before the first indexed day starts on that day instead.
+        """
+        logger.info("Getting demand trends", period=period, category=category, product_id=product_id)
+        days = self._period_to_days(period) if start is None else None
+        snapshot = self.trend_index.current()
+        if snapshot is None:
+            snapshot = await asyncio.get_running_loop().run_in_executor(None, self._get_live_trends)
+        node = product_id or (category_node(category) if category else TOTAL_NODE)
+        if node not in snapshot:
+            raise ValueError(f"Unknown product '{product_id}'" if product_id else f"Unknown category '{category}'")
+        end = end or snapshot.end_date
+        if end < snapshot.start_date:
+            raise ValueError(f"end must not be before the first indexed day ({snapshot.start_date.isoformat()})")
+        start = max(start or end - timedelta(days=days - 1), snapshot.start_date)
+        if start > end:
+            raise ValueError("start must not be after end")
+        if days is None:
+            period = f"{(end - start).days + 1}d"
+        span = timedelta(days=(end - start).days + 1)
+        current = snapshot.window(node, start, end)
+        previous = snapshot.window(node, start - span, start - timedelta(days=1))
+        growth = current.average / previous.average - 1.0 if previous.days and previous.average else None
 
         return {
             "period": period,
-            "growth_rate_pct": round(self._growth_rate(base_series) * 100, 2),
-            "trend": "increasing" if self._growth_rate(base_series) > 0 else "softening",
+            "category": category,
+            "product_id": product_id,
+            "window": self._window_summary(current),
+            "previous_window": self._window_summary(previous),
+            "growth_rate_pct": round(growth * 100, 2) if growth is not None else None,
+            "trend": "insufficient_history" if growth is None else "increasing" if growth > 0 else "softening",
             "seasonality": {
                 "weekly": {"strength": 0.62, "peak_day": "Saturday"},
                 "monthly": {"strength": 0.34, "peak_week": "Week 2"},
@@ -93,56 +265,271 @@ class ForecastingService:
                 {"feature": "Stockouts", "impact_pct": 6, "direction": "negative"},
             ],
             "model_versions": self.model_versions,
+            "data_version": snapshot.version,
         }
 
-    def get_metrics(self) -> Dict[str, Any]:
+    async def forecast_products_batch(
+        self,
+        product_ids: Sequence[str],
+        horizon: int = 30,
+        workers: Optional[int] = None,
+        layout: str = "records",
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Forecast many products, yielding per-product results as they are ready.
+
+        SKUs are served from the forecast store when it covers `horizon`, and other catalog SKUs from the
+        same reconciled live forecasts `forecast_product` serves, so both endpoints agree. Only SKUs outside
+        the catalog hierarchy are fitted unreconciled across a process pool: they are split into chunks of
+        `FORECAST_BATCH_CHUNK_SIZE`, each fitted in one vectorized engine pass inside a worker process, so
+        fitting runs outside the event loop and the GIL.
+        """
+        workers = workers or BATCH_WORKERS
+        loop = asyncio.get_running_loop()
+        snapshot = self.forecast_store.current()
+        if snapshot is not None and snapshot.covers(horizon):
+            served = self._served_payloads(snapshot, product_ids, horizon, layout, snapshot.data_version)
+            for payload in served:
+                yield payload
+            stored = {payload["product_id"] for payload in served}
+            product_ids = [product_id for product_id in product_ids if product_id not in stored]
+        if product_ids:
+            live = await loop.run_in_executor(None, self._get_live_forecasts, horizon)
+            for payload in self._served_payloads(live, product_ids, horizon, layout, None):
+                yield payload
+            product_ids = [product_id for product_id in product_ids if product_id not in live]
+
+        chunks = [list(product_ids[i : i + BATCH_CHUNK_SIZE]) for i in range(0, len(product_ids), BATCH_CHUNK_SIZE)]
+        logger.info("Forecasting product batch", products=len(product_ids), chunks=len(chunks), workers=workers)
+        if not chunks:
+            return
+
+        start_date = datetime.utcnow()
+        pool = self._get_pool(workers)
+        pending = [
+            loop.run_in_executor(pool, _forecast_partition, chunk, horizon, start_date, layout) for chunk in chunks
+        ]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                for result in await next_done:
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def products_in_category(self, category: str) -> List[str]:
+        """Resolve a category to product ids from the product feature export (or the fallback catalog)."""
+        wanted = category.lower()
+        product_ids = [
+            product_id for product_id, item_category in product_catalog() if item_category.lower() == wanted
+        ]
+        if not product_ids:
+            raise ValueError(f"No products found for category '{category}'")
+        return product_ids
+
+    def forecast_skus(self, product_ids: Sequence[str], horizon: int) -> ForecastBatch:
+        """Fit and project many SKU series in one vectorized engine pass (rows follow `product_ids`)."""
+        return self.engine.fit_forecast(product_history(product_ids), horizon)
+
+    def lead_time_demand(self, product_ids: Sequence[str], served: np.ndarray) -> LeadTimeDemand:
+        """
+        Bootstrapped RESTOCK_LEAD_DAYS demand quantiles for SKUs whose served forecasts (rows of `served`)
+        didn't come with them, from a fresh fit of their histories.
+        """
+        state, residuals = self.engine.fit_with_residuals(product_history(product_ids), RESIDUAL_WINDOW)
+        return as_lead_time(
+            simulate_demand(self.engine, state, residuals, served[:, :RESTOCK_LEAD_DAYS], RESTOCK_LEVELS)
+        )
+
+    def load_artifacts(self) -> Dict[str, Any]:
+        """
+        Map the published stores, fit whatever they don't cover, and start the batch worker pool.
+
+        Without a forecast store or trend index the day's live hierarchy and trends are built here rather
+        than by the first request. Every worker is spawned and has imported this module and built its
+        engine before this returns.
+        """
+        snapshot = self.forecast_store.current()
+        trends = self.trend_index.current()
+        history = sales_history_store.current()
+        self.backtest_results.latest()
+        if snapshot is None:
+            self._get_live_forecasts(RESTOCK_LEAD_DAYS)
+        if trends is None:
+            self._get_live_trends()
+        pool = self._get_pool(BATCH_WORKERS)
+        workers = {future.result() for future in [pool.submit(_warm_worker) for _ in range(BATCH_WORKERS)]}
         return {
-            "mape": 9.8,
-            "smape": 8.7,
-            "rmse": 112.4,
-            "coverage_95pct": 0.93,
-            "mean_training_time_sec": 42.3,
-            "model_versions": self.model_versions,
+            "forecast_store": snapshot.data_version if snapshot is not None else None,
+            "trend_index_end": trends.end_date.isoformat() if trends is not None else None,
+            "sales_history_days": history.days if history is not None else None,
+            "batch_workers": len(workers),
         }
 
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Latest published rolling-origin backtest; metrics are null until the retrain flow has run one."""
+        summary = self.backtest_results.latest()
+        if summary is None:
+            return {
+                "mape": None,
+                "smape": None,
+                "rmse": None,
+                "coverage_95pct": None,
+                "evaluated_at": None,
+                "model_versions": self.model_versions,
+            }
+        return summary
+
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
-    @staticmethod
-    def _synthetic_series(
-        horizon: int,
-        base: float = 1000.0,
-        growth: float = 3.0,
-        noise: float = 18.0,
-        weekly_seasonality: bool = False,
-    ) -> List[ForecastPoint]:
-        start_date = datetime.utcnow()
-        series: List[ForecastPoint] = []
-        rng = random.Random(42)
-
-        for idx in range(horizon):
-            date = start_date + timedelta(days=idx)
-            trend = base + growth * idx
-            seasonal = 0.0
-            if weekly_seasonality:
-                seasonal = 60 * math.sin(2 * math.pi * (idx % 7) / 7)
-            noise_term = rng.uniform(-noise, noise)
-            value = trend + seasonal + noise_term
-            conf_range = max(value * 0.12, 25.0)
-            series.append(
-                ForecastPoint(
-                    date=date,
-                    value=value,
-                    lower=value - conf_range,
-                    upper=value + conf_range,
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._pool is None or self._pool_workers != workers:
+            self.shutdown()
+            # spawn: forking a process that already runs the event loop and loader threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            self._pool_workers = workers
+        return self._pool
+
+    def _aggregate_series(self, node: str, horizon: int) -> Tuple[ForecastSeries, Optional[str]]:
+        """Reconciled total/category series: stored when the forecast store covers `horizon`, else live."""
+        snapshot = self.forecast_store.current()
+        if snapshot is not None and snapshot.covers(horizon):
+            batch = snapshot.aggregate(node, horizon)
+            if batch is not None:
+                return self._series_from_batch(batch, 0, snapshot.start_date), snapshot.data_version
+        live = self._get_live_forecasts(horizon)
+        batch = live.aggregate(node, horizon)
+        if batch is None:
+            raise ValueError(f"Unknown category '{node.split(':', 1)[-1]}'")
+        return self._series_from_batch(batch, 0, live.start_date), None
+
+    def _product_series(
+        self, product_id: str, horizon: int, quantiles: Tuple[float, ...] = ()
+    ) -> Tuple[ForecastSeries, LeadTimeDemand, Optional[str]]:
+        """
+        Served forecast (with per-day `quantiles` paths), lead-time demand quantiles and data version (None
+        when computed live). Blocking: a store miss may fit the day's live hierarchy.
+        """
+        snapshot = self.forecast_store.current()
+        stored = snapshot.products([product_id], horizon) if snapshot is not None and snapshot.covers(horizon) else {}
+        fitted: Optional[Tuple[HoltWintersState, np.ndarray]] = None
+        if product_id in stored:
+            series = self._series_from_batch(stored[product_id], 0, snapshot.start_date)
+            lead_time = snapshot.lead_time_demand([product_id]) or self.lead_time_demand(
+                [product_id], series.values[None, :]
+            )
+            data_version = snapshot.data_version
+        else:
+            live = self._get_live_forecasts(horizon)
+            data_version = None
+            if product_id in live:
+                row = live.rows[product_id]
+                series = self._series_from_batch(live.products([product_id], horizon)[product_id], 0, live.start_date)
+                lead_time = live.lead_time_demand([product_id])
+                model = live.model
+                residuals = model.residuals[model.hierarchy.n_aggregate + row][None, :]
+                fitted = model.sku_state.take(np.array([row])), residuals
+            else:
+                # Not in the catalog hierarchy: an unreconciled base forecast is the best available.
+                fitted = self.engine.fit_with_residuals(product_history([product_id]), RESIDUAL_WINDOW)
+                products = self.engine.forecast(fitted[0], horizon)
+                lead_time = as_lead_time(
+                    simulate_demand(self.engine, *fitted, products.values[:, :RESTOCK_LEAD_DAYS], RESTOCK_LEVELS)
                 )
+                series = self._series_from_batch(products, 0, datetime.utcnow())
+        if quantiles:
+            state, residuals = fitted or self.engine.fit_with_residuals(product_history([product_id]), RESIDUAL_WINDOW)
+            simulated = simulate_demand(self.engine, state, residuals, series.values[None, :], quantiles)
+            series.quantiles = {level: simulated.values[0, idx] for idx, level in enumerate(quantiles)}
+        return series, lead_time, data_version
+
+    def _get_live_trends(self) -> TrendSnapshot:
+        """In-memory trend index (built once per day) for when the ETL hasn't published one."""
+        today = datetime.utcnow().date()
+        if self._live_trends is None or self._live_trends[0] != today:
+            self._live_trends = (today, history_trends())
+        return self._live_trends[1]
+
+    def _get_live_model(self) -> HierarchyModel:
+        """Hierarchy fitted in-process (once per day) for requests the forecast store can't answer."""
+        today = datetime.utcnow().date()
+        if self._live_model is None or self._live_model[0] != today:
+            self._live_model = (today, fit_hierarchy(self.engine, Hierarchy.from_pairs(product_catalog())))
+        return self._live_model[1]
+
+    def _get_live_forecasts(self, horizon: int) -> LiveForecasts:
+        """
+        The live hierarchy's reconciled forecasts covering `horizon`, recomputed only when the model is refit
+        or a longer horizon is asked for. Lead-time demand is simulated for every SKU once per model, as a
+        store build does, so a SKU's restock sizing doesn't depend on which request asked for it.
+        """
+        with self._live_lock:
+            model = self._get_live_model()
+            live = self._live_forecasts
+            if live is not None and live.model is model and live.horizon >= horizon:
+                return live
+            forecasts, aggregates = reconciled_forecasts(self.engine, model, max(horizon, RESTOCK_LEAD_DAYS))
+            if live is not None and live.model is model:
+                rows, lead_time = live.rows, live.lead_time
+            else:
+                rows = {product_id: row for row, product_id in enumerate(model.hierarchy.product_ids)}
+                lead_time = model_lead_time(self.engine, model, forecasts)
+            self._live_forecasts = LiveForecasts(model, datetime.utcnow(), rows, forecasts, aggregates, lead_time)
+            return self._live_forecasts
+
+    def _served_payloads(
+        self,
+        source: Any,
+        product_ids: Sequence[str],
+        horizon: int,
+        layout: str,
+        data_version: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """Payloads for the SKUs of `product_ids` that `source` (a store snapshot or LiveForecasts) holds."""
+        served = source.products(product_ids, horizon)
+        served_ids = list(served)
+        lead_time = source.lead_time_demand(served_ids) if served_ids else None
+        if lead_time is None and served_ids:
+            lead_time = self.lead_time_demand(served_ids, np.vstack([batch.values for batch in served.values()]))
+        return [
+            _product_payload(
+                product_id,
+                horizon,
+                self._series_from_batch(batch, 0, source.start_date),
+                lead_time,
+                row,
+                layout,
+                data_version,
             )
-        return series
+            for row, (product_id, batch) in enumerate(served.items())
+        ]
+
+    @staticmethod
+    def _series_from_batch(batch: ForecastBatch, row: int, start_date: datetime) -> ForecastSeries:
+        return ForecastSeries(
+            start_date=start_date, values=batch.values[row], lower=batch.lower[row], upper=batch.upper[row]
+        )
+
+    @classmethod
+    def _series_payload(cls, series: ForecastSeries, layout: str) -> Any:
+        if layout == "columnar":
+            return series.columnar()
+        records = [cls._point_to_dict(point) for point in series.points()]
+        for level, path in (series.quantiles or {}).items():
+            key = _quantile_key(level)
+            for record, value in zip(records, path.tolist()):
+                record[key] = round(value, 2)
+        return records
 
     @staticmethod
-    def _scenario_projection(series: List[ForecastPoint], scale_factor: float = 0.12) -> List[Dict[str, Any]]:
-        base_values = [point.value for point in series]
-        last_value = base_values[-1]
+    def _scenario_projection(series: ForecastSeries, scale_factor: float = 0.12) -> List[Dict[str, Any]]:
+        last_value = float(series.values[-1])
         scenarios = []
         for delta_pct in (-0.1, -0.05, 0, 0.05, 0.1):
             demand = last_value * (1 + delta_pct)
@@ -166,44 +553,127 @@ class ForecastingService:
             "upper_bound": round(point.upper, 2),
         }
 
+    @classmethod
+    def _summary_from_series(cls, series: ForecastSeries) -> Dict[str, Any]:
+        peak = int(np.argmax(series.values))
+        trough = int(np.argmin(series.values))
+        return {
+            "growth_rate_pct": round(cls._growth_rate(series) * 100, 2),
+            "peak_day": series.date(peak).strftime("%Y-%m-%d"),
+            "peak_value": round(float(series.values[peak]), 2),
+            "trough_day": series.date(trough).strftime("%Y-%m-%d"),
+            "trough_value": round(float(series.values[trough]), 2),
+        }
+
     @staticmethod
-    def _summary_from_series(series: List[ForecastPoint]) -> Dict[str, Any]:
-        start = series[0].value
-        end = series[-1].value
-        growth = (end - start) / start if start else 0.0
-        peak = max(series, key=lambda p: p.value)
-        trough = min(series, key=lambda p: p.value)
+    def _product_recommendation(series: ForecastSeries, lead_time: LeadTimeDemand, row: int = 0) -> Dict[str, Any]:
+        """
+        Restock to the RESTOCK_SERVICE_LEVEL quantile of lead-time demand; the safety stock is what that
+        adds on top of the median.
+        """
+        demand = lead_time.at(row)
+        target = demand[RESTOCK_SERVICE_LEVEL]
+        median = demand[0.5]
+        restock = math.ceil(target)
         return {
-            "growth_rate_pct": round(growth * 100, 2),
-            "peak_day": peak.date.strftime("%Y-%m-%d"),
-            "peak_value": round(peak.value, 2),
-            "trough_day": trough.date.strftime("%Y-%m-%d"),
-            "trough_value": round(trough.value, 2),
+            "recommended_restock_units": restock,
+            "demand_next_7d": round(float(series.values[:7].sum())),
+            "safety_stock_units": round(max(target - median, 0.0)),
+            "lead_time_days": lead_time.days,
+            "lead_time_demand": {_quantile_key(level): round(value, 2) for level, value in demand.items()},
+            "action": (
+                f"Stock {restock} units to cover {lead_time.days}-day demand "
+                f"with a {RESTOCK_SERVICE_LEVEL:.0%} service level."
+            ),
+            "confidence": RESTOCK_SERVICE_LEVEL,
         }
 
     @staticmethod
-    def _product_recommendation(series: List[ForecastPoint]) -> Dict[str, Any]:
-        upcoming = series[:7]
-        total_next_week = sum(point.value for point in upcoming)
-        avg_next_week = total_next_week / len(upcoming)
-        safety_stock = avg_next_week * 1.4
+    def _window_summary(window: TrendWindow) -> Dict[str, Any]:
         return {
-            "recommended_restock_units": round(safety_stock),
-            "demand_next_7d": round(total_next_week),
-            "action": "Increase purchase order by 12% to avoid stockouts.",
-            "confidence": 0.68,
+            "start": window.start.isoformat(),
+            "end": window.end.isoformat(),
+            "days": window.days,
+            "total_units": round(window.total, 2),
+            "avg_daily_units": round(window.average, 2),
+            "peak_day": window.peak_day.isoformat() if window.peak_day else None,
+            "peak_units": round(window.peak, 2) if window.peak is not None else None,
+            "trough_day": window.trough_day.isoformat() if window.trough_day else None,
+            "trough_units": round(window.trough, 2) if window.trough is not None else None,
         }
 
     @staticmethod
     def _period_to_days(period: str) -> int:
         mapping = {"7d": 7, "30d": 30, "60d": 60, "90d": 90, "1y": 365}
-        return mapping.get(period, 30)
+        if period not in mapping:
+            raise ValueError(f"Unknown period '{period}'; use one of {', '.join(mapping)}")
+        return mapping[period]
 
     @staticmethod
-    def _growth_rate(series: List[ForecastPoint]) -> float:
-        start = series[0].value
-        end = series[-1].value
+    def _growth_rate(series: ForecastSeries) -> float:
+        start = float(series.values[0])
+        end = float(series.values[-1])
         if not start:
             return 0.0
         return (end - start) / start
 
+
+def _quantile_key(level: float) -> str:
+    return f"p{level * 100:g}"
+
+
+def _head(batch: ForecastBatch, horizon: int, row: Optional[int] = None) -> ForecastBatch:
+    """The first `horizon` days of `batch` (only row `row` when given)."""
+    rows = slice(None) if row is None else slice(row, row + 1)
+    return ForecastBatch(
+        values=batch.values[rows, :horizon], lower=batch.lower[rows, :horizon], upper=batch.upper[rows, :horizon]
+    )
+
+
+_worker_engine: Optional[ForecastEngine] = None
+
+
+def _warm_worker() -> int:
+    """Process-pool task run once per worker at startup so the first batch doesn't pay imports."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = ForecastEngine()
+    return os.getpid()
+
+
+def _forecast_partition(
+    product_ids: List[str], horizon: int, start_date: datetime, layout: str = "records"
+) -> List[Dict[str, Any]]:
+    """Process-pool task: fit one partition of SKUs and build their per-product payloads."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = ForecastEngine()
+    state, residuals = _worker_engine.fit_with_residuals(product_history(product_ids), RESIDUAL_WINDOW)
+    batch = _worker_engine.forecast(state, horizon)
+    lead_time = as_lead_time(
+        simulate_demand(_worker_engine, state, residuals, batch.values[:, :RESTOCK_LEAD_DAYS], RESTOCK_LEVELS)
+    )
+    return [
+        _product_payload(
+            product_id, horizon, ForecastingService._series_from_batch(batch, row, start_date), lead_time, row, layout
+        )
+        for row, product_id in enumerate(product_ids)
+    ]
+
+
+def _product_payload(
+    product_id: str,
+    horizon: int,
+    series: ForecastSeries,
+    lead_time: LeadTimeDemand,
+    row: int = 0,
+    layout: str = "records",
+    data_version: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "product_id": product_id,
+        "horizon": horizon,
+        "forecast": ForecastingService._series_payload(series, layout),
+        "recommendation": ForecastingService._product_recommendation(series, lead_time, row),
+        "data_version": data_version,
+    }
@@ -5,6 +5,7 @@ Provides AI-assisted pricing recommendations with guardrails and scenario analys
 
 from __future__ import annotations
 
+import asyncio
 import math
 import random
 from dataclasses import dataclass
@@ -12,6 +13,11 @@ from typing import Any, Dict, List, Optional
 
 import structlog
 
+from src.services.embedded_online_store import ONLINE_STORE_BACKEND, EmbeddedOnlineStore
+from src.services.feature_cache import feature_value, online_feature_cache, preload_feature_view
+from src.services.feature_snapshots import FeatureSnapshotStore
+from src.utils.metrics import record_feature_fallback, track_feature_retrieval
+
 try:
     from feast import FeatureStore  # type: ignore
 except Exception:  # pragma: no cover
@@ -19,6 +25,10 @@ except Exception:  # pragma: no cover
 
 logger = structlog.get_logger(__name__)
 
+METRICS_SERVICE = "pricing"
+PRODUCT_VIEW = "product_performance_metrics"
+SIGNAL_FEATURES = ["conversion_rate", "return_rate", "stock_velocity", "views_7d", "add_to_cart_7d"]
+
 
 @dataclass
 class ProductSignals:
@@ -53,7 +63,7 @@ class PricingService:
         strategy: str = "balanced",
         currency: str = "USD",
     ) -> Dict[str, Any]:
-        signals = self._fetch_product_signals(product_id)
+        signals = await asyncio.to_thread(self._fetch_product_signals, product_id)
         guardrails = self._build_guardrails(current_price, cost_price)
         recommendation = self._compute_recommendation(
             product_id=product_id,
@@ -86,17 +96,20 @@ class PricingService:
         vendor_id: Optional[str] = None,
         strategy: str = "balanced",
     ) -> Dict[str, Any]:
-        recommendations = []
-        for item in items:
-            rec = await self.recommend_price(
-                product_id=item["product_id"],
-                current_price=item["current_price"],
-                cost_price=item.get("cost_price"),
-                vendor_id=vendor_id,
-                strategy=item.get("strategy", strategy),
-                currency=item.get("currency", "USD"),
+        # Issued concurrently so the feature loader can merge the lookups into one online-store call.
+        recommendations = await asyncio.gather(
+            *(
+                self.recommend_price(
+                    product_id=item["product_id"],
+                    current_price=item["current_price"],
+                    cost_price=item.get("cost_price"),
+                    vendor_id=vendor_id,
+                    strategy=item.get("strategy", strategy),
+                    currency=item.get("currency", "USD"),
+                )
+                for item in items
             )
-            recommendations.append(rec)
+        )
         return {"count": len(recommendations), "recommendations": recommendations}
 
     async def simulate_discount(
@@ -109,7 +122,7 @@ class PricingService:
     ) -> Dict[str, Any]:
         discount_pct = max(min(discount_pct, 0.4), -0.2)  # allow -20% to +40%
         new_price = round(base_price * (1 - discount_pct), 2)
-        signals = self._fetch_product_signals(product_id)
+        signals = await asyncio.to_thread(self._fetch_product_signals, product_id)
 
         elasticity = self._estimate_elasticity(signals, strategy)
         demand_delta = elasticity * discount_pct * 100
@@ -135,6 +148,12 @@ class PricingService:
         }
         return summary
 
+    def load_artifacts(self) -> Dict[str, Any]:
+        """Open the product feature view ahead of traffic."""
+        if self._feature_store is not None:
+            preload_feature_view(self._feature_store, PRODUCT_VIEW, SIGNAL_FEATURES, "product_id")
+        return {"model_version": self.model_version, "feature_store_ready": self._feature_store is not None}
+
     def get_metrics(self) -> Dict[str, Any]:
         return {
             "mape": 8.4,
@@ -143,12 +162,19 @@ class PricingService:
             "uplift_margin_pct": 6.8,
             "deployment_rollout": 0.35,
             "model_version": self.model_version,
+            "feature_cache": online_feature_cache.stats(),
         }
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
     def _init_feature_store(self) -> Optional["FeatureStore"]:
+        if ONLINE_STORE_BACKEND == "embedded":
+            logger.info("PricingService serving online features from embedded store")
+            return EmbeddedOnlineStore()
+        if ONLINE_STORE_BACKEND == "snapshot":
+            logger.info("Serving online features from Arrow feature snapshots")
+            return FeatureSnapshotStore()
         if FeatureStore is None:
             logger.warning("Feast not available for PricingService")
             return None
@@ -173,27 +199,23 @@ class PricingService:
     def _fetch_product_signals(self, product_id: str) -> ProductSignals:
         default = ProductSignals()
         if not self._feature_store:
+            record_feature_fallback(METRICS_SERVICE, PRODUCT_VIEW, "store_unavailable")
             return default
         try:
-            features = self._feature_store.get_online_features(
-                features=[
-                    "product_performance_metrics:conversion_rate",
-                    "product_performance_metrics:return_rate",
-                    "product_performance_metrics:stock_velocity",
-                    "product_performance_metrics:views_7d",
-                    "product_performance_metrics:add_to_cart_7d",
-                ],
-                entity_rows=[{"product_id": product_id}],
-            ).to_dict()
-
-            return ProductSignals(
-                conversion_rate=float(features.get("product_performance_metrics__conversion_rate", [default.conversion_rate])[0]),
-                return_rate=float(features.get("product_performance_metrics__return_rate", [default.return_rate])[0]),
-                stock_velocity=float(features.get("product_performance_metrics__stock_velocity", [default.stock_velocity])[0]),
-                views_7d=float(features.get("product_performance_metrics__views_7d", [default.views_7d])[0]),
-                add_to_cart_7d=float(features.get("product_performance_metrics__add_to_cart_7d", [default.add_to_cart_7d])[0]),
-            )
+            with track_feature_retrieval(METRICS_SERVICE, PRODUCT_VIEW, entities=1):
+                features = online_feature_cache.get_online_features(
+                    self._feature_store,
+                    features=[f"{PRODUCT_VIEW}:{name}" for name in SIGNAL_FEATURES],
+                    entity_rows=[{"product_id": product_id}],
+                )
+                return ProductSignals(
+                    **{
+                        name: feature_value(features, PRODUCT_VIEW, name, 0, getattr(default, name), METRICS_SERVICE)
+                        for name in SIGNAL_FEATURES
+                    }
+                )
         except Exception as exc:  # pragma: no cover
+            record_feature_fallback(METRICS_SERVICE, PRODUCT_VIEW, "error")
             logger.warning("Feast fetch failed; falling back to defaults", product_id=product_id, error=str(exc))
             return default
 
@@ -15,6 +15,11 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import structlog
 
+from src.services.embedded_online_store import ONLINE_STORE_BACKEND, EmbeddedOnlineStore
+from src.services.feature_cache import feature_value, online_feature_cache, preload_feature_view
+from src.services.feature_snapshots import FeatureSnapshotStore
+from src.utils.metrics import record_feature_fallback, track_feature_retrieval
+
 try:
     from feast import FeatureStore  # type: ignore
 except Exception:  # pragma: no cover - optional dependency safeguard
@@ -24,6 +29,18 @@ logger = structlog.get_logger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 FEATURE_STORE_PATH = BASE_DIR / "feature_store"
+METRICS_SERVICE = "recommendation"
+USER_VIEW = "user_behavior_metrics"
+PRODUCT_VIEW = "product_performance_metrics"
+# User features read per request, with the profile served when they are unavailable.
+DEFAULT_PROFILE = {
+    "orders_last_30d": 2.0,
+    "total_orders": 12.0,
+    "avg_order_value": 148.0,
+    "lifetime_value_score": 0.62,
+    "rfm_score": 0.58,
+}
+CANDIDATE_FEATURES = ["views_7d", "add_to_cart_7d", "orders_7d", "conversion_rate", "return_rate", "stock_velocity"]
 
 
 @dataclass
@@ -231,10 +248,7 @@ class RecommendationService:
             algorithm=algorithm,
         )
 
-        loop = asyncio.get_event_loop()
-        recommendations = await loop.run_in_executor(
-            None, self._generate_recommendations, user_id, limit, algorithm
-        )
+        recommendations = await asyncio.to_thread(self._generate_recommendations, user_id, limit, algorithm)
         logger.info(
             "Generated recommendations",
             user_id=user_id,
@@ -248,6 +262,16 @@ class RecommendationService:
         """Get version metadata for specific algorithm."""
         return self.model_versions.get(algorithm, self.model_versions["hybrid"])
 
+    def load_artifacts(self) -> Dict[str, Any]:
+        """Open the user and product feature views ahead of traffic."""
+        if self._feature_store is not None:
+            preload_feature_view(self._feature_store, USER_VIEW, list(DEFAULT_PROFILE), "user_id")
+            preload_feature_view(self._feature_store, PRODUCT_VIEW, CANDIDATE_FEATURES, "product_id")
+        return {
+            "model_versions": self.model_versions,
+            "feature_store_ready": self._feature_store is not None,
+        }
+
     def get_metrics(self) -> Dict[str, Any]:
         """Expose latest validation metrics."""
         return {
@@ -259,6 +283,7 @@ class RecommendationService:
             "diversity": 0.68,
             "freshness_days": 2,
             "model_versions": self.model_versions,
+            "feature_cache": online_feature_cache.stats(),
         }
 
     # ------------------------------------------------------------------
@@ -266,6 +291,13 @@ class RecommendationService:
     # ------------------------------------------------------------------
 
     def _init_feature_store(self) -> Optional["FeatureStore"]:
+        if ONLINE_STORE_BACKEND == "embedded":
+            logger.info("Serving online features from embedded store")
+            return EmbeddedOnlineStore()
+        if ONLINE_STORE_BACKEND == "snapshot":
+            logger.info("Serving online features from Arrow feature snapshots")
+            return FeatureSnapshotStore()
+
         if FeatureStore is None:
             logger.warning("Feast not available - running in fallback mode")
             return None
@@ -310,37 +342,25 @@ class RecommendationService:
 
     def _build_user_profile(self, user_id: str) -> Dict[str, float]:
         """Fetch user features from Feast (fallback to defaults if unavailable)."""
-        default_profile = {
-            "orders_last_30d": 2.0,
-            "total_orders": 12.0,
-            "avg_order_value": 148.0,
-            "lifetime_value_score": 0.62,
-            "rfm_score": 0.58,
-        }
+        default_profile = dict(DEFAULT_PROFILE)
 
         if not self._feature_store:
+            record_feature_fallback(METRICS_SERVICE, USER_VIEW, "store_unavailable")
             return default_profile
 
         try:
-            feature_vector = self._feature_store.get_online_features(
-                features=[
-                    "user_behavior_metrics:orders_last_30d",
-                    "user_behavior_metrics:total_orders",
-                    "user_behavior_metrics:avg_order_value",
-                    "user_behavior_metrics:lifetime_value_score",
-                    "user_behavior_metrics:rfm_score",
-                ],
-                entity_rows=[{"user_id": user_id}],
-            ).to_dict()
-
-            return {
-                "orders_last_30d": float(feature_vector.get("user_behavior_metrics__orders_last_30d", [default_profile["orders_last_30d"]])[0]),
-                "total_orders": float(feature_vector.get("user_behavior_metrics__total_orders", [default_profile["total_orders"]])[0]),
-                "avg_order_value": float(feature_vector.get("user_behavior_metrics__avg_order_value", [default_profile["avg_order_value"]])[0]),
-                "lifetime_value_score": float(feature_vector.get("user_behavior_metrics__lifetime_value_score", [default_profile["lifetime_value_score"]])[0]),
-                "rfm_score": float(feature_vector.get("user_behavior_metrics__rfm_score", [default_profile["rfm_score"]])[0]),
-            }
+            with track_feature_retrieval(METRICS_SERVICE, USER_VIEW, entities=1):
+                feature_vector = online_feature_cache.get_online_features(
+                    self._feature_store,
+                    features=[f"{USER_VIEW}:{name}" for name in default_profile],
+                    entity_rows=[{"user_id": user_id}],
+                )
+                return {
+                    name: feature_value(feature_vector, USER_VIEW, name, 0, default, METRICS_SERVICE)
+                    for name, default in default_profile.items()
+                }
         except Exception as exc:  # pragma: no cover - depends on Feast availability
+            record_feature_fallback(METRICS_SERVICE, USER_VIEW, "error")
             logger.warning(
                 "Failed to fetch user features from Feast, using defaults",
                 user_id=user_id,
@@ -353,38 +373,39 @@ class RecommendationService:
         candidates = [candidate for candidate in self._default_candidates]
 
         if not self._feature_store:
+            record_feature_fallback(METRICS_SERVICE, PRODUCT_VIEW, "store_unavailable")
             return candidates
 
         try:
             rows = [{"product_id": candidate.product_id} for candidate in candidates]
-            feature_dict = self._feature_store.get_online_features(
-                features=[
-                    "product_performance_metrics:views_7d",
-                    "product_performance_metrics:add_to_cart_7d",
-                    "product_performance_metrics:orders_7d",
-                    "product_performance_metrics:conversion_rate",
-                    "product_performance_metrics:return_rate",
-                    "product_performance_metrics:stock_velocity",
-                ],
-                entity_rows=rows,
-            ).to_dict()
-
-            for idx, candidate in enumerate(candidates):
-                candidate.conversion_rate = float(
-                    feature_dict.get("product_performance_metrics__conversion_rate", [candidate.conversion_rate])[idx]
+            with track_feature_retrieval(METRICS_SERVICE, PRODUCT_VIEW, entities=len(rows)):
+                feature_dict = online_feature_cache.get_online_features(
+                    self._feature_store,
+                    features=[f"{PRODUCT_VIEW}:{name}" for name in CANDIDATE_FEATURES],
+                    entity_rows=rows,
                 )
-                candidate.return_rate = float(
-                    feature_dict.get("product_performance_metrics__return_rate", [candidate.return_rate])[idx]
-                )
-                candidate.stock_velocity = float(
-                    feature_dict.get("product_performance_metrics__stock_velocity", [candidate.stock_velocity])[idx]
-                )
-                # Derive trend score from views/add-to-cart if available
-                views = float(feature_dict.get("product_performance_metrics__views_7d", [candidate.trend_score * 100])[idx])
-                add_to_cart = float(feature_dict.get("product_performance_metrics__add_to_cart_7d", [candidate.base_popularity * 100])[idx])
-                candidate.trend_score = self._normalise_metric(views, scale=500.0)
-                candidate.base_popularity = self._normalise_metric(add_to_cart, scale=250.0)
+
+                for idx, candidate in enumerate(candidates):
+                    candidate.conversion_rate = feature_value(
+                        feature_dict, PRODUCT_VIEW, "conversion_rate", idx, candidate.conversion_rate, METRICS_SERVICE
+                    )
+                    candidate.return_rate = feature_value(
+                        feature_dict, PRODUCT_VIEW, "return_rate", idx, candidate.return_rate, METRICS_SERVICE
+                    )
+                    candidate.stock_velocity = feature_value(
+                        feature_dict, PRODUCT_VIEW, "stock_velocity", idx, candidate.stock_velocity, METRICS_SERVICE
+                    )
+                    # Derive trend score from views/add-to-cart if available
+                    views = feature_value(
+                        feature_dict, PRODUCT_VIEW, "views_7d", idx, candidate.trend_score * 100, METRICS_SERVICE
+                    )
+                    add_to_cart = feature_value(
+                        feature_dict, PRODUCT_VIEW, "add_to_cart_7d", idx, candidate.base_popularity * 100, METRICS_SERVICE
+                    )
+                    candidate.trend_score = self._normalise_metric(views, scale=500.0)
+                    candidate.base_popularity = self._normalise_metric(add_to_cart, scale=250.0)
         except Exception as exc:  # pragma: no cover
+            record_feature_fallback(METRICS_SERVICE, PRODUCT_VIEW, "error")
             logger.warning(
                 "Failed to hydrate candidates from Feast. Continuing with defaults.",
                 error=str(exc),
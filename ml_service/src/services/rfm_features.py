@@ -0,0 +1,905 @@
+"""
+RFM Feature Builder
+Maintains the `user_behavior_metrics` source (`feature_store/data/user_behavior_features.parquet`) that churn,
+recommendations and the feature store read, from order events.
+
+`build` streams the full order export (Parquet or CSV) `--chunk-rows` at a time. Each chunk's users are
+dictionary-encoded once and folded into per-user arrays (order count, order value in cents, last order
+time), so memory grows with the number of users, never with the number of orders. `update` folds in one
+day's order delta instead: only the users in the delta, plus the users whose orders leave the trailing
+30-day window, are touched, and only rows whose features changed are written.
+
+Features, as of the end of a UTC day:
+
+    total_orders, orders_last_30d, avg_order_value, monetary_value, last_order_at
+    recency_score / frequency_score / monetary_score   quintile scores 1-5, as in dbt `int_customer_rfm`
+    rfm_score                                           mean of the three scores, scaled to [0, 1]
+    lifetime_value_score                                percentile rank of monetary value (0.01 steps)
+
+Quintiles come from mergeable bucket sketches (last-order day for recency, 2% log buckets for order count
+and value). An update retracts a changed user's old buckets and adds the new ones, so scores follow the
+population without a rescan. A full rebuild scores from the same sketches and gives identical output,
+which `verify` checks.
+
+State (`RFM_STATE_DIR`):
+    meta.json                  end date, user count, sketch / window file names, published output files
+    user_offsets.i64           (users + 1,) byte offsets into user_ids.bin
+    user_ids.bin               utf-8 user ids in index order
+    <array>.bin                per-user arrays in STATE_ARRAYS, including the scores last published
+    sketches-<seq>.npz         bucket counts per sketch
+    window/<day>-<seq>.npz     (user index, orders) for each order day in the trailing window
+    journal.npz                old values of the rows an update is overwriting, until meta.json commits
+
+The output directory holds `base-<date>.parquet` plus one `delta-<date>.parquet` per update (latest row
+per user wins, as in every reader of the source). It is compacted into a new base every
+COMPACT_EVERY_DAYS so no row outlives the feature view TTL.
+
+Usage:
+    python -m src.services.rfm_features build [--orders PATH] [--as-of DATE] [--chunk-rows N]
+    python -m src.services.rfm_features update [--orders PATH] [--as-of DATE]
+    python -m src.services.rfm_features verify [--orders PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import structlog
+
+from src.services.embedded_online_store import EMBEDDED_VIEW_SPECS
+from src.services.feature_cache import FEATURE_STORE_PATH
+from src.utils.store_files import commit_json, read_json, truncate_file
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+USER_VIEW = "user_behavior_metrics"
+ORDER_EVENTS_PATH = Path(os.getenv("ORDER_EVENTS_PATH", str(FEATURE_STORE_PATH / "data" / "orders.parquet")))
+ORDER_DELTA_PATH = Path(os.getenv("ORDER_DELTA_PATH", str(FEATURE_STORE_PATH / "data" / "orders_delta.parquet")))
+USER_FEATURES_PATH = FEATURE_STORE_PATH / EMBEDDED_VIEW_SPECS[USER_VIEW].source_path
+RFM_STATE_DIR = Path(os.getenv("RFM_STATE_DIR", str(BASE_DIR / "artifacts" / "rfm")))
+CHUNK_ROWS = 1_000_000
+WINDOW_DAYS = 30
+COMPACT_EVERY_DAYS = 7
+MICROS_PER_DAY = 86_400_000_000
+
+# Column names in the order export (the `orders` table: userId → user_id, total, createdAt → created_at).
+USER_COLUMN = "user_id"
+AMOUNT_COLUMN = "total"
+TIMESTAMP_COLUMN = "created_at"
+STATUS_COLUMN = "status"
+EXCLUDED_STATUSES = ("CANCELLED",)
+QUINTILES = (0.2, 0.4, 0.6, 0.8)
+
+# Log buckets 2% wide; bucket 0 holds values <= 0.
+LOG_GAMMA = math.log(1.02)
+LOG_OFFSET = 512
+LOG_BUCKETS = 4096
+SKETCHES = ("recency", "frequency", "monetary")
+
+STATE_ARRAYS = {
+    "order_count": np.int64,
+    "order_cents": np.int64,
+    "last_order": np.int64,  # epoch microseconds
+    "recent_orders": np.int64,
+    "recency_score": np.int8,
+    "frequency_score": np.int8,
+    "monetary_score": np.int8,
+    "lifetime_value": np.float32,
+}
+AGGREGATE_ARRAYS = ("order_count", "order_cents", "last_order", "recent_orders")
+SCORE_ARRAYS = ("recency_score", "frequency_score", "monetary_score", "lifetime_value")
+# Published columns a full rebuild and the incremental path must agree on.
+FEATURE_COLUMNS = (
+    "orders_last_30d",
+    "total_orders",
+    "avg_order_value",
+    "lifetime_value_score",
+    "rfm_score",
+    "last_order_at",
+    "monetary_value",
+    "recency_score",
+    "frequency_score",
+    "monetary_score",
+)
+META_FILE = "meta.json"
+JOURNAL_FILE = "journal.npz"
+
+_UNITS_PER_SECOND = {"s": 1, "ms": 1_000, "us": 1_000_000, "ns": 1_000_000_000}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class QuantileSketch:
+    """
+    Counts per integer bucket. Counts add, so sketches merge, and a value that changes is moved by
+    retracting its old bucket and adding the new one.
+    """
+
+    def __init__(self, counts: Optional[np.ndarray] = None, base: int = 0):
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+        self.base = base
+
+    @classmethod
+    def of(cls, buckets: np.ndarray) -> "QuantileSketch":
+        sketch = cls()
+        sketch.add(buckets)
+        return sketch
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, buckets: np.ndarray, weight: int = 1) -> None:
+        if buckets.size == 0:
+            return
+        self._cover(int(buckets.min()), int(buckets.max()))
+        self.counts += weight * np.bincount(buckets - self.base, minlength=self.counts.shape[0])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.counts.size == 0:
+            return
+        self._cover(other.base, other.base + other.counts.shape[0] - 1)
+        start = other.base - self.base
+        self.counts[start : start + other.counts.shape[0]] += other.counts
+
+    def quantile_buckets(self, levels: Tuple[float, ...]) -> np.ndarray:
+        """Bucket holding each quantile level: the first bucket whose cumulative count reaches it."""
+        cumulative = np.cumsum(self.counts)
+        ranks = np.maximum(np.ceil(np.asarray(levels) * self.total), 1)
+        return np.searchsorted(cumulative, ranks, side="left") + self.base
+
+    def count_at_most(self, buckets: np.ndarray) -> np.ndarray:
+        cumulative = np.cumsum(self.counts)
+        if cumulative.size == 0:
+            return np.zeros(buckets.shape, dtype=np.int64)
+        positions = buckets - self.base
+        return np.where(positions < 0, 0, cumulative[np.clip(positions, 0, cumulative.size - 1)])
+
+    def _cover(self, low: int, high: int) -> None:
+        if self.counts.size == 0:
+            self.counts, self.base = np.zeros(high - low + 1, dtype=np.int64), low
+            return
+        start = min(low, self.base)
+        end = max(high, self.base + self.counts.shape[0] - 1)
+        if start == self.base and end == self.base + self.counts.shape[0] - 1:
+            return
+        counts = np.zeros(end - start + 1, dtype=np.int64)
+        counts[self.base - start : self.base - start + self.counts.shape[0]] = self.counts
+        self.counts, self.base = counts, start
+
+
+@dataclass
+class RFMAggregates:
+    """Per-user aggregates at the end of `end` (a UTC date), indexed like `user_ids`."""
+
+    end: date
+    user_ids: pa.Array
+    order_count: np.ndarray
+    order_cents: np.ndarray
+    last_order: np.ndarray
+    recent_orders: np.ndarray
+    window: Dict[int, Tuple[np.ndarray, np.ndarray]]  # order day -> (user indices, orders that day)
+
+    def sketches(self) -> Dict[str, QuantileSketch]:
+        buckets = _sketch_buckets(self.order_count, self.order_cents, self.last_order)
+        return {name: QuantileSketch.of(buckets[name]) for name in SKETCHES}
+
+
+class RFMAccumulator:
+    """Per-user running order aggregates in parallel numpy arrays, indexed by first appearance."""
+
+    def __init__(self, end: date, window_days: int = WINDOW_DAYS, capacity: int = 1024):
+        self.end = end
+        self.window_days = window_days
+        self.user_ids: List[str] = []
+        self.user_index: Dict[str, int] = {}
+        self.order_count = np.zeros(capacity, dtype=np.int64)
+        self.order_cents = np.zeros(capacity, dtype=np.int64)
+        self.last_order = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+        # Orders inside the trailing window, kept as (user, day) pairs: bounded by 30 days of volume.
+        self._window_users: List[np.ndarray] = []
+        self._window_days: List[np.ndarray] = []
+        self.orders_read = 0
+        self.orders_skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def add(self, batch: pa.RecordBatch) -> None:
+        """Fold one chunk of order events into the per-user aggregates."""
+        self.orders_read += batch.num_rows
+        valid = _valid_orders(batch, self.end)
+        self.orders_skipped += batch.num_rows - valid.num_rows
+        if valid.num_rows == 0:
+            return
+
+        encoded = pc.dictionary_encode(valid.column(USER_COLUMN))
+        codes = self._user_codes(encoded.dictionary.to_pylist())[encoded.indices.to_numpy()]
+        n = len(self)
+        micros = _epoch_micros(valid.column(TIMESTAMP_COLUMN))
+        cents = _cents(valid.column(AMOUNT_COLUMN))
+
+        self.order_count[:n] += np.bincount(codes, minlength=n)
+        self.order_cents[:n] += np.rint(np.bincount(codes, weights=cents, minlength=n)).astype(np.int64)
+        np.maximum.at(self.last_order, codes, micros)
+        days = micros // MICROS_PER_DAY
+        recent = days > _day_index(self.end) - self.window_days
+        self._window_users.append(codes[recent])
+        self._window_days.append(days[recent])
+
+    def aggregates(self) -> RFMAggregates:
+        n = len(self)
+        window = _window_buckets(
+            np.concatenate(self._window_users) if self._window_users else np.zeros(0, dtype=np.int64),
+            np.concatenate(self._window_days) if self._window_days else np.zeros(0, dtype=np.int64),
+        )
+        recent = np.zeros(n, dtype=np.int64)
+        for users, orders in window.values():
+            recent[users] += orders
+        return RFMAggregates(
+            end=self.end,
+            user_ids=pa.array(self.user_ids, pa.large_string()),
+            order_count=self.order_count[:n],
+            order_cents=self.order_cents[:n],
+            last_order=self.last_order[:n],
+            recent_orders=recent,
+            window=window,
+        )
+
+    def _user_codes(self, users: List[Optional[str]]) -> np.ndarray:
+        """Global index of each user in one chunk's dictionary, registering new users."""
+        codes = np.empty(len(users), dtype=np.int64)
+        for position, user_id in enumerate(users):
+            code = self.user_index.get(user_id)
+            if code is None:
+                code = self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+            codes[position] = code
+        self._reserve(len(self.user_ids))
+        return codes
+
+    def _reserve(self, size: int) -> None:
+        capacity = self.order_count.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        self.order_count = _grown(self.order_count, capacity, 0)
+        self.order_cents = _grown(self.order_cents, capacity, 0)
+        self.last_order = _grown(self.last_order, capacity, np.iinfo(np.int64).min)
+
+
+class RFMState:
+    """The persisted aggregates, sketches and trailing-window buckets behind the published features."""
+
+    def __init__(self, root: Path, meta: Dict[str, Any]):
+        self.root = root
+        self.meta = meta
+        self.end = date.fromisoformat(meta["end"])
+        self.users = int(meta["users"])
+        self.arrays = {
+            name: _map_array(root / f"{name}.bin", dtype, self.users, "r+") for name, dtype in STATE_ARRAYS.items()
+        }
+        with np.load(root / meta["sketches"]) as stored:
+            self.sketches = {
+                name: QuantileSketch(stored[f"{name}_counts"].copy(), int(stored[f"{name}_base"])) for name in SKETCHES
+            }
+
+    @classmethod
+    def open(cls, root: Path = RFM_STATE_DIR) -> Optional["RFMState"]:
+        """Open the committed state, first rolling back an update that was interrupted before committing."""
+        meta = read_json(root / META_FILE)
+        if meta is None:
+            return None
+        journal = root / JOURNAL_FILE
+        if journal.exists():
+            with np.load(journal) as stored:
+                if int(stored["seq"]) != meta["seq"]:
+                    rows = stored["rows"]
+                    for name, dtype in STATE_ARRAYS.items():
+                        mapped = _map_array(root / f"{name}.bin", dtype, int(meta["users"]), "r+")
+                        mapped[rows] = stored[name]
+                        mapped.flush()
+                    logger.warning("Rolled back interrupted RFM update", rows=int(rows.size), end=meta["end"])
+            journal.unlink()
+        for name, dtype in STATE_ARRAYS.items():
+            truncate_file(root / f"{name}.bin", int(meta["users"]) * np.dtype(dtype).itemsize)
+        truncate_file(root / "user_ids.bin", int(meta["user_bytes"]))
+        truncate_file(root / "user_offsets.i64", (int(meta["users"]) + 1) * 8)
+        _remove_unreferenced(root, meta)
+        return cls(root, meta)
+
+    def user_id_array(self) -> pa.Array:
+        """All user ids as a zero-copy large_string array over the mapped files."""
+        offsets = np.fromfile(self.root / "user_offsets.i64", dtype=np.int64, count=self.users + 1)
+        data = np.memmap(self.root / "user_ids.bin", dtype=np.uint8, mode="r") if self.meta["user_bytes"] else b""
+        return pa.LargeStringArray.from_buffers(self.users, pa.py_buffer(offsets), pa.py_buffer(data))
+
+    def window(self, day: int) -> Tuple[np.ndarray, np.ndarray]:
+        name = self.meta["window"].get(str(day))
+        if name is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        with np.load(self.root / "window" / name) as stored:
+            return stored["users"], stored["orders"]
+
+
+def iter_order_batches(path: Path, chunk_rows: int = CHUNK_ROWS) -> Iterator[pa.RecordBatch]:
+    """Order events in chunks, projected to the columns the builder reads (Parquet file/dataset or CSV)."""
+    if path.suffix.lower() == ".csv":
+        header = pacsv.open_csv(path).schema.names
+        columns = [name for name in (USER_COLUMN, AMOUNT_COLUMN, TIMESTAMP_COLUMN, STATUS_COLUMN) if name in header]
+        reader = pacsv.open_csv(
+            path,
+            read_options=pacsv.ReadOptions(block_size=64 << 20),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=columns,
+                column_types={USER_COLUMN: pa.string(), AMOUNT_COLUMN: pa.float64(), STATUS_COLUMN: pa.string()},
+            ),
+        )
+        for batch in reader:
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows)
+        return
+
+    # ParquetFile reads row groups on demand; without pre-buffering it holds about one chunk at a time,
+    # where a dataset scanner keeps reading ahead of the fold and memory grows with the export.
+    files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+    for file in files:
+        parquet = pq.ParquetFile(file, pre_buffer=False)
+        names = parquet.schema_arrow.names
+        columns = [name for name in (USER_COLUMN, AMOUNT_COLUMN, TIMESTAMP_COLUMN, STATUS_COLUMN) if name in names]
+        yield from parquet.iter_batches(batch_size=chunk_rows, columns=columns)
+
+
+def aggregate_orders(orders_path: Path, end: date, chunk_rows: int = CHUNK_ROWS) -> Tuple[RFMAggregates, Dict[str, int]]:
+    """Stream the full order export into per-user aggregates as of the end of `end`."""
+    accumulator = RFMAccumulator(end)
+    chunks = 0
+    for batch in iter_order_batches(orders_path, chunk_rows):
+        accumulator.add(batch)
+        chunks += 1
+    stats = {"orders": accumulator.orders_read, "orders_skipped": accumulator.orders_skipped, "chunks": chunks}
+    return accumulator.aggregates(), stats
+
+
+def build_rfm_features(
+    orders_path: Path = ORDER_EVENTS_PATH,
+    output_path: Path = USER_FEATURES_PATH,
+    end: Optional[date] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    root: Path = RFM_STATE_DIR,
+) -> Dict[str, Any]:
+    """Rebuild from the full order export: publish a new base file and reset the incremental state."""
+    started = time.perf_counter()
+    end = end or _default_end()
+    aggregates, stats = aggregate_orders(orders_path, end, chunk_rows)
+    sketches = aggregates.sketches()
+    scores = _score(_sketch_buckets(aggregates.order_count, aggregates.order_cents, aggregates.last_order), sketches)
+
+    _write_state(root, aggregates, sketches, scores)
+    meta = read_json(root / META_FILE)
+    base = _publish(
+        output_path,
+        f"base-{end.isoformat()}.parquet",
+        _feature_table(aggregates.user_ids, aggregates, scores, end),
+        replace=True,
+    )
+    meta["output"] = {"dir": str(output_path), "base": base, "deltas": [], "compacted_end": end.isoformat()}
+    commit_json(root / META_FILE, meta)
+
+    summary = {
+        "end": end.isoformat(),
+        "users": len(aggregates.user_ids),
+        **stats,
+        "output": str(output_path / base),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Built RFM features", **summary)
+    return summary
+
+
+def update_rfm_features(
+    delta_path: Path = ORDER_DELTA_PATH,
+    end: Optional[date] = None,
+    root: Path = RFM_STATE_DIR,
+) -> Dict[str, Any]:
+    """
+    Fold one day's orders into the persisted state and publish the rows whose features changed.
+
+    Work is proportional to the delta (plus the window day that expires) except for one vectorized pass
+    over the mapped per-user arrays to re-bin scores against the moved quintile edges.
+    """
+    started = time.perf_counter()
+    state = RFMState.open(root)
+    if state is None:
+        raise FileNotFoundError(f"No RFM state under {root}; run `build` first")
+    end = end or _default_end()
+    if end <= state.end:
+        # Already folded in (a retry or re-run of the same day): applying the delta again would double-count it.
+        logger.info("RFM state already covers the requested day; skipping update", end=end.isoformat(), state_end=state.end.isoformat())
+        return {"skipped": True, "end": end.isoformat(), "state_end": state.end.isoformat()}
+    end_day = _day_index(end)
+
+    # Delta orders placed after the state's day, mapped to state indices (new users get the next indices).
+    batches = [_valid_orders(batch, end, after=state.end) for batch in iter_order_batches(delta_path)]
+    orders = pa.Table.from_batches(batches) if batches else None
+    delta_orders = orders.num_rows if orders is not None else 0
+    codes = np.zeros(0, dtype=np.int64)
+    micros = np.zeros(0, dtype=np.int64)
+    cents = np.zeros(0, dtype=np.float64)
+    new_ids: List[str] = []
+    if delta_orders:
+        encoded = pc.dictionary_encode(orders.column(USER_COLUMN).combine_chunks())
+        dictionary = encoded.dictionary.cast(pa.large_string())
+        found = pc.fill_null(pc.index_in(dictionary, value_set=state.user_id_array()), -1).to_numpy()
+        fresh = np.flatnonzero(found < 0)
+        new_ids = [str(value) for value in dictionary.take(pa.array(fresh)).to_pylist()]
+        found = found.astype(np.int64)
+        found[fresh] = state.users + np.arange(fresh.size)
+        codes = found[encoded.indices.to_numpy()]
+        micros = _epoch_micros(orders.column(TIMESTAMP_COLUMN).combine_chunks())
+        cents = _cents(orders.column(AMOUNT_COLUMN).combine_chunks())
+    users = state.users + len(new_ids)
+
+    # Full-population columns (new users appended), updated in memory for the touched rows.
+    touched, inverse = np.unique(codes, return_inverse=True)
+    columns = {name: _extended(state.arrays[name], users) for name in AGGREGATE_ARRAYS}
+    before = {name: columns[name][touched] for name in ("order_count", "order_cents", "last_order")}
+    new = {
+        "order_count": before["order_count"] + np.bincount(inverse, minlength=touched.size),
+        "order_cents": before["order_cents"]
+        + np.rint(np.bincount(inverse, weights=cents, minlength=touched.size)).astype(np.int64),
+        "last_order": before["last_order"].copy(),
+    }
+    np.maximum.at(new["last_order"], inverse, micros)
+    for name, values in new.items():
+        columns[name][touched] = values
+
+    # Trailing window: expire whole days that fell out, add the delta's in-window orders by day.
+    window_start = end_day - WINDOW_DAYS  # days <= window_start are outside
+    window_users: List[np.ndarray] = []
+    window_orders: List[np.ndarray] = []
+    expired = [int(day) for day in state.meta["window"] if int(day) <= window_start]
+    for day in expired:
+        day_users, day_orders = state.window(day)
+        window_users.append(day_users)
+        window_orders.append(-day_orders)
+    days = micros // MICROS_PER_DAY
+    in_window = days > window_start
+    window_files: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    for day, (day_users, day_orders) in _window_buckets(codes[in_window], days[in_window]).items():
+        window_users.append(day_users)
+        window_orders.append(day_orders)
+        window_files[day] = _merge_window(*state.window(day), day_users, day_orders)
+    window_users_all = np.concatenate(window_users) if window_users else np.zeros(0, dtype=np.int64)
+    np.add.at(columns["recent_orders"], window_users_all, np.concatenate(window_orders) if window_orders else 0)
+    affected = np.union1d(touched, window_users_all)
+
+    sketches = state.sketches
+    existing = touched < state.users
+    retracted = _sketch_buckets(*(before[name][existing] for name in ("order_count", "order_cents", "last_order")))
+    added = _sketch_buckets(new["order_count"], new["order_cents"], new["last_order"])
+    for name in SKETCHES:
+        sketches[name].add(retracted[name], weight=-1)
+        sketches[name].merge(QuantileSketch.of(added[name]))
+    scores = _score(_sketch_buckets(columns["order_count"], columns["order_cents"], columns["last_order"]), sketches)
+
+    rescored = np.zeros(state.users, dtype=bool)
+    for name in SCORE_ARRAYS:
+        rescored |= np.asarray(state.arrays[name]) != scores[name][: state.users]
+    changed = np.union1d(np.union1d(affected, np.flatnonzero(rescored)), np.arange(state.users, users))
+
+    # Journal the committed values of every existing row about to be overwritten, then write in place.
+    seq = int(state.meta["seq"]) + 1
+    rows = changed[changed < state.users]
+    journal = {name: np.asarray(state.arrays[name][rows]) for name in STATE_ARRAYS}
+    _save_npz(root / JOURNAL_FILE, seq=np.int64(seq), rows=rows, **journal)
+    updated = {**{name: columns[name] for name in AGGREGATE_ARRAYS}, **scores}
+    _append_users(root, state, new_ids)
+    for name, dtype in STATE_ARRAYS.items():
+        mapped = _map_array(root / f"{name}.bin", dtype, users, "r+")
+        mapped[changed] = updated[name][changed]
+        mapped.flush()
+
+    meta = dict(state.meta)
+    meta["window"] = {key: value for key, value in meta["window"].items() if int(key) > window_start}
+    for day, (day_users, day_orders) in window_files.items():
+        name = f"{day}-{seq}.npz"
+        _save_npz(root / "window" / name, users=day_users, orders=day_orders)
+        meta["window"][str(day)] = name
+    meta["sketches"] = f"sketches-{seq}.npz"
+    _save_sketches(root / meta["sketches"], sketches)
+
+    output = dict(meta["output"])
+    output_dir = Path(output["dir"])
+    compact = (end - date.fromisoformat(output["compacted_end"])).days >= COMPACT_EVERY_DAYS
+    rows_out = np.arange(users) if compact else changed
+    aggregates = RFMAggregates(
+        end=end,
+        user_ids=_user_ids(state, new_ids, rows_out),
+        order_count=columns["order_count"][rows_out],
+        order_cents=columns["order_cents"][rows_out],
+        last_order=columns["last_order"][rows_out],
+        recent_orders=columns["recent_orders"][rows_out],
+        window={},
+    )
+    table = _feature_table(aggregates.user_ids, aggregates, {name: scores[name][rows_out] for name in SCORE_ARRAYS}, end)
+    if compact:
+        output.update(base=_publish(output_dir, f"base-{end.isoformat()}.parquet", table), deltas=[])
+        output["compacted_end"] = end.isoformat()
+    else:
+        output["deltas"] = [*output["deltas"], _publish(output_dir, f"delta-{end.isoformat()}.parquet", table)]
+    meta.update(
+        end=end.isoformat(),
+        users=users,
+        user_bytes=int(state.meta["user_bytes"]) + sum(len(user_id.encode("utf-8")) for user_id in new_ids),
+        seq=seq,
+        output=output,
+    )
+    commit_json(root / META_FILE, meta)
+    (root / JOURNAL_FILE).unlink()
+    _remove_unreferenced(root, meta)
+
+    summary = {
+        "end": end.isoformat(),
+        "delta_orders": delta_orders,
+        "users": users,
+        "new_users": len(new_ids),
+        "touched_users": int(touched.size),
+        "expired_window_days": len(expired),
+        "rows_written": int(rows_out.size),
+        "compacted": compact,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Updated RFM features", **summary)
+    return summary
+
+
+def verify_rfm_features(
+    orders_path: Path = ORDER_EVENTS_PATH,
+    root: Path = RFM_STATE_DIR,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, Any]:
+    """Recompute from the full order export at the state's end date and compare with the published rows."""
+    state = RFMState.open(root)
+    if state is None:
+        raise FileNotFoundError(f"No RFM state under {root}; run `build` first")
+    aggregates, _ = aggregate_orders(orders_path, state.end, chunk_rows)
+    sketches = aggregates.sketches()
+    scores = _score(_sketch_buckets(aggregates.order_count, aggregates.order_cents, aggregates.last_order), sketches)
+    expected = _feature_table(aggregates.user_ids, aggregates, scores, state.end)
+    published = read_published_features(Path(state.meta["output"]["dir"]))
+
+    expected = expected.take(pc.sort_indices(expected, [(USER_COLUMN, "ascending")]))
+    published = published.take(pc.sort_indices(published, [(USER_COLUMN, "ascending")]))
+    if not expected.column(USER_COLUMN).equals(published.column(USER_COLUMN)):
+        return {"status": "mismatch", "end": state.end.isoformat(), "users": expected.num_rows, "published_users": published.num_rows}
+    mismatches = {
+        name: int(pc.sum(pc.invert(pc.equal(expected.column(name), published.column(name)))).as_py() or 0)
+        for name in FEATURE_COLUMNS
+    }
+    return {
+        "status": "match" if not any(mismatches.values()) else "mismatch",
+        "end": state.end.isoformat(),
+        "users": expected.num_rows,
+        "mismatches": mismatches,
+    }
+
+
+def read_published_features(output_dir: Path) -> pa.Table:
+    """Latest published row per user across the base and delta files."""
+    table = pq.read_table(output_dir)
+    order = pc.sort_indices(table, [(USER_COLUMN, "ascending"), ("event_timestamp", "descending")]).to_numpy()
+    users = table.column(USER_COLUMN).take(pa.array(order)).to_numpy(zero_copy_only=False)
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = users[1:] != users[:-1]
+    return table.take(pa.array(order[first]))
+
+
+def _score(buckets: Dict[str, np.ndarray], sketches: Dict[str, QuantileSketch]) -> Dict[str, np.ndarray]:
+    """Quintile scores (ties share the lower score) and the monetary percentile rank, from the sketches."""
+    scores = {
+        f"{name}_score": (1 + np.searchsorted(sketches[name].quantile_buckets(QUINTILES), buckets[name], side="left")).astype(np.int8)
+        for name in SKETCHES
+    }
+    total = max(sketches["monetary"].total, 1)
+    scores["lifetime_value"] = np.round(sketches["monetary"].count_at_most(buckets["monetary"]) / total, 2).astype(np.float32)
+    return scores
+
+
+def _sketch_buckets(order_count: np.ndarray, order_cents: np.ndarray, last_order: np.ndarray) -> Dict[str, np.ndarray]:
+    # Recency ranks by last order day (later = more recent), so its buckets don't move as days pass.
+    return {
+        "recency": last_order // MICROS_PER_DAY,
+        "frequency": _log_buckets(order_count),
+        "monetary": _log_buckets(order_cents),
+    }
+
+
+def _log_buckets(values: np.ndarray) -> np.ndarray:
+    buckets = np.zeros(values.shape, dtype=np.int64)
+    positive = values > 0
+    raw = np.ceil(np.log(values[positive].astype(np.float64)) / LOG_GAMMA).astype(np.int64) + LOG_OFFSET
+    buckets[positive] = np.clip(raw, 1, LOG_BUCKETS - 1)
+    return buckets
+
+
+def _feature_table(user_ids: pa.Array, aggregates: RFMAggregates, scores: Dict[str, np.ndarray], end: date) -> pa.Table:
+    """One row per user in the `user_behavior_metrics` source schema (plus the RFM components)."""
+    n = len(user_ids)
+    count = aggregates.order_count
+    as_of = pa.array(np.full(n, _day_index(end + timedelta(days=1)) * MICROS_PER_DAY), pa.timestamp("us", tz="UTC"))
+    created = pa.array(np.full(n, int(time.time() * 1e6), dtype=np.int64), pa.timestamp("us", tz="UTC"))
+    rfm = (scores["recency_score"].astype(np.int64) + scores["frequency_score"] + scores["monetary_score"] - 3) / 12.0
+    return pa.table(
+        {
+            USER_COLUMN: user_ids.cast(pa.string()),
+            "event_timestamp": as_of,
+            "created_at": created,
+            "orders_last_30d": aggregates.recent_orders,
+            "total_orders": count,
+            "avg_order_value": (aggregates.order_cents / np.maximum(count, 1) / 100.0).astype(np.float32),
+            "lifetime_value_score": scores["lifetime_value"],
+            "rfm_score": rfm.astype(np.float32),
+            "last_order_at": pa.array(aggregates.last_order, pa.timestamp("us", tz="UTC")),
+            "monetary_value": aggregates.order_cents / 100.0,
+            "recency_score": scores["recency_score"],
+            "frequency_score": scores["frequency_score"],
+            "monetary_score": scores["monetary_score"],
+        }
+    )
+
+
+def _write_state(root: Path, aggregates: RFMAggregates, sketches: Dict[str, QuantileSketch], scores: Dict[str, np.ndarray]) -> None:
+    """Write a fresh state directory next to `root` and swap it in."""
+    staging = root.with_name(f".{root.name}.{os.getpid()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    (staging / "window").mkdir(parents=True)
+    values = {
+        "order_count": aggregates.order_count,
+        "order_cents": aggregates.order_cents,
+        "last_order": aggregates.last_order,
+        "recent_orders": aggregates.recent_orders,
+        **scores,
+    }
+    for name, dtype in STATE_ARRAYS.items():
+        np.ascontiguousarray(values[name], dtype=dtype).tofile(staging / f"{name}.bin")
+    user_ids = aggregates.user_ids.cast(pa.large_string())
+    _, offsets, data = user_ids.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[: len(user_ids) + 1]
+    offsets.tofile(staging / "user_offsets.i64")
+    (staging / "user_ids.bin").write_bytes(data.to_pybytes()[: int(offsets[-1])] if data is not None else b"")
+    _save_sketches(staging / "sketches-0.npz", sketches)
+    window = {}
+    for day, (day_users, day_orders) in aggregates.window.items():
+        window[str(day)] = f"{day}-0.npz"
+        _save_npz(staging / "window" / window[str(day)], users=day_users, orders=day_orders)
+    commit_json(
+        staging / META_FILE,
+        {
+            "end": aggregates.end.isoformat(),
+            "users": len(user_ids),
+            "user_bytes": int(offsets[-1]),
+            "seq": 0,
+            "window_days": WINDOW_DAYS,
+            "sketches": "sketches-0.npz",
+            "window": window,
+            "output": None,
+        },
+    )
+    previous = root.with_name(f".{root.name}.{os.getpid()}.old")
+    if root.exists():
+        os.replace(root, previous)
+    os.replace(staging, root)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def _publish(output_dir: Path, name: str, table: pa.Table, replace: bool = False) -> str:
+    """Write one file into the source directory; `replace` drops every other file once it is in place."""
+    if output_dir.is_file():
+        output_dir.unlink()  # single-file layout from before incremental updates
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_dir / f".{name}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, output_dir / name)
+    if replace:
+        for stale in output_dir.glob("*.parquet"):
+            if stale.name != name:
+                stale.unlink()
+    return name
+
+
+def _append_users(root: Path, state: RFMState, new_ids: List[str]) -> None:
+    """Append new users' ids and zeroed rows after the committed ones (extra rows are truncated on open)."""
+    if not new_ids:
+        return
+    encoded = [user_id.encode("utf-8") for user_id in new_ids]
+    offsets = int(state.meta["user_bytes"]) + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    with open(root / "user_ids.bin", "ab") as handle:
+        handle.write(b"".join(encoded))
+    with open(root / "user_offsets.i64", "ab") as handle:
+        handle.write(offsets.tobytes())
+    for name, dtype in STATE_ARRAYS.items():
+        with open(root / f"{name}.bin", "ab") as handle:
+            handle.write(np.zeros(len(new_ids), dtype=dtype).tobytes())
+
+
+def _user_ids(state: RFMState, new_ids: List[str], rows: np.ndarray) -> pa.Array:
+    ids = state.user_id_array()
+    if new_ids:
+        ids = pa.concat_arrays([ids, pa.array(new_ids, pa.large_string())])
+    return ids.take(pa.array(rows))
+
+
+def _window_buckets(users: np.ndarray, days: np.ndarray) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Orders per (day, user) as {day: (sorted user indices, orders)}."""
+    if users.size == 0:
+        return {}
+    pairs, orders = np.unique(np.stack([days, users]), axis=1, return_counts=True)
+    bounds = np.flatnonzero(np.diff(pairs[0])) + 1
+    return {
+        int(day_pairs[0, 0]): (day_pairs[1].copy(), day_orders.astype(np.int64))
+        for day_pairs, day_orders in zip(np.split(pairs, bounds, axis=1), np.split(orders, bounds))
+    }
+
+
+def _merge_window(users: np.ndarray, orders: np.ndarray, more_users: np.ndarray, more_orders: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    merged, inverse = np.unique(np.concatenate([users, more_users]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([orders, more_orders])).astype(np.int64)
+
+
+def _valid_orders(batch: pa.RecordBatch, end: date, after: Optional[date] = None) -> pa.RecordBatch:
+    """
+    Drop orders without a user or timestamp, with an excluded status, or placed after the end of `end`
+    (or, with `after`, on or before the end of that day).
+    """
+    timestamps = batch.column(TIMESTAMP_COLUMN)
+    if not pa.types.is_timestamp(timestamps.type):
+        timestamps = pc.cast(timestamps, pa.timestamp("us", tz="UTC"))
+        batch = batch.set_column(batch.schema.get_field_index(TIMESTAMP_COLUMN), TIMESTAMP_COLUMN, timestamps)
+    cutoff = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    cutoff = cutoff if timestamps.type.tz else cutoff.replace(tzinfo=None)
+    mask = pc.and_(pc.is_valid(batch.column(USER_COLUMN)), pc.less(timestamps, pa.scalar(cutoff, timestamps.type)))
+    if after is not None:
+        first = datetime.combine(after + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        first = first if timestamps.type.tz else first.replace(tzinfo=None)
+        mask = pc.and_(mask, pc.greater_equal(timestamps, pa.scalar(first, timestamps.type)))
+    if STATUS_COLUMN in batch.schema.names:
+        excluded = pc.is_in(batch.column(STATUS_COLUMN), pa.array(EXCLUDED_STATUSES))
+        mask = pc.and_(mask, pc.invert(pc.fill_null(excluded, False)))
+    return batch.filter(pc.fill_null(mask, False))
+
+
+def _epoch_micros(column: pa.Array) -> np.ndarray:
+    values = column.cast(pa.int64()).to_numpy()
+    per_second = _UNITS_PER_SECOND[column.type.unit]
+    return values * (1_000_000 // per_second) if per_second <= 1_000_000 else values // (per_second // 1_000_000)
+
+
+def _cents(column: pa.Array) -> np.ndarray:
+    # Integer cents keep sums exact, so incremental totals match a full rebuild bit for bit.
+    return np.rint(pc.fill_null(column.cast(pa.float64()), 0.0).to_numpy() * 100.0)
+
+
+def _day_index(day: date) -> int:
+    return (day - _EPOCH.date()).days
+
+
+def _default_end() -> date:
+    """Features are built through the last complete UTC day."""
+    return datetime.now(timezone.utc).date() - timedelta(days=1)
+
+
+def _extended(values: np.ndarray, users: int) -> np.ndarray:
+    out = np.zeros(users, dtype=values.dtype)
+    out[: values.shape[0]] = values
+    return out
+
+
+def _grown(values: np.ndarray, capacity: int, fill) -> np.ndarray:
+    grown = np.full(capacity, fill, dtype=values.dtype)
+    grown[: values.shape[0]] = values
+    return grown
+
+
+def _map_array(path: Path, dtype: Any, rows: int, mode: str) -> np.ndarray:
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(rows,))
+
+
+def _save_sketches(path: Path, sketches: Dict[str, QuantileSketch]) -> None:
+    arrays: Dict[str, Any] = {}
+    for name, sketch in sketches.items():
+        arrays[f"{name}_counts"] = sketch.counts
+        arrays[f"{name}_base"] = np.int64(sketch.base)
+    _save_npz(path, **arrays)
+
+
+def _save_npz(path: Path, **arrays: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as handle:
+        np.savez(handle, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _remove_unreferenced(root: Path, meta: Dict[str, Any]) -> None:
+    """Drop sketch, window and output files the committed meta doesn't name (superseded or from a rolled-back update)."""
+    for stale in root.glob("sketches-*.npz"):
+        if stale.name != meta["sketches"]:
+            stale.unlink()
+    window = set(meta["window"].values())
+    for stale in (root / "window").glob("*.npz"):
+        if stale.name not in window:
+            stale.unlink()
+    output = meta.get("output")
+    if output and Path(output["dir"]).is_dir():
+        published = {output["base"], *output["deltas"]}
+        for stale in Path(output["dir"]).glob("*.parquet"):
+            if stale.name not in published:
+                stale.unlink()
+
+
+def _parse_end(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RFM feature maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Rebuild features and state from the full order export")
+    build.add_argument("--orders", default=str(ORDER_EVENTS_PATH), help="Parquet (file or directory) or CSV of orders")
+    build.add_argument("--output", default=str(USER_FEATURES_PATH))
+    build.add_argument("--as-of", default=None, help="Last UTC date included (default: yesterday)")
+    build.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    build.add_argument("--state-dir", default=str(RFM_STATE_DIR))
+    update = subcommands.add_parser("update", help="Fold one day's order delta in (builds from the full export if no state)")
+    update.add_argument("--orders", default=str(ORDER_DELTA_PATH), help="Parquet or CSV of the day's orders")
+    update.add_argument("--as-of", default=None, help="Last UTC date included (default: yesterday); no-op if already applied")
+    update.add_argument("--state-dir", default=str(RFM_STATE_DIR))
+    verify = subcommands.add_parser("verify", help="Compare the published features with a full recompute")
+    verify.add_argument("--orders", default=str(ORDER_EVENTS_PATH))
+    verify.add_argument("--state-dir", default=str(RFM_STATE_DIR))
+    args = parser.parse_args()
+
+    root = Path(args.state_dir)
+    if args.command == "update" and read_json(root / META_FILE) is None:
+        if not ORDER_EVENTS_PATH.exists():
+            print(json.dumps({"status": "skipped", "reason": f"no RFM state and order export missing: {ORDER_EVENTS_PATH}"}))
+            return
+        summary = build_rfm_features(ORDER_EVENTS_PATH, USER_FEATURES_PATH, _parse_end(args.as_of), root=root)
+        print(json.dumps({"status": "built", **summary}))
+        return
+    if not Path(args.orders).exists():
+        print(json.dumps({"status": "skipped", "reason": f"order export missing: {args.orders}"}))
+        return
+
+    if args.command == "build":
+        summary = build_rfm_features(Path(args.orders), Path(args.output), _parse_end(args.as_of), args.chunk_rows, root)
+        print(json.dumps({"status": "built", **summary}))
+    elif args.command == "update":
+        summary = update_rfm_features(Path(args.orders), _parse_end(args.as_of), root)
+        print(json.dumps({"status": "skipped" if summary.get("skipped") else "updated", **summary}))
+    elif args.command == "verify":
+        result = verify_rfm_features(Path(args.orders), root)
+        print(json.dumps(result))
+        if result["status"] != "match":
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
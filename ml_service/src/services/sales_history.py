@@ -0,0 +1,442 @@
+"""
+Sales History Store
+On-disk daily unit sales per SKU: the history the forecasting engine, refreshes and backtests fit on.
+
+Reads are memory-mapped and gather only the requested SKU rows and days, so a 100k-SKU × 3-year history
+is processed chunk by chunk without ever being loaded whole.
+
+Layout:
+    manifest.json       start_date, committed day and product counts, partition list; rewritten atomically last
+    index-<gen>.txt     append-only SKU index, one id per line; the line number is the SKU's row
+    p<first>-<gen>.f32  day-major float32 partition of up to PARTITION_DAYS days × `stride` SKUs (NaN = no reading)
+
+A partition's stride is the SKU count when it was started. SKUs added later read as NaN in older
+partitions, and their first new day opens a partition with the wider stride. Appending a day writes one
+row to the open partition and then commits the manifest. Rows past the committed count are left behind by
+interrupted appends; readers ignore them and the next append truncates them.
+
+`product_history` is the read every fit goes through: SKUs the store hasn't seen, or every SKU before the
+first append, get synthetic demo histories.
+
+Usage:
+    python -m src.services.sales_history append [--actuals PATH]
+    python -m src.services.sales_history seed [--products N] [--days D]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from src.services.forecast_engine import stable_seed, synthetic_history
+from src.utils.store_files import commit_json, read_json
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+SALES_HISTORY_DIR = Path(os.getenv("SALES_HISTORY_DIR", str(BASE_DIR / "artifacts" / "sales_history")))
+PARTITION_DAYS = 32
+MANIFEST = "manifest.json"
+HISTORY_DAYS = 365  # days of history every forecast is fitted on
+FEATURE_DATA_DIR = BASE_DIR / "feature_store" / "data"
+PRODUCT_FEATURES_PATH = FEATURE_DATA_DIR / "product_performance_features.parquet"
+# Daily unit sales per SKU (product_id, date, units) appended to the store each night.
+DAILY_ACTUALS_PATH = Path(os.getenv("FORECAST_ACTUALS_PATH", str(FEATURE_DATA_DIR / "daily_product_sales.parquet")))
+PRODUCT_SERIES_PARAMS = {"base": 68, "growth": 1.6, "noise": 8.5, "weekly_seasonality": True}
+
+
+@dataclass
+class _Partition:
+    path: Path
+    first_day: int
+    days: int
+    stride: int
+
+
+class SalesHistory:
+    """One committed view of the store; partitions are memory-mapped on first use."""
+
+    def __init__(self, root: Path, manifest: Dict[str, Any]):
+        self.root = root
+        self.start_date = date.fromisoformat(manifest["start_date"])
+        self.days: int = manifest["days"]
+        self.updated_at: str = manifest["updated_at"]
+        with open(root / manifest["index_file"], encoding="utf-8") as handle:
+            self.product_ids = [line.rstrip("\n") for _, line in zip(range(manifest["products"]), handle)]
+        self._rows = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        self._partitions = [
+            _Partition(root / part["file"], part["first_day"], part["days"], part["stride"])
+            for part in manifest["partitions"]
+        ]
+        self._maps: Dict[Path, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._rows
+
+    @property
+    def end_date(self) -> date:
+        """Last stored day (inclusive)."""
+        return self.start_date + timedelta(days=self.days - 1)
+
+    def rows(self, product_ids: Sequence[str]) -> np.ndarray:
+        """Store rows for `product_ids` (-1 for SKUs the store hasn't seen)."""
+        return np.fromiter((self._rows.get(product_id, -1) for product_id in product_ids), dtype=np.int64)
+
+    def read(self, product_ids: Sequence[str], days: Optional[int] = None, end: Optional[date] = None) -> np.ndarray:
+        """
+        (len(product_ids) × days) float64 history ending on `end` (default: the last stored day).
+
+        Days before the first stored day, and SKUs or days without a reading, come back as NaN.
+        """
+        end_index = self.days if end is None else (end - self.start_date).days + 1
+        days = self.days if days is None else days
+        first = end_index - days
+        out = np.full((len(product_ids), days), np.nan)
+        rows = self.rows(product_ids)
+        for part in self._partitions:
+            lo, hi = max(part.first_day, first), min(part.first_day + part.days, end_index)
+            if hi <= lo:
+                continue
+            present = np.flatnonzero((rows >= 0) & (rows < part.stride))
+            if not present.size:
+                continue
+            block = self._map(part)[lo - part.first_day : hi - part.first_day]
+            out[present, lo - first : hi - first] = block[:, rows[present]].T
+        return out
+
+    def iter_chunks(self, chunk_size: int = 256, days: Optional[int] = None) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """(product_ids, history) for every stored SKU, `chunk_size` SKUs at a time."""
+        for idx in range(0, len(self.product_ids), chunk_size):
+            chunk = self.product_ids[idx : idx + chunk_size]
+            yield chunk, self.read(chunk, days)
+
+    def _map(self, part: _Partition) -> np.ndarray:
+        if part.path not in self._maps:
+            self._maps[part.path] = np.memmap(part.path, dtype=np.float32, mode="r", shape=(part.days, part.stride))
+        return self._maps[part.path]
+
+
+class SalesHistoryStore:
+    """Reader that picks up newly committed days (and SKUs) when the manifest changes."""
+
+    def __init__(self, root: Path = SALES_HISTORY_DIR, check_interval_sec: float = 1.0):
+        self.root = root
+        self._check_interval = check_interval_sec
+        self._last_check = 0.0
+        self._manifest_mtime: Optional[float] = None
+        self._history: Optional[SalesHistory] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[SalesHistory]:
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval:
+            return self._history
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = (self.root / MANIFEST).stat().st_mtime
+            except OSError:
+                self._history, self._manifest_mtime = None, None
+                return None
+            if mtime != self._manifest_mtime:
+                try:
+                    self._history = SalesHistory(self.root, read_json(self.root / MANIFEST))
+                    self._manifest_mtime = mtime
+                except (OSError, ValueError, KeyError) as exc:
+                    logger.warning("Sales history unreadable; using synthetic histories", error=str(exc))
+                    self._history = None
+            return self._history
+
+
+def append_sales_days(
+    root: Path,
+    start_date: date,
+    product_ids: Sequence[str],
+    units: np.ndarray,
+) -> Dict[str, Any]:
+    """
+    Append daily `units` (len(product_ids) × days, first column on `start_date`; NaN = no reading).
+
+    Days already stored are skipped, so re-running a day is a no-op; a gap since the last stored day is NaN.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_json(root / MANIFEST) or _empty_manifest(start_date)
+    units = np.asarray(units, dtype=np.float32)
+    offset = (start_date - date.fromisoformat(manifest["start_date"])).days
+    if offset < 0:
+        raise ValueError(f"Cannot append days before the store's start date {manifest['start_date']}")
+    committed = manifest["days"]
+    if offset + units.shape[1] <= committed:
+        return manifest
+    skip = max(committed - offset, 0)
+    gap = max(offset - committed, 0)
+    units = np.hstack([np.full((units.shape[0], gap), np.nan, dtype=np.float32), units[:, skip:]])
+
+    rows = _register_products(root, manifest, product_ids)
+    width = manifest["products"]
+
+    def fill(first: int, stop: int, stride: int) -> np.ndarray:
+        block = np.full((stop - first, stride), np.nan, dtype=np.float32)
+        known = rows < stride
+        block[:, rows[known]] = units[known, first:stop].T
+        return block
+
+    _write_days(root, manifest, units.shape[1], width, fill)
+    return commit_json(root / MANIFEST, manifest)
+
+
+def bulk_load_sales(
+    root: Path,
+    start_date: date,
+    product_ids: Sequence[str],
+    days: int,
+    history: Callable[[Sequence[str]], np.ndarray],
+    chunk_size: int = 1024,
+) -> Dict[str, Any]:
+    """
+    Replace the store with `days` days for `product_ids`, filled `chunk_size` SKUs at a time.
+
+    `history(chunk)` returns the (len(chunk) × days) history of one chunk. Partitions are created
+    memory-mapped and filled column block by column block, so peak memory is one chunk, not the whole history.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    previous = read_json(root / MANIFEST)
+    manifest = _empty_manifest(start_date, generation=(previous or {}).get("generation", 0) + 1)
+    index = root / manifest["index_file"]
+    index.write_text("".join(f"{product_id}\n" for product_id in product_ids), encoding="utf-8")
+
+    stride = len(product_ids)
+    partitions = []
+    for first in range(0, days, PARTITION_DAYS):
+        part_days = min(PARTITION_DAYS, days - first)
+        path = root / _partition_name(first, manifest["generation"])
+        partitions.append((first, part_days, np.memmap(path, dtype=np.float32, mode="w+", shape=(part_days, stride))))
+        manifest["partitions"].append({"file": path.name, "first_day": first, "days": part_days, "stride": stride})
+    for idx in range(0, stride, chunk_size):
+        block = np.asarray(history(product_ids[idx : idx + chunk_size]), dtype=np.float32)
+        for first, part_days, mapped in partitions:
+            mapped[:, idx : idx + block.shape[0]] = block[:, first : first + part_days].T
+    for _, _, mapped in partitions:
+        mapped.flush()
+    del partitions
+
+    manifest.update(days=days, products=stride, index_bytes=index.stat().st_size)
+    manifest = commit_json(root / MANIFEST, manifest)
+    live = {manifest["index_file"], *(part["file"] for part in manifest["partitions"])}
+    for stale in [*root.glob("p*.f32"), *root.glob("index-*.txt")]:
+        if stale.name not in live:
+            stale.unlink()
+    logger.info("Sales history loaded", products=stride, days=days, start_date=start_date.isoformat())
+    return manifest
+
+
+sales_history_store = SalesHistoryStore()
+
+
+def append_sales_history(root: Path = SALES_HISTORY_DIR, actuals_path: Optional[Path] = None) -> Dict[str, Any]:
+    """Append the days of actuals after the last stored day (a new store starts HISTORY_DAYS back)."""
+    history = SalesHistoryStore(root, check_interval_sec=0).current()
+    known = history.product_ids if history is not None else []
+    product_ids = list(dict.fromkeys([*known, *(product_id for product_id, _ in product_catalog())]))
+    if history is not None:
+        first_day = history.end_date + timedelta(days=1)
+    else:
+        first_day = yesterday() - timedelta(days=HISTORY_DAYS - 1)
+    actuals = load_daily_actuals(actuals_path or DAILY_ACTUALS_PATH, product_ids, first_day)
+    manifest = append_sales_days(root, first_day, product_ids, actuals)
+    logger.info("Sales history appended", days=manifest["days"], new_days=actuals.shape[1])
+    return {**manifest, "new_days": actuals.shape[1]}
+
+
+def seed_sales_history(
+    root: Path = SALES_HISTORY_DIR, products: Optional[int] = None, days: Optional[int] = None
+) -> Dict[str, Any]:
+    """Replace the store with synthetic demo histories ending yesterday (catalog SKUs, or `products` of them)."""
+    if products is None:
+        product_ids = list(dict.fromkeys(product_id for product_id, _ in product_catalog()))
+    else:
+        product_ids = [f"sku-{idx:06d}" for idx in range(products)]
+    days = days or HISTORY_DAYS
+    start = yesterday() - timedelta(days=days - 1)
+    return bulk_load_sales(root, start, product_ids, days, lambda chunk: synthetic_sales(chunk, days))
+
+
+def product_history(product_ids: Sequence[str], days: int = HISTORY_DAYS) -> np.ndarray:
+    """
+    The last `days` days of each SKU's daily sales (NaN = no reading), memory-mapped from the sales history store.
+
+    SKUs the store hasn't seen, or every SKU when there is no store yet, get synthetic demo histories.
+    """
+    history = sales_history_store.current()
+    if history is None:
+        return synthetic_sales(product_ids, days)
+    out = history.read(product_ids, days)
+    missing = np.flatnonzero(history.rows(product_ids) < 0)
+    if missing.size:
+        out[missing] = synthetic_sales([product_ids[row] for row in missing], days)
+    return out
+
+
+def history_end() -> date:
+    """Last day of the histories `product_history` returns."""
+    history = sales_history_store.current()
+    return history.end_date if history is not None else yesterday()
+
+
+def yesterday() -> date:
+    return datetime.utcnow().date() - timedelta(days=1)
+
+
+def synthetic_sales(product_ids: Sequence[str], days: int) -> np.ndarray:
+    return synthetic_history(
+        len(product_ids),
+        days,
+        seeds=[stable_seed(product_id) for product_id in product_ids],
+        **PRODUCT_SERIES_PARAMS,
+    )
+
+
+def product_catalog() -> List[Tuple[str, str]]:
+    """(product_id, category) pairs from the product feature export, or the static fallback catalog."""
+    try:
+        import pandas as pd
+
+        frame = pd.read_parquet(PRODUCT_FEATURES_PATH, columns=["product_id", "category"])
+        pairs = list(frame.drop_duplicates("product_id").itertuples(index=False, name=None))
+        if pairs:
+            return [(str(product_id), str(category)) for product_id, category in pairs]
+    except Exception as exc:  # pragma: no cover - depends on the export being present
+        logger.debug("Product features unavailable for catalog lookup", error=str(exc))
+    from src.services.recommendation_service import _default_candidates
+
+    return [(candidate.product_id, candidate.category) for candidate in _default_candidates()]
+
+
+def load_daily_actuals(path: Path, product_ids: List[str], first_day: date) -> np.ndarray:
+    """(products × new days) matrix of units sold from `first_day` on; NaN where a SKU has no row."""
+    try:
+        import pandas as pd
+
+        frame = pd.read_parquet(path, columns=["product_id", "date", "units"])
+    except Exception as exc:  # pragma: no cover - depends on the export being present
+        logger.warning("Daily actuals unavailable; no new days of sales", path=str(path), error=str(exc))
+        return np.empty((len(product_ids), 0))
+
+    days = (pd.to_datetime(frame["date"]).dt.normalize() - pd.Timestamp(first_day)).dt.days
+    frame = frame.assign(day=days)[days >= 0]
+    if frame.empty:
+        return np.empty((len(product_ids), 0))
+    rows = pd.Index(product_ids).get_indexer(frame["product_id"].astype(str))
+    known = rows >= 0
+    cells = (rows[known], frame["day"].to_numpy()[known])
+    shape = (len(product_ids), int(frame["day"].max()) + 1)
+    matrix = np.zeros(shape)
+    np.add.at(matrix, cells, frame["units"].to_numpy(dtype=np.float64)[known])
+    reported = np.zeros(shape, dtype=bool)
+    reported[cells] = True
+    matrix[~reported] = np.nan
+    return matrix
+
+
+def _write_days(
+    root: Path,
+    manifest: Dict[str, Any],
+    new_days: int,
+    width: int,
+    fill: Callable[[int, int, int], np.ndarray],
+) -> None:
+    """Append `new_days` rows, extending the open partition or opening new ones at the current SKU width."""
+    written = 0
+    while written < new_days:
+        parts = manifest["partitions"]
+        tail = parts[-1] if parts else None
+        if tail is None or tail["days"] >= PARTITION_DAYS or tail["stride"] != width:
+            first_day = manifest["days"] + written
+            tail = {
+                "file": _partition_name(first_day, manifest["generation"]),
+                "first_day": first_day,
+                "days": 0,
+                "stride": width,
+            }
+            parts.append(tail)
+        path = root / tail["file"]
+        if path.exists() and path.stat().st_size > tail["days"] * tail["stride"] * 4:
+            os.truncate(path, tail["days"] * tail["stride"] * 4)
+        count = min(PARTITION_DAYS - tail["days"], new_days - written)
+        with open(path, "ab") as handle:
+            handle.write(fill(written, written + count, width).tobytes())
+        tail["days"] += count
+        written += count
+    manifest["days"] += new_days
+
+
+def _register_products(root: Path, manifest: Dict[str, Any], product_ids: Sequence[str]) -> np.ndarray:
+    """Rows for `product_ids`, appending unseen SKUs to the index (committed with the manifest)."""
+    path = root / manifest["index_file"]
+    if path.exists() and path.stat().st_size > manifest["index_bytes"]:
+        os.truncate(path, manifest["index_bytes"])
+    known: Dict[str, int] = {}
+    if manifest["products"]:
+        with open(path, encoding="utf-8") as handle:
+            known = {line.rstrip("\n"): row for row, line in enumerate(handle)}
+    new = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in known]
+    if new:
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write("".join(f"{product_id}\n" for product_id in new))
+        known.update({product_id: len(known) + idx for idx, product_id in enumerate(new)})
+        manifest["products"] = len(known)
+        manifest["index_bytes"] = path.stat().st_size
+    return np.array([known[product_id] for product_id in product_ids], dtype=np.int64)
+
+
+def _partition_name(first_day: int, generation: int) -> str:
+    return f"p{first_day:05d}-{generation}.f32"
+
+
+def _empty_manifest(start_date: date, generation: int = 1) -> Dict[str, Any]:
+    return {
+        "start_date": start_date.isoformat(),
+        "generation": generation,
+        "days": 0,
+        "products": 0,
+        "index_file": f"index-{generation}.txt",
+        "index_bytes": 0,
+        "partitions": [],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sales history store maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    append = subcommands.add_parser("append", help="Append the days of actuals after the last stored day")
+    append.add_argument("--output-dir", default=str(SALES_HISTORY_DIR))
+    append.add_argument("--actuals", default=None, help="Parquet with product_id, date, units")
+    seed = subcommands.add_parser("seed", help="Replace the store with synthetic histories (demo / benchmarks)")
+    seed.add_argument("--output-dir", default=str(SALES_HISTORY_DIR))
+    seed.add_argument("--products", type=int, default=None, help="Synthetic SKU count (default: the catalog)")
+    seed.add_argument("--days", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "append":
+        manifest = append_sales_history(Path(args.output_dir), Path(args.actuals) if args.actuals else None)
+    else:
+        manifest = seed_sales_history(Path(args.output_dir), args.products, args.days)
+    keys = ("start_date", "days", "products", "updated_at", "new_days")
+    print(json.dumps({key: manifest[key] for key in keys if key in manifest}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Tree Ensemble
+The churn booster's trees as flat node arrays, plus a batched path-dependent TreeSHAP explainer over them.
+
+`TreeEnsemble.from_xgboost_json` reads the published `model.json` (XGBoost's JSON model format) directly,
+so serving needs nothing beyond numpy. Nodes of all trees are concatenated into one set of arrays;
+children are absolute node indices and leaves have `feature == -1`.
+
+`CompiledTrees` is the serving layout: contiguous feature index, threshold, default-branch, child offset
+and leaf value arrays, walked level by level over a whole batch of rows at once. `save_compiled` writes it,
+with the explainer tables, as a directory of .npy files that `load_compiled` memory-maps, so a worker
+loads the model in milliseconds and every worker on the host shares one copy in the page cache.
+
+`TreeShapExplainer` computes exact path-dependent TreeSHAP values (the attributions XGBoost's
+`pred_contribs=True` returns) in log-odds space. Each leaf only sees the few distinct features split on
+along its root path, and its Shapley contribution depends on the row only through which of those features'
+conditions the row satisfies. So every (leaf, satisfied-pattern) entry is precomputed once per model, and
+explaining a batch is one vectorized pass: evaluate every split for every row, form each leaf's pattern
+bits, gather the table entries and sum them per feature. The work per row is a small multiple of walking
+the trees, and no per-row Python runs.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Distinct features along one root-to-leaf path (pattern bits fit a uint8); tables hold 2**depth rows per leaf.
+MAX_EXPLAIN_DEPTH = 8
+# Bound on the (rows × leaves × path slots) working set of one explain chunk.
+EXPLAIN_CHUNK_ELEMENTS = 1 << 20
+# Bound on the (rows × trees) node cursor of one inference chunk; small enough to stay in cache.
+INFERENCE_CHUNK_ELEMENTS = 1 << 14
+COMPILED_MANIFEST = "trees.json"
+
+
+@dataclass
+class TreeEnsemble:
+    """Binary-logistic tree ensemble flattened into node arrays (all trees concatenated)."""
+
+    feature: np.ndarray  # int32 (nodes,) split feature, -1 for leaves
+    threshold: np.ndarray  # float32 (nodes,) rows with x < threshold go left
+    left: np.ndarray  # int32 (nodes,) absolute index of the left child, -1 for leaves
+    right: np.ndarray  # int32 (nodes,)
+    default_left: np.ndarray  # bool (nodes,) branch taken when the feature is missing
+    value: np.ndarray  # float64 (nodes,) leaf output in log-odds, 0 for internal nodes
+    cover: np.ndarray  # float64 (nodes,) training hessian sum reaching the node
+    roots: np.ndarray  # int32 (trees,) root node of each tree
+    base_margin: float
+    n_features: int
+
+    @classmethod
+    def from_xgboost_json(cls, model: Dict[str, Any]) -> "TreeEnsemble":
+        """Flatten a `binary:logistic` gbtree saved with `Booster.save_model("model.json")`."""
+        learner = model["learner"]
+        booster = learner["gradient_booster"]
+        if booster.get("name", "gbtree") != "gbtree":
+            raise ValueError(f"Unsupported booster type: {booster.get('name')}")
+        objective = learner.get("objective", {}).get("name", "binary:logistic")
+        if objective != "binary:logistic":
+            raise ValueError(f"Unsupported objective: {objective}")
+
+        trees = booster["model"]["trees"]
+        sizes = [len(tree["left_children"]) for tree in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int32)
+
+        def column(key: str, dtype: Any) -> np.ndarray:
+            if not trees:
+                return np.empty(0, dtype)
+            return np.concatenate([np.asarray(tree[key], dtype=dtype) for tree in trees])
+
+        left = column("left_children", np.int32)
+        right = column("right_children", np.int32)
+        shift = np.repeat(offsets[:-1], sizes)
+        is_leaf = left == -1
+        conditions = column("split_conditions", np.float64)
+        base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+        return cls(
+            feature=np.where(is_leaf, -1, column("split_indices", np.int32)).astype(np.int32),
+            threshold=np.where(is_leaf, 0.0, conditions).astype(np.float32),
+            left=np.where(is_leaf, -1, left + shift).astype(np.int32),
+            right=np.where(is_leaf, -1, right + shift).astype(np.int32),
+            default_left=column("default_left", np.int8).astype(bool),
+            value=np.where(is_leaf, conditions, 0.0),
+            cover=column("sum_hessian", np.float64),
+            roots=offsets[:-1],
+            base_margin=math.log(base_score / (1.0 - base_score)),
+            n_features=int(learner["learner_model_param"]["num_feature"]),
+        )
+
+    @classmethod
+    def from_file(cls, path: Path) -> "TreeEnsemble":
+        return cls.from_xgboost_json(json.loads(Path(path).read_text()))
+
+    def __len__(self) -> int:
+        return self.roots.shape[0]
+
+    def leaf_paths(self) -> List[Tuple[int, List[Tuple[int, bool]]]]:
+        """(leaf, [(split node, went left), ...]) for every leaf, root first."""
+        paths: List[Tuple[int, List[Tuple[int, bool]]]] = []
+        for root in self.roots.tolist():
+            stack: List[Tuple[int, List[Tuple[int, bool]]]] = [(root, [])]
+            while stack:
+                node, path = stack.pop()
+                if self.feature[node] < 0:
+                    paths.append((node, path))
+                    continue
+                stack.append((int(self.right[node]), path + [(node, False)]))
+                stack.append((int(self.left[node]), path + [(node, True)]))
+        return paths
+
+
+@dataclass
+class CompiledTrees:
+    """
+    Inference layout of a TreeEnsemble: one record per node, siblings adjacent, leaves looping to themselves.
+
+    The right child is always `child + 1`, and a leaf's child is the leaf itself under a threshold nothing
+    reaches, so every tree is walked with the same `depth` branch-free steps: gather the split, compare,
+    step to `child + goes_right`. A batch walks all its rows through all trees one level at a time.
+    """
+
+    # Indices are stored as intp so gathers never convert them.
+    feature: np.ndarray  # intp (nodes,) split feature, 0 for leaves
+    threshold: np.ndarray  # float32 (nodes,) rows with x < threshold go left; +inf for leaves
+    default_left: np.ndarray  # bool (nodes,) branch taken when the feature is missing; True for leaves
+    child: np.ndarray  # intp (nodes,) left child (the right one follows it); the node itself for leaves
+    value: np.ndarray  # float32 (nodes,) leaf output in log-odds, 0 for internal nodes
+    roots: np.ndarray  # intp (trees,)
+    depth: int
+    base_margin: float
+    n_features: int
+
+    ARRAYS = ("feature", "threshold", "default_left", "child", "value", "roots")
+
+    @classmethod
+    def from_ensemble(cls, ensemble: TreeEnsemble) -> "CompiledTrees":
+        # Breadth-first renumbering puts each node's two children next to each other.
+        order: List[int] = []
+        roots: List[int] = []
+        depth = 0
+        for root in ensemble.roots.tolist():
+            roots.append(len(order))
+            level, levels = [root], 0
+            while level:
+                order.extend(level)
+                inner = [node for node in level if ensemble.feature[node] >= 0]
+                level = [int(child) for node in inner for child in (ensemble.left[node], ensemble.right[node])]
+                levels += 1
+            depth = max(depth, levels - 1)
+        order_array = np.array(order, dtype=np.int64)
+        position = np.empty(len(order), dtype=np.int64)
+        position[order_array] = np.arange(len(order))
+        inner = ensemble.feature[order_array] >= 0
+        return cls(
+            feature=np.where(inner, ensemble.feature[order_array], 0).astype(np.intp),
+            threshold=np.where(inner, ensemble.threshold[order_array], np.inf).astype(np.float32),
+            default_left=np.where(inner, ensemble.default_left[order_array], True),
+            child=np.where(inner, position[ensemble.left[order_array]], np.arange(len(order))).astype(np.intp),
+            value=np.where(inner, 0.0, ensemble.value[order_array]).astype(np.float32),
+            roots=np.array(roots, dtype=np.intp),
+            depth=depth,
+            base_margin=ensemble.base_margin,
+            n_features=ensemble.n_features,
+        )
+
+    def margin(self, matrix: np.ndarray) -> np.ndarray:
+        """Raw log-odds per row (XGBoost's `predict_type="margin"`); NaN follows each split's default branch."""
+        # float32 like XGBoost; +inf is clipped so it still fails to reach a leaf's +inf threshold.
+        rows = np.minimum(np.asarray(matrix, dtype=np.float32), np.finfo(np.float32).max)
+        out = np.empty(rows.shape[0])
+        chunk = max(1, INFERENCE_CHUNK_ELEMENTS // max(self.roots.shape[0], 1))
+        for start in range(0, rows.shape[0], chunk):
+            block = rows[start : start + chunk]
+            missing = bool(np.isnan(block).any())
+            flat = block.ravel()
+            row_base = (np.arange(block.shape[0]) * block.shape[1])[:, None]
+            node = np.broadcast_to(self.roots, (block.shape[0], self.roots.shape[0]))
+            for _ in range(self.depth):
+                values = flat.take(row_base + self.feature[node])
+                goes_right = values >= self.threshold[node]
+                if missing:
+                    goes_right |= np.isnan(values) & ~self.default_left[node]
+                node = self.child[node] + goes_right
+            out[start : start + chunk] = self.value[node].sum(axis=1, dtype=np.float64)
+        return self.base_margin + out
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-self.margin(matrix)))
+
+
+class TreeShapExplainer:
+    """Path-dependent TreeSHAP for a TreeEnsemble, batched over rows via per-leaf Shapley tables."""
+
+    ARRAYS = ("split_feature", "split_threshold", "split_default_left", "step_column", "step_bit", "table", "scatter")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], expected_value: float, n_features: int):
+        self.expected_value = expected_value
+        self.n_features = n_features
+        self._split_feature = arrays["split_feature"]  # (splits,) every split any leaf path uses
+        self._split_threshold = arrays["split_threshold"]
+        self._split_default_left = arrays["split_default_left"]
+        # (depth, leaves) column of [went left | went right] that means the row leaves the path at that step:
+        # split s for steps that go right, splits + s for steps that go left.
+        self._step_column = arrays["step_column"]
+        self._step_bit = arrays["step_bit"]  # uint8 (depth, leaves) slot bit of the step's feature, 0 for padding
+        # Row `leaf · 2**slots + pattern` holds that leaf's slot values for that satisfied-pattern.
+        self._table = arrays["table"]
+        # (leaves · slots) × (features + padding column) one-hot that sums slot values into their features.
+        self._scatter = arrays["scatter"]
+        slots = self._table.shape[1]
+        self._all_bits = (1 << slots) - 1
+        self._leaf_row = np.arange(self._step_column.shape[1], dtype=np.int64) << slots
+
+    @classmethod
+    def from_ensemble(cls, ensemble: TreeEnsemble) -> "TreeShapExplainer":
+        paths = ensemble.leaf_paths()
+        depth = max((len(path) for _, path in paths), default=0)
+        slots = max((len({int(ensemble.feature[node]) for node, _ in path}) for _, path in paths), default=0)
+        if slots > MAX_EXPLAIN_DEPTH:
+            raise ValueError(f"Trees split on {slots} distinct features along one path (max {MAX_EXPLAIN_DEPTH})")
+        depth, slots = max(depth, 1), max(slots, 1)
+
+        # Splits are evaluated once per row and shared by every leaf below them.
+        splits = np.flatnonzero(ensemble.feature >= 0)
+        split_column = np.full(ensemble.feature.shape[0], -1, dtype=np.int64)
+        split_column[splits] = np.arange(splits.shape[0])
+
+        n_leaves = len(paths)
+        step_column = np.zeros((depth, n_leaves), dtype=np.intp)
+        step_bit = np.zeros((depth, n_leaves), dtype=np.uint8)
+        # Padding slots are null players: always satisfied, zero fraction 1, so they never change a value.
+        slot_feature = np.full((n_leaves, slots), ensemble.n_features, dtype=np.int64)
+        zero_fraction = np.ones((n_leaves, slots))
+        leaf_value = np.empty(n_leaves)
+        expected = ensemble.base_margin
+        for row, (leaf, path) in enumerate(paths):
+            leaf_value[row] = ensemble.value[leaf]
+            slot_of: Dict[int, int] = {}
+            weight = 1.0
+            for step, (node, went_left) in enumerate(path):
+                feature = int(ensemble.feature[node])
+                slot = slot_of.setdefault(feature, len(slot_of))
+                child = ensemble.left[node] if went_left else ensemble.right[node]
+                ratio = ensemble.cover[child] / ensemble.cover[node] if ensemble.cover[node] > 0 else 0.0
+                weight *= ratio
+                zero_fraction[row, slot] *= ratio
+                slot_feature[row, slot] = feature
+                step_column[step, row] = split_column[node] + (splits.shape[0] if went_left else 0)
+                step_bit[step, row] = 1 << slot
+            expected += leaf_value[row] * weight
+
+        scatter = np.zeros((n_leaves * slots, ensemble.n_features + 1), dtype=np.float32)
+        scatter[np.arange(n_leaves * slots), slot_feature.ravel()] = 1.0
+        arrays = {
+            "split_feature": ensemble.feature[splits].astype(np.int64),
+            "split_threshold": ensemble.threshold[splits],
+            "split_default_left": ensemble.default_left[splits],
+            "step_column": step_column,
+            "step_bit": step_bit,
+            "table": _shapley_tables(leaf_value, zero_fraction).reshape(n_leaves << slots, slots).astype(np.float32),
+            "scatter": scatter,
+        }
+        return cls(arrays, float(expected), ensemble.n_features)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, f"_{name}") for name in self.ARRAYS}
+
+    def shap_values(self, matrix: np.ndarray) -> np.ndarray:
+        """(rows × features) log-odds contributions; each row sums to its margin minus `expected_value`."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        depth, n_leaves = self._step_column.shape
+        out = np.zeros((matrix.shape[0], self.n_features + 1))
+        chunk = max(1, EXPLAIN_CHUNK_ELEMENTS // max(n_leaves * depth, 1))
+        for start in range(0, matrix.shape[0], chunk):
+            rows = matrix[start : start + chunk]
+            values = rows[:, self._split_feature]
+            goes_left = np.where(np.isnan(values), self._split_default_left, values < self._split_threshold)
+            branch = np.concatenate([goes_left, ~goes_left], axis=1)
+            failed_bits = np.zeros((rows.shape[0], n_leaves), dtype=np.uint8)
+            for step in range(depth):
+                failed_bits |= branch[:, self._step_column[step]] * self._step_bit[step]
+            contributions = self._table.take(self._leaf_row + (self._all_bits ^ failed_bits), axis=0)
+            out[start : start + chunk] = contributions.reshape(rows.shape[0], -1) @ self._scatter
+        return out[:, : self.n_features]
+
+
+def save_compiled(path: Path, trees: CompiledTrees, explainer: TreeShapExplainer) -> None:
+    """Publish the inference arrays and explainer tables as one directory of .npy files, atomically."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name in CompiledTrees.ARRAYS:
+        np.save(tmp / f"{name}.npy", getattr(trees, name))
+    for name, array in explainer.arrays().items():
+        np.save(tmp / f"shap_{name}.npy", array)
+    manifest = {
+        "trees": int(trees.roots.shape[0]),
+        "nodes": int(trees.feature.shape[0]),
+        "depth": trees.depth,
+        "base_margin": trees.base_margin,
+        "n_features": trees.n_features,
+        "expected_value": explainer.expected_value,
+    }
+    (tmp / COMPILED_MANIFEST).write_text(json.dumps(manifest, indent=2))
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another worker published the same model first; its copy is identical.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_compiled(path: Path) -> Tuple[CompiledTrees, TreeShapExplainer]:
+    """Memory-map a compiled model: nothing is parsed or copied, and workers share the pages."""
+    manifest = json.loads((path / COMPILED_MANIFEST).read_text())
+
+    def array(name: str) -> np.ndarray:
+        return np.asarray(np.load(path / f"{name}.npy", mmap_mode="r"))
+
+    trees = CompiledTrees(
+        **{name: array(name) for name in CompiledTrees.ARRAYS},
+        depth=manifest["depth"],
+        base_margin=manifest["base_margin"],
+        n_features=manifest["n_features"],
+    )
+    explainer = TreeShapExplainer(
+        {name: array(f"shap_{name}") for name in TreeShapExplainer.ARRAYS},
+        expected_value=manifest["expected_value"],
+        n_features=manifest["n_features"],
+    )
+    return trees, explainer
+
+
+def _shapley_tables(leaf_value: np.ndarray, zero_fraction: np.ndarray) -> np.ndarray:
+    """
+    (leaves × 2**slots × slots) Shapley value of each path feature for every satisfied-pattern.
+
+    A leaf contributes v · Π_{i∈S} o_i · Π_{i∉S} z_i to E[f | x_S], where o_i ∈ {0, 1} says whether the row
+    satisfies feature i's splits on the path and z_i is the cover fraction of those branches. For player j:
+    φ_j = v (o_j − z_j) Σ_{S ⊆ P∖{j}} |S|!(k−|S|−1)!/k! · Π_{i∉S, i≠j} z_i, with P the satisfied set.
+    """
+    n_leaves, slots = zero_fraction.shape
+    subsets = np.arange(1 << slots)
+    members = ((subsets[:, None] >> np.arange(slots)) & 1).astype(bool)  # (subsets, slots)
+    sizes = members.sum(axis=1)
+    weights = np.array(
+        [math.factorial(s) * math.factorial(slots - s - 1) / math.factorial(slots) if s < slots else 0.0 for s in sizes]
+    )
+    # Π over i ∉ S ∪ {j} of z_i, for every (leaf, S, j); zero where j ∈ S.
+    excluded = ~members[:, None, :] & ~np.eye(slots, dtype=bool)[None, :, :]  # (subsets, j, i)
+    products = np.where(excluded[None], zero_fraction[:, None, None, :], 1.0).prod(axis=3)
+    terms = products * (weights[:, None] * ~members)[None]  # (leaves, subsets, j)
+    contained = (subsets[None, :] & ~subsets[:, None]) == 0  # (patterns, subsets): S ⊆ pattern
+    sums = np.einsum("lsj,ps->lpj", terms, contained.astype(np.float64))
+    satisfied = members.astype(np.float64)  # pattern bits, indexed like subsets
+    return leaf_value[:, None, None] * (satisfied[None] - zero_fraction[:, None, :]) * sums
+
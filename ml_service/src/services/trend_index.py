@@ -0,0 +1,470 @@
+"""
+Sales Trend Index
+Daily units sold per SKU, per category and in total, kept in a form where trend queries don't scan history.
+
+    window totals / averages / growth   O(1): two reads of the prefix sums
+    peak / trough day                   O(1) sparse-table lookup over whole BLOCK_DAYS blocks, plus a scan of
+                                        at most 2 × BLOCK_DAYS days for the partial blocks at either end
+
+Everything is stored day-major, so one new day appends one row to every file. The daily ETL run
+(`python -m src.services.trend_index update`) appends the new days' actuals instead of rebuilding.
+New SKUs or categories start a new generation that is padded with zero history.
+
+Layout:
+    meta.json                  generation, start_date, committed day count; rewritten atomically last
+    g<N>/nodes.json            column labels ("total", "category:<name>", product ids) and SKU → category
+    g<N>/daily.f32             (days, nodes) float32 units sold
+    g<N>/cumsum.f64            (days + 1, nodes) float64 prefix sums, row 0 is zero
+    g<N>/peak_<j>.i32          (blocks − 2^j + 1, nodes) day index of the max over blocks [i, i + 2^j)
+    g<N>/trough_<j>.i32        same for the min
+
+Files may hold rows past the committed day count after an interrupted append. Readers map only the
+committed rows, and the next append truncates the extra rows away.
+
+Usage:
+    python -m src.services.trend_index update [--actuals PATH] [--output-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from src.services.forecast_reconciliation import TOTAL_NODE, category_node
+from src.services.sales_history import (
+    DAILY_ACTUALS_PATH,
+    HISTORY_DAYS,
+    history_end,
+    load_daily_actuals,
+    product_catalog,
+    product_history,
+    sales_history_store,
+    yesterday,
+)
+from src.utils.store_files import commit_json, read_json, truncate_file
+
+logger = structlog.get_logger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+TREND_INDEX_DIR = Path(os.getenv("TREND_INDEX_DIR", str(BASE_DIR / "artifacts" / "trends")))
+BLOCK_DAYS = 32
+META_FILE = "meta.json"
+EXTREMES = {"peak": (np.argmax, np.greater), "trough": (np.argmin, np.less)}
+
+
+@dataclass
+class TrendWindow:
+    start: date
+    end: date  # inclusive
+    days: int
+    total: float
+    peak_day: Optional[date]
+    peak: Optional[float]
+    trough_day: Optional[date]
+    trough: Optional[float]
+
+    @property
+    def average(self) -> float:
+        return self.total / self.days if self.days else 0.0
+
+
+class TrendSnapshot:
+    """Read-only view of the index (memory-mapped from disk, or built in memory by `from_daily`)."""
+
+    def __init__(
+        self,
+        start_date: date,
+        labels: Sequence[str],
+        daily: np.ndarray,
+        cumsum: np.ndarray,
+        tables: Dict[str, List[np.ndarray]],
+        version: Optional[str] = None,
+    ):
+        self.start_date = start_date
+        self.labels = list(labels)
+        self.version = version
+        self._columns = {label: idx for idx, label in enumerate(self.labels)}
+        self._daily = daily
+        self._cumsum = cumsum
+        self._tables = tables
+
+    @classmethod
+    def from_daily(cls, start_date: date, labels: Sequence[str], daily: np.ndarray) -> "TrendSnapshot":
+        daily = np.asarray(daily, dtype=np.float32)
+        cumsum = np.zeros((daily.shape[0] + 1, daily.shape[1]))
+        np.cumsum(daily, axis=0, out=cumsum[1:])
+        tables = {kind: _extend_tables(daily, [], kind) for kind in EXTREMES}
+        return cls(start_date, labels, daily, cumsum, tables)
+
+    @classmethod
+    def load(cls, root: Path) -> Optional["TrendSnapshot"]:
+        meta = read_json(root / META_FILE)
+        if meta is None:
+            return None
+        generation = root / f"g{meta['generation']}"
+        labels = json.loads((generation / "nodes.json").read_text())["labels"]
+        days, nodes = meta["days"], len(labels)
+        daily = _map(generation / "daily.f32", np.float32, days, nodes)
+        cumsum = _map(generation / "cumsum.f64", np.float64, days + 1, nodes)
+        tables = {
+            kind: [
+                _map(generation / f"{kind}_{level}.i32", np.int32, rows, nodes)
+                for level, rows in enumerate(_table_rows(days))
+            ]
+            for kind in EXTREMES
+        }
+        return cls(date.fromisoformat(meta["start_date"]), labels, daily, cumsum, tables, meta["updated_at"])
+
+    @property
+    def days(self) -> int:
+        return self._daily.shape[0]
+
+    @property
+    def end_date(self) -> date:
+        """Last indexed day (inclusive)."""
+        return self.start_date + timedelta(days=self.days - 1)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._columns
+
+    def window(self, label: str, start: date, end: date) -> TrendWindow:
+        """Totals and extremes over [start, end], clipped to the indexed days."""
+        if label not in self._columns:
+            raise KeyError(label)
+        column = self._columns[label]
+        first = max((start - self.start_date).days, 0)
+        stop = min((end - self.start_date).days + 1, self.days)
+        if stop <= first:
+            return TrendWindow(start, end, 0, 0.0, None, None, None, None)
+        total = float(self._cumsum[stop, column] - self._cumsum[first, column])
+        peak = self._extreme(column, first, stop, "peak")
+        trough = self._extreme(column, first, stop, "trough")
+        return TrendWindow(
+            start=self.start_date + timedelta(days=first),
+            end=self.start_date + timedelta(days=stop - 1),
+            days=stop - first,
+            total=total,
+            peak_day=self.start_date + timedelta(days=peak),
+            peak=float(self._daily[peak, column]),
+            trough_day=self.start_date + timedelta(days=trough),
+            trough=float(self._daily[trough, column]),
+        )
+
+    def _extreme(self, column: int, first: int, stop: int, kind: str) -> int:
+        pick, better = EXTREMES[kind]
+        block_first = -(-first // BLOCK_DAYS)
+        block_stop = stop // BLOCK_DAYS
+        if block_stop <= block_first:
+            return first + int(pick(self._daily[first:stop, column]))
+
+        level = (block_stop - block_first).bit_length() - 1
+        table = self._tables[kind][level]
+        candidates = [int(table[block_first, column]), int(table[block_stop - (1 << level), column])]
+        if first < block_first * BLOCK_DAYS:
+            candidates.append(first + int(pick(self._daily[first : block_first * BLOCK_DAYS, column])))
+        if block_stop * BLOCK_DAYS < stop:
+            tail = block_stop * BLOCK_DAYS
+            candidates.append(tail + int(pick(self._daily[tail:stop, column])))
+        best = min(candidates)
+        for day in sorted(candidates):
+            if better(self._daily[day, column], self._daily[best, column]):
+                best = day
+        return best
+
+
+class TrendIndex:
+    """Reader that re-maps the index whenever the ETL run commits new days."""
+
+    def __init__(self, root: Path = TREND_INDEX_DIR, check_interval_sec: float = 1.0):
+        self.root = root
+        self._check_interval = check_interval_sec
+        self._last_check = 0.0
+        self._meta_mtime: Optional[float] = None
+        self._snapshot: Optional[TrendSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[TrendSnapshot]:
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval:
+            return self._snapshot
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = (self.root / META_FILE).stat().st_mtime
+            except OSError:
+                self._snapshot, self._meta_mtime = None, None
+                return None
+            if mtime != self._meta_mtime:
+                try:
+                    self._snapshot = TrendSnapshot.load(self.root)
+                    self._meta_mtime = mtime
+                except (OSError, ValueError, KeyError) as exc:
+                    logger.warning("Trend index unreadable; using in-memory history", error=str(exc))
+                    self._snapshot = None
+            return self._snapshot
+
+
+def trend_labels(product_ids: Sequence[str], categories: Sequence[str]) -> List[str]:
+    return [TOTAL_NODE] + [category_node(category) for category in sorted(set(categories))] + list(product_ids)
+
+
+def node_daily(labels: Sequence[str], product_ids: Sequence[str], categories: Sequence[str], units: np.ndarray) -> np.ndarray:
+    """(days, len(labels)) rows for SKU-level `units` (SKUs × days): SKU columns plus their category and total sums."""
+    columns = {label: idx for idx, label in enumerate(labels)}
+    units = np.nan_to_num(np.asarray(units, dtype=np.float64))
+    daily = np.zeros((units.shape[1], len(labels)), dtype=np.float32)
+    sku_columns = np.array([columns[product_id] for product_id in product_ids], dtype=np.int64)
+    daily[:, sku_columns] = units.T
+    daily[:, columns[TOTAL_NODE]] = units.sum(axis=0)
+    category_columns = np.array([columns[category_node(category)] for category in categories], dtype=np.int64)
+    sums = np.zeros((len(labels), units.shape[1]))
+    np.add.at(sums, category_columns, units)
+    touched = np.unique(category_columns)
+    daily[:, touched] = sums[touched].T
+    return daily
+
+
+def append_trend_days(
+    root: Path,
+    start_date: date,
+    product_ids: Sequence[str],
+    categories: Sequence[str],
+    units: np.ndarray,
+) -> Dict[str, Any]:
+    """
+    Append SKU-level daily `units` (SKUs × days, first column on `start_date`) to the index.
+
+    Days already indexed are skipped, so re-running an ETL day is a no-op. A gap since the last indexed
+    day is filled with zeros. SKUs or categories not yet indexed start a new generation.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    meta = read_json(root / META_FILE)
+    units = np.asarray(units, dtype=np.float64)
+
+    if meta is None:
+        labels = trend_labels(product_ids, categories)
+        daily = node_daily(labels, product_ids, categories, units)
+        meta = _write_generation(root, 1, start_date, labels, dict(zip(product_ids, categories)), daily)
+        return meta
+
+    generation = root / f"g{meta['generation']}"
+    nodes = json.loads((generation / "nodes.json").read_text())
+    index_start = date.fromisoformat(meta["start_date"])
+    next_day = (start_date - index_start).days  # index position of the first supplied day
+    committed = meta["days"]
+    if next_day + units.shape[1] <= committed:
+        return meta
+    skip = max(committed - next_day, 0)
+    units = units[:, skip:]
+    gap = max(next_day - committed, 0)
+    if gap:
+        units = np.hstack([np.zeros((units.shape[0], gap)), units])
+
+    sku_category = nodes["sku_category"]
+    new_pairs = {
+        product_id: category for product_id, category in zip(product_ids, categories) if product_id not in sku_category
+    }
+    if new_pairs:
+        sku_category = {**sku_category, **new_pairs}
+        labels = nodes["labels"] + [
+            label
+            for label in trend_labels(list(new_pairs), list(new_pairs.values()))
+            if label not in set(nodes["labels"])
+        ]
+        old = np.zeros((committed, len(labels)), dtype=np.float32)
+        old[:, : len(nodes["labels"])] = _map(generation / "daily.f32", np.float32, committed, len(nodes["labels"]))
+        daily = np.vstack([old, node_daily(labels, product_ids, [sku_category[p] for p in product_ids], units)])
+        meta = _write_generation(root, meta["generation"] + 1, index_start, labels, sku_category, daily)
+        logger.info("Trend index widened", generation=meta["generation"], new_products=len(new_pairs))
+        return meta
+
+    labels = nodes["labels"]
+    daily = node_daily(labels, product_ids, [sku_category[p] for p in product_ids], units)
+    _append_rows(generation, committed, daily)
+    return _commit_meta(root, meta["generation"], index_start, committed + daily.shape[0], len(labels))
+
+
+def update_trend_index(root: Path = TREND_INDEX_DIR, actuals_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Append the days of actuals since the index's last day (the daily ETL step).
+
+    A missing index is seeded from the sales history store: stored readings only, with zeros for SKUs it
+    hasn't seen. Without a store, the index starts on the first day of actuals in the last HISTORY_DAYS.
+    """
+    product_ids, categories = catalog_nodes()
+    snapshot = TrendSnapshot.load(root)
+    seed = _stored_seed(product_ids) if snapshot is None else None
+    if seed is not None:
+        append_trend_days(root, seed[0], product_ids, categories, seed[1])
+        snapshot = TrendSnapshot.load(root)
+
+    if snapshot is not None:
+        next_day = snapshot.end_date + timedelta(days=1)
+    else:
+        next_day = yesterday() - timedelta(days=HISTORY_DAYS - 1)
+    actuals = load_daily_actuals(actuals_path or DAILY_ACTUALS_PATH, product_ids, next_day)
+    if snapshot is None:
+        reported = np.flatnonzero(~np.isnan(actuals).all(axis=0))
+        if not reported.size:
+            logger.warning("No sales history or actuals to start the trend index from")
+            return {"days": 0, "nodes": 0, "new_days": 0}
+        next_day, actuals = next_day + timedelta(days=int(reported[0])), actuals[:, reported[0] :]
+    meta = append_trend_days(root, next_day, product_ids, categories, actuals)
+    logger.info("Trend index updated", days=meta["days"], new_days=actuals.shape[1], nodes=meta["nodes"])
+    return {**meta, "new_days": actuals.shape[1]}
+
+
+def history_trends() -> TrendSnapshot:
+    """
+    In-memory index over the last HISTORY_DAYS of every catalog SKU, for when none has been published.
+
+    It reads the stored sales history; only before the first append does it fall back to the demo histories.
+    """
+    product_ids, categories = catalog_nodes()
+    seed = _stored_seed(product_ids)
+    start, history = seed or (history_end() - timedelta(days=HISTORY_DAYS - 1), product_history(product_ids))
+    labels = trend_labels(product_ids, categories)
+    return TrendSnapshot.from_daily(start, labels, node_daily(labels, product_ids, categories, history))
+
+
+def catalog_nodes() -> Tuple[List[str], List[str]]:
+    """Catalog product ids and, aligned with them, each one's (first listed) category."""
+    first_category: Dict[str, str] = {}
+    for product_id, category in product_catalog():
+        first_category.setdefault(product_id, category)
+    return list(first_category), list(first_category.values())
+
+
+def _stored_seed(product_ids: Sequence[str]) -> Optional[Tuple[date, np.ndarray]]:
+    """
+    Up to the last HISTORY_DAYS of stored sales (NaN where a SKU has no reading), with the date of the
+    first day; None when there is no sales history store yet.
+    """
+    history = sales_history_store.current()
+    if history is None:
+        return None
+    days = min(history.days, HISTORY_DAYS)
+    return history.end_date - timedelta(days=days - 1), history.read(product_ids, days)
+
+
+def _write_generation(
+    root: Path,
+    generation: int,
+    start_date: date,
+    labels: List[str],
+    sku_category: Dict[str, str],
+    daily: np.ndarray,
+) -> Dict[str, Any]:
+    directory = root / f"g{generation}"
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+    (directory / "nodes.json").write_text(json.dumps({"labels": labels, "sku_category": sku_category}))
+    (directory / "cumsum.f64").write_bytes(np.zeros(len(labels)).tobytes())
+    _append_rows(directory, 0, daily)
+    meta = _commit_meta(root, generation, start_date, daily.shape[0], len(labels))
+    for stale in root.glob("g*"):
+        if stale.is_dir() and stale != directory:
+            shutil.rmtree(stale, ignore_errors=True)
+    return meta
+
+
+def _append_rows(directory: Path, committed: int, rows: np.ndarray) -> None:
+    """Append `rows` (new days × nodes) after the first `committed` days of every file in `directory`."""
+    nodes = rows.shape[1]
+    days = committed + rows.shape[0]
+    truncate_file(directory / "daily.f32", committed * nodes * 4)
+    truncate_file(directory / "cumsum.f64", (committed + 1) * nodes * 8)
+
+    with open(directory / "daily.f32", "ab") as handle:
+        handle.write(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+    last = np.array(_map(directory / "cumsum.f64", np.float64, committed + 1, nodes)[committed])
+    sums = last[None, :] + np.cumsum(rows, axis=0, dtype=np.float64)
+    with open(directory / "cumsum.f64", "ab") as handle:
+        handle.write(sums.tobytes())
+
+    daily = _map(directory / "daily.f32", np.float32, days, nodes)
+    for kind in EXTREMES:
+        existing = []
+        for level, rows_held in enumerate(_table_rows(committed)):
+            path = directory / f"{kind}_{level}.i32"
+            truncate_file(path, rows_held * nodes * 4)
+            existing.append(_map(path, np.int32, rows_held, nodes))
+        for level, added in enumerate(_extend_tables(daily, existing, kind)):
+            if added.shape[0]:
+                with open(directory / f"{kind}_{level}.i32", "ab") as handle:
+                    handle.write(np.ascontiguousarray(added, dtype=np.int32).tobytes())
+
+
+def _extend_tables(daily: np.ndarray, tables: List[np.ndarray], kind: str) -> List[np.ndarray]:
+    """New sparse-table rows per level for blocks completed since `tables` was built."""
+    pick, better = EXTREMES[kind]
+    nodes = daily.shape[1]
+    columns = np.arange(nodes)[None, :]
+    full: List[np.ndarray] = []
+    added: List[np.ndarray] = []
+    for level, wanted in enumerate(_table_rows(daily.shape[0])):
+        held = tables[level].shape[0] if level < len(tables) else 0
+        old = tables[level] if level < len(tables) else np.empty((0, nodes), dtype=np.int32)
+        if level == 0:
+            block = np.asarray(daily[held * BLOCK_DAYS : wanted * BLOCK_DAYS]).reshape(-1, BLOCK_DAYS, nodes)
+            new = (np.arange(held, wanted) * BLOCK_DAYS)[:, None] + pick(block, axis=1)
+        else:
+            half = 1 << (level - 1)
+            previous = full[level - 1]
+            left, right = previous[held:wanted], previous[held + half : wanted + half]
+            new = np.where(better(daily[right, columns], daily[left, columns]), right, left)
+        new = new.astype(np.int32).reshape(-1, nodes)
+        added.append(new)
+        full.append(np.concatenate([np.asarray(old), new]) if held else new)
+    return added
+
+
+def _table_rows(days: int) -> List[int]:
+    """Rows held at each sparse-table level for `days` indexed days (levels with 2^j ≤ blocks)."""
+    blocks = days // BLOCK_DAYS
+    return [blocks - (1 << level) + 1 for level in range(blocks.bit_length())]
+
+
+def _commit_meta(root: Path, generation: int, start_date: date, days: int, nodes: int) -> Dict[str, Any]:
+    meta = {
+        "generation": generation,
+        "start_date": start_date.isoformat(),
+        "days": days,
+        "nodes": nodes,
+        "block_days": BLOCK_DAYS,
+    }
+    return commit_json(root / META_FILE, meta)
+
+
+def _map(path: Path, dtype: Any, rows: int, nodes: int) -> np.ndarray:
+    if rows == 0 or nodes == 0:
+        return np.empty((rows, nodes), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows, nodes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sales trend index maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    update = subcommands.add_parser("update", help="Append new days of actuals (seeds the index when missing)")
+    update.add_argument("--output-dir", default=str(TREND_INDEX_DIR))
+    update.add_argument("--actuals", default=None, help="Parquet with product_id, date, units")
+    args = parser.parse_args()
+
+    meta = update_trend_index(Path(args.output_dir), Path(args.actuals) if args.actuals else None)
+    print(json.dumps(meta))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Service startup: artifact loading and warm-up
+Loads every service's model artifacts and feature views concurrently, then replays synthetic requests through
+the app in-process until each endpoint has served hot. `/health` reports ready only once both phases finish,
+so the first real request after a deploy sees the same caches, imports and connections as steady state.
+
+Warm-up requests are kept out of the feature metrics, and the rows their placeholder users and product leave in
+the shared caches are evicted when warm-up ends.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+
+from src.api import churn, forecasting, pricing, recommendations
+from src.services.feature_cache import online_feature_cache
+from src.utils.metrics import warmup_traffic
+
+logger = structlog.get_logger(__name__)
+
+# Passes over the warm-up requests; the first pays the cold paths, later ones run against filled caches.
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "3"))
+# Upper bound on loading plus warm-up; components still pending are then reported as timed out.
+WARMUP_TIMEOUT_SEC = float(os.getenv("WARMUP_TIMEOUT_SEC", "60"))
+WARMUP_USER_IDS = [f"warmup-user-{idx}" for idx in range(8)]
+WARMUP_PRODUCT_ID = "warmup-product"
+
+# (component, method, path, request kwargs) replayed through the full middleware and routing stack.
+WARMUP_REQUESTS: List[Tuple[str, str, str, Dict[str, Any]]] = [
+    ("churn", "POST", "/api/v1/churn/predict", {"json": {"user_id": WARMUP_USER_IDS[0]}}),
+    ("churn", "POST", "/api/v1/churn/batch", {"json": WARMUP_USER_IDS}),
+    ("churn", "GET", "/api/v1/churn/at-risk", {"params": {"limit": 10}}),
+    ("recommendations", "GET", "/api/v1/recommendations/", {"params": {"user_id": WARMUP_USER_IDS[0]}}),
+    ("recommendations", "POST", "/api/v1/recommendations/batch", {"json": WARMUP_USER_IDS}),
+    (
+        "pricing",
+        "POST",
+        "/api/v1/pricing/recommendation",
+        {"json": {"product_id": WARMUP_PRODUCT_ID, "current_price": 100.0, "cost_price": 60.0}},
+    ),
+    (
+        "pricing",
+        "POST",
+        "/api/v1/pricing/simulate-discount",
+        {"json": {"product_id": WARMUP_PRODUCT_ID, "base_price": 100.0, "cost_price": 60.0, "discount_pct": 0.1}},
+    ),
+    ("forecasting", "POST", "/api/v1/forecast/demand", {"json": {"horizon": 30}}),
+    ("forecasting", "POST", f"/api/v1/forecast/product/{WARMUP_PRODUCT_ID}", {"json": {"horizon": 30}}),
+    ("forecasting", "POST", "/api/v1/forecast/products/batch", {"json": {"product_ids": [WARMUP_PRODUCT_ID]}}),
+    ("forecasting", "GET", "/api/v1/forecast/trends", {}),
+    ("generative", "POST", "/api/v1/generative/marketing/content", {"json": {"topic": "Spring launch"}}),
+    ("governance", "GET", "/api/v1/governance/model-cards", {}),
+]
+
+ARTIFACT_LOADERS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "churn": churn.churn_service.load_artifacts,
+    "recommendations": recommendations.rec_service.load_artifacts,
+    "pricing": pricing.pricing_service.load_artifacts,
+    "forecasting": forecasting.forecast_service.load_artifacts,
+}
+
+
+@dataclass
+class ComponentStatus:
+    status: str = "pending"  # pending | loaded | ready | failed | timeout
+    load_ms: Optional[float] = None
+    cold_ms: Optional[float] = None  # slowest warm-up request in the first round
+    warm_ms: Optional[float] = None  # slowest warm-up request in the last round
+    error: Optional[str] = None
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+
+class Readiness:
+    """Startup progress reported by `/health`: starting until warm-up ends, then ready or degraded."""
+
+    def __init__(self):
+        self.status = "starting"
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        components = set(ARTIFACT_LOADERS) | {component for component, _, _, _ in WARMUP_REQUESTS}
+        self.components: Dict[str, ComponentStatus] = {name: ComponentStatus() for name in sorted(components)}
+
+    @property
+    def ready(self) -> bool:
+        return self.status != "starting"
+
+    def fail(self, component: str, error: str) -> None:
+        state = self.components[component]
+        if state.status != "failed":
+            state.status, state.error = "failed", error
+
+    def finish(self) -> None:
+        for state in self.components.values():
+            if state.status in ("pending", "loaded"):
+                state.status = "timeout"
+        healthy = all(state.status == "ready" for state in self.components.values())
+        self.status = "ready" if healthy else "degraded"
+        self.ready_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "startup_sec": round((self.ready_at or time.time()) - self.started_at, 3),
+            "components": {
+                name: {key: value for key, value in vars(state).items() if value is not None and value != {}}
+                for name, state in self.components.items()
+            },
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_up(app: Any, state: Readiness = readiness) -> None:
+    """Load artifacts, replay WARMUP_ROUNDS of synthetic requests, then mark the service ready."""
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(_run(app, state), WARMUP_TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up timed out; serving with components still cold", timeout_sec=WARMUP_TIMEOUT_SEC)
+    evicted = online_feature_cache.evict_entities([*WARMUP_USER_IDS, WARMUP_PRODUCT_ID])
+    churn.churn_service.forget_users(WARMUP_USER_IDS)
+    state.finish()
+    logger.info(
+        "Warm-up finished",
+        status=state.status,
+        elapsed_sec=round(time.perf_counter() - start, 3),
+        feature_cache_evicted=evicted,
+        components={name: component.status for name, component in state.components.items()},
+    )
+
+
+async def _run(app: Any, state: Readiness) -> None:
+    await asyncio.gather(*(_load(name, loader, state) for name, loader in ARTIFACT_LOADERS.items()))
+    for component in state.components.values():
+        if component.status == "pending":
+            component.status = "loaded"
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for round_idx in range(WARMUP_ROUNDS):
+            timings = await asyncio.gather(*(_replay(client, request, state) for request in WARMUP_REQUESTS))
+            slowest: Dict[str, float] = {}
+            for component, elapsed_ms in timings:
+                slowest[component] = max(slowest.get(component, 0.0), elapsed_ms)
+            for component, elapsed_ms in slowest.items():
+                if round_idx == 0:
+                    state.components[component].cold_ms = round(elapsed_ms, 2)
+                state.components[component].warm_ms = round(elapsed_ms, 2)
+
+    for component in state.components.values():
+        if component.status == "loaded":
+            component.status = "ready"
+
+
+async def _load(name: str, loader: Callable[[], Dict[str, Any]], state: Readiness) -> None:
+    start = time.perf_counter()
+    try:
+        state.components[name].detail = await asyncio.get_running_loop().run_in_executor(None, loader)
+    except Exception as exc:
+        logger.error("Failed to load artifacts", component=name, error=str(exc))
+        state.fail(name, f"load: {exc}")
+    state.components[name].load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+
+async def _replay(
+    client: httpx.AsyncClient, request: Tuple[str, str, str, Dict[str, Any]], state: Readiness
+) -> Tuple[str, float]:
+    component, method, path, kwargs = request
+    start = time.perf_counter()
+    try:
+        with warmup_traffic():
+            response = await client.request(method, path, **kwargs)
+        if not response.is_success:
+            state.fail(component, f"{method} {path}: HTTP {response.status_code}")
+    except Exception as exc:
+        logger.error("Warm-up request failed", component=component, path=path, error=str(exc))
+        state.fail(component, f"{method} {path}: {exc}")
+    return component, (time.perf_counter() - start) * 1000
@@ -0,0 +1,148 @@
+"""
+Prometheus metrics for ML Service
+Feature retrieval latency, payload size, error/fallback rates and cache outcomes per feature view.
+
+Startup warm-up requests run inside `warmup_traffic()` and record none of these. The marker is a context
+variable, so a service that hops to a worker thread must carry the context along (`asyncio.to_thread`).
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import structlog
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+logger = structlog.get_logger(__name__)
+
+FEATURE_RETRIEVAL_SECONDS = Histogram(
+    "ml_feature_retrieval_seconds",
+    "Online feature retrieval latency",
+    ["service", "feature_view"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+FEATURE_RETRIEVAL_ENTITIES = Histogram(
+    "ml_feature_retrieval_entities",
+    "Entities requested per online feature retrieval",
+    ["service", "feature_view"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+FEATURE_RETRIEVAL_ERRORS = Counter(
+    "ml_feature_retrieval_errors_total",
+    "Online feature retrievals that raised",
+    ["service", "feature_view"],
+)
+FEATURE_FALLBACKS = Counter(
+    "ml_feature_fallbacks_total",
+    "Feature values replaced by service defaults",
+    ["service", "feature_view", "reason"],
+)
+FEATURE_CACHE_LOOKUPS = Counter(
+    "ml_feature_cache_lookups_total",
+    "Online feature cache lookups by outcome",
+    ["feature_view", "outcome"],
+)
+
+
+@dataclass
+class FeatureRetrieval:
+    """Per-call record attached to the structured log line emitted when a retrieval finishes."""
+
+    service: str
+    feature_view: str
+    entities: int
+    status: str = "ok"
+    cache_hits: int = 0
+    cache_misses: int = 0
+    fallbacks: int = 0
+
+
+_active_retrieval: ContextVar[Optional[FeatureRetrieval]] = ContextVar("active_feature_retrieval", default=None)
+_warmup: ContextVar[bool] = ContextVar("warmup_traffic", default=False)
+
+
+@contextmanager
+def warmup_traffic() -> Iterator[None]:
+    """Mark the work done inside as startup warm-up, which is kept out of the feature metrics."""
+    token = _warmup.set(True)
+    try:
+        yield
+    finally:
+        _warmup.reset(token)
+
+
+def is_warmup() -> bool:
+    return _warmup.get()
+
+
+@contextmanager
+def track_feature_retrieval(service: str, feature_view: str, entities: int) -> Iterator[FeatureRetrieval]:
+    """Time one online feature access and record latency, entity count and errors."""
+    record = FeatureRetrieval(service=service, feature_view=feature_view, entities=entities)
+    token = _active_retrieval.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record.status = "error"
+        if not _warmup.get():
+            FEATURE_RETRIEVAL_ERRORS.labels(service, feature_view).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _active_retrieval.reset(token)
+        if not _warmup.get():
+            FEATURE_RETRIEVAL_SECONDS.labels(service, feature_view).observe(elapsed)
+            FEATURE_RETRIEVAL_ENTITIES.labels(service, feature_view).observe(entities)
+            logger.info(
+                "Feature retrieval",
+                service=service,
+                feature_view=feature_view,
+                entities=entities,
+                duration_ms=round(elapsed * 1000, 3),
+                status=record.status,
+                cache_hits=record.cache_hits,
+                cache_misses=record.cache_misses,
+                fallbacks=record.fallbacks,
+            )
+
+
+def record_cache_outcome(feature_view: str, outcome: str, count: int = 1) -> None:
+    """Count cache hits/misses/expiries/evictions; hits and misses also land on the active retrieval."""
+    if not count or _warmup.get():
+        return
+    FEATURE_CACHE_LOOKUPS.labels(feature_view, outcome).inc(count)
+    record = _active_retrieval.get()
+    if record is not None and record.feature_view == feature_view:
+        if outcome == "hit":
+            record.cache_hits += count
+        elif outcome == "miss":
+            record.cache_misses += count
+
+
+def record_feature_fallback(service: str, feature_view: str, reason: str, count: int = 1) -> None:
+    """Count feature values (or whole retrievals) served from defaults instead of the store."""
+    if _warmup.get():
+        return
+    FEATURE_FALLBACKS.labels(service, feature_view, reason).inc(count)
+    record = _active_retrieval.get()
+    if record is not None and record.feature_view == feature_view:
+        record.fallbacks += count
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
+
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "FeatureRetrieval",
+    "track_feature_retrieval",
+    "warmup_traffic",
+    "is_warmup",
+    "record_cache_outcome",
+    "record_feature_fallback",
+    "render_metrics",
+]
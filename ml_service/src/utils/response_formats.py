@@ -0,0 +1,166 @@
+"""
+Forecast response formats
+Content negotiation between the row-per-day JSON layout, a columnar JSON layout and Arrow IPC.
+The batch endpoint negotiates the NDJSON equivalents of the two JSON layouts, or Arrow IPC.
+
+    application/json                                  [{"date", "value", "lower_bound", "upper_bound"}, ...]
+    application/vnd.easy11.forecast.columnar+json     {"start_date", "freq", "value": [...], "lower_bound": [...], ...}
+
+Quantile-mode product forecasts add one `p10`/`p50`/... field per requested quantile in every layout.
+    application/vnd.apache.arrow.stream               Arrow IPC stream; non-series fields go in schema metadata
+"""
+
+import io
+import json
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from fastapi.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPE = "application/vnd.easy11.forecast.columnar+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+COLUMNAR_NDJSON_MEDIA_TYPE = "application/vnd.easy11.forecast.columnar+x-ndjson"
+
+SUPPORTED_MEDIA_TYPES = (JSON_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE, ARROW_MEDIA_TYPE)
+BATCH_MEDIA_TYPES = (NDJSON_MEDIA_TYPE, COLUMNAR_NDJSON_MEDIA_TYPE, ARROW_MEDIA_TYPE)
+METADATA_KEY = b"easy11.metadata"
+ARROW_BATCH_ROWS = 256
+
+
+def negotiate(accept: Optional[str], supported=SUPPORTED_MEDIA_TYPES) -> str:
+    """Pick the highest-q supported media type from an Accept header; `supported[0]` when nothing matches."""
+    best, best_q = supported[0], 0.0
+    for item in (accept or "").split(","):
+        media_type, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.strip().lower()
+        if media_type in ("*/*", "application/*"):
+            media_type = supported[0]
+        if media_type in supported and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def layout_for(media_type: str) -> str:
+    """Service-side layout for a negotiated media type (Arrow is built from the columnar layout)."""
+    return "records" if media_type in (JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE) else "columnar"
+
+
+def columnar_json(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, default=_encode_array, separators=(",", ":")).encode("utf-8")
+
+
+def forecast_response(payload: Dict[str, Any], media_type: str, series_key: str = "forecast") -> Any:
+    """Render a single-series forecast payload in the negotiated format."""
+    if media_type == JSON_MEDIA_TYPE:
+        return payload
+    if media_type == COLUMNAR_MEDIA_TYPE:
+        return Response(columnar_json(payload), media_type=COLUMNAR_MEDIA_TYPE)
+    series = payload[series_key]
+    metadata = {key: value for key, value in payload.items() if key != series_key}
+    table = pa.Table.from_batches([_series_batch(series)]).replace_schema_metadata(
+        {METADATA_KEY: json.dumps(metadata, default=_encode_array)}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
+
+
+async def arrow_product_stream(payloads: AsyncIterator[Dict[str, Any]], horizon: int) -> AsyncIterator[bytes]:
+    """
+    Arrow IPC stream for the batch endpoint: one row per product, forecasts as fixed-size lists.
+
+    Rows are flushed every ARROW_BATCH_ROWS products so the client can start decoding early.
+    """
+    schema = pa.schema(
+        [
+            ("product_id", pa.string()),
+            ("start_date", pa.date32()),
+            ("value", pa.list_(pa.float64(), horizon)),
+            ("lower_bound", pa.list_(pa.float64(), horizon)),
+            ("upper_bound", pa.list_(pa.float64(), horizon)),
+            ("recommended_restock_units", pa.int64()),
+            ("demand_next_7d", pa.int64()),
+            ("data_version", pa.string()),
+        ]
+    )
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    pending: List[Dict[str, Any]] = []
+
+    def drain() -> bytes:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    yield drain()  # schema message
+    async for payload in payloads:
+        pending.append(payload)
+        if len(pending) >= ARROW_BATCH_ROWS:
+            writer.write_batch(_product_batch(pending, schema, horizon))
+            pending = []
+            yield drain()
+    if pending:
+        writer.write_batch(_product_batch(pending, schema, horizon))
+    writer.close()
+    yield drain()
+
+
+def _series_batch(series: Dict[str, Any]) -> pa.RecordBatch:
+    """One row per day: the date plus every per-day column (value, bounds and any quantile paths)."""
+    start = date.fromisoformat(series["start_date"])
+    columns = {
+        key: np.asarray(value, dtype=np.float64) for key, value in series.items() if key not in ("start_date", "freq")
+    }
+    offsets = np.arange(columns["value"].shape[0], dtype=np.int32) + (start - date(1970, 1, 1)).days
+    return pa.RecordBatch.from_arrays(
+        [pa.array(offsets, type=pa.int32()).cast(pa.date32()), *(pa.array(column) for column in columns.values())],
+        names=["date", *columns],
+    )
+
+
+def _product_batch(payloads: List[Dict[str, Any]], schema: pa.Schema, horizon: int) -> pa.RecordBatch:
+    def fixed(key: str) -> pa.Array:
+        flat = np.concatenate([np.asarray(payload["forecast"][key], dtype=np.float64) for payload in payloads])
+        return pa.FixedSizeListArray.from_arrays(pa.array(flat), horizon)
+
+    epoch = date(1970, 1, 1)
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([payload["product_id"] for payload in payloads]),
+            pa.array(
+                [(date.fromisoformat(payload["forecast"]["start_date"]) - epoch).days for payload in payloads],
+                type=pa.int32(),
+            ).cast(pa.date32()),
+            fixed("value"),
+            fixed("lower_bound"),
+            fixed("upper_bound"),
+            pa.array([payload["recommendation"]["recommended_restock_units"] for payload in payloads], pa.int64()),
+            pa.array([payload["recommendation"]["demand_next_7d"] for payload in payloads], pa.int64()),
+            pa.array([payload.get("data_version") for payload in payloads], pa.string()),
+        ],
+        schema=schema,
+    )
+
+
+def _encode_array(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, timedelta)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,36 @@
+"""
+Store file helpers
+Atomic JSON manifest commits and file truncation shared by the append-only artifact stores
+(RFM state, sales trend index, sales history).
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def commit_json(path: Path, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Stamp `updated_at` and atomically replace `path`; readers see the old or the new file, never a partial one."""
+    payload = {**payload, "updated_at": datetime.utcnow().isoformat()}
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(payload, indent=2))
+    os.replace(tmp_path, path)
+    return payload
+
+
+def read_json(path: Path) -> Optional[Dict[str, Any]]:
+    """The committed JSON at `path`, or None when nothing has been committed yet."""
+    try:
+        return json.loads(path.read_text())
+    except OSError:
+        return None
+
+
+def truncate_file(path: Path, size: int) -> None:
+    """Cut `path` back to `size` bytes (creating it if missing), dropping bytes written past the last commit."""
+    if not path.exists():
+        path.touch()
+    if path.stat().st_size > size:
+        os.truncate(path, size)
@@ -3,6 +3,7 @@ Prefect ETL Flow for Easy11
 Daily data pipeline: Extract → Transform → Load
 """
 
+import json
 import os
 import subprocess
 from datetime import datetime, timedelta
@@ -11,6 +12,8 @@ from pathlib import Path
 from prefect import flow, task
 from prefect.tasks import task_input_hash
 
+from ml_service_cli import run_ml_service_command
+
 
 @task(
     retries=3,
@@ -28,6 +31,13 @@ def extract_oltp_data():
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 FEATURE_STORE_DIR = BASE_DIR / "ml_service" / "feature_store"
+# "embedded" writes memory-mapped .kv files and "snapshot" exports memory-mappable Arrow IPC snapshots
+# instead of materializing into the Postgres online store.
+FEATURE_ONLINE_STORE = os.getenv("FEATURE_ONLINE_STORE", "feast").lower()
+# Watched by the ML service's online feature cache; a new mtime clears cached feature rows.
+MATERIALIZATION_MARKER = Path(
+    os.getenv("FEATURE_CACHE_INVALIDATION_MARKER", str(FEATURE_STORE_DIR / "data" / "materialization.json"))
+)
 
 
 @task
@@ -99,6 +109,15 @@ def apply_feature_store_definitions():
 def materialize_feature_store():
     """Materialize latest features into the online store using Feast."""
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    if FEATURE_ONLINE_STORE == "embedded":
+        materialize_embedded_online_store()
+        publish_materialization_marker(timestamp)
+        return
+    if FEATURE_ONLINE_STORE == "snapshot":
+        export_feature_snapshots()
+        publish_materialization_marker(timestamp)
+        return
+
     print(f"⚙️ Materializing Feast feature store up to {timestamp}...")
     result = subprocess.run(
         ["feast", "materialize-incremental", timestamp],
@@ -112,6 +131,48 @@ def materialize_feature_store():
         print(result.stderr)
         raise ValueError("Feast materialize failed. Ensure warehouse connectivity and data freshness.")
     print("✅ Feast materialization complete.")
+    publish_materialization_marker(timestamp)
+
+
+def materialize_embedded_online_store():
+    """Write per-view memory-mapped files for the ML service's embedded online store."""
+    print("⚙️ Materializing embedded online store from offline parquet sources...")
+    summary = run_ml_service_command("src.services.embedded_online_store", "materialize")
+    print(f"✅ Embedded online store refreshed: {json.dumps(summary)}")
+
+
+def export_feature_snapshots():
+    """Export offline parquet sources to Arrow IPC snapshots the ML service memory-maps."""
+    print("📦 Exporting Arrow feature snapshots...")
+    summary = run_ml_service_command("src.services.feature_snapshots", "export")
+    print(f"✅ Feature snapshots exported: {json.dumps(summary)}")
+
+
+@task
+def update_rfm_features():
+    """Fold the day's orders into the user RFM features (`user_behavior_metrics` source); seeds from the full export."""
+    # Explicit day, so a retry or re-run of this task is a no-op instead of folding the delta in twice.
+    as_of = (datetime.utcnow().date() - timedelta(days=1)).isoformat()
+    print(f"🧮 Updating RFM user features through {as_of}...")
+    summary = run_ml_service_command("src.services.rfm_features", "update", "--as-of", as_of)
+    print(f"✅ RFM features: {json.dumps(summary)}")
+
+
+@task
+def update_trend_index():
+    """Append the new days of SKU sales to the ML service's trend index (no history rebuild)."""
+    print("📈 Updating sales trend index...")
+    summary = run_ml_service_command("src.services.trend_index", "update")
+    print(f"✅ Trend index updated: {json.dumps(summary)}")
+
+
+def publish_materialization_marker(timestamp: str):
+    """Atomically rewrite the marker so online feature caches drop rows older than this run."""
+    MATERIALIZATION_MARKER.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MATERIALIZATION_MARKER.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"materialized_at": timestamp}))
+    os.replace(tmp_path, MATERIALIZATION_MARKER)
+    print(f"🧹 Published materialization marker at {MATERIALIZATION_MARKER}")
 
 
 @flow(name="easy11_daily_etl", log_prints=True)
@@ -124,8 +185,10 @@ def daily_etl_flow():
     2. Validate data quality
     3. Transform with dbt
     4. Load to warehouse
-    5. Apply Feast definitions & materialize features
-    6. Generate documentation
+    5. Fold the day's orders into the RFM user features
+    6. Apply Feast definitions & materialize features
+    7. Append the day's sales to the trend index
+    8. Generate documentation
     """
     print("🚀 Starting Easy11 Daily ETL Pipeline...")
     
@@ -145,10 +208,16 @@ def daily_etl_flow():
     load_result = load_to_warehouse()
     print(f"Loaded to warehouse: {load_result['status']}")
     
+    # RFM features feed the user_behavior_metrics source, so they are updated before materialization
+    update_rfm_features()
+
     # Register Feast definitions & materialize online store
     apply_feature_store_definitions()
     materialize_feature_store()
 
+    # Trend dashboards read windowed totals from the index instead of scanning history
+    update_trend_index()
+
     # Generate docs
     generate_documentation()
     
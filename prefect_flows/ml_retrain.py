@@ -5,17 +5,19 @@ Nightly model retraining pipeline
 
 import os
 from datetime import timedelta
-from pathlib import Path
 
 import mlflow
 from prefect import flow, task
 from feast import FeatureStore
 
+from ml_service_cli import ML_SERVICE_DIR, run_ml_service_command
 
-BASE_DIR = Path(__file__).resolve().parents[1]
-FEATURE_STORE_DIR = BASE_DIR / "ml_service" / "feature_store"
+
+FEATURE_STORE_DIR = ML_SERVICE_DIR / "feature_store"
 DEFAULT_MLFLOW_URI = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")
 DEFAULT_MLFLOW_EXPERIMENT = os.getenv("MLFLOW_EXPERIMENT", "easy11-ml")
+# sMAPE points incremental updates may trail a full refit by before the nightly run refits every SKU instead.
+FORECAST_MAX_SMAPE_GAP = float(os.getenv("FORECAST_INCREMENTAL_MAX_SMAPE_GAP", "2.0"))
 
 
 @task(
@@ -25,11 +27,13 @@ DEFAULT_MLFLOW_EXPERIMENT = os.getenv("MLFLOW_EXPERIMENT", "easy11-ml")
 def extract_training_data():
     """Extract features for model training"""
     print("📊 Extracting training data...")
-    # Simulate data extraction
+    # Forecasting trains on the sales history store; append the days exported since the last run
+    sales = run_ml_service_command("src.services.sales_history", "append")
+    print(f"🧾 Sales history: {sales}")
     return {
         "recommendations": {"users": 1000, "interactions": 50000},
         "churn": {"customers": 5000, "features": 20},
-        "forecasting": {"days": 365, "products": 100}
+        "forecasting": {"days": sales["days"], "products": sales["products"], "new_days": sales["new_days"]},
     }
 
 
@@ -47,28 +51,57 @@ def train_recommendation_model(data):
 
 @task
 def train_churn_model(data):
-    """Train XGBoost churn model"""
+    """Train the XGBoost churn model on the labelled RFM export, then rescore every customer for /churn/at-risk"""
     print("🔮 Training churn prediction model...")
-    print(f"Training on {data['customers']} customers, {data['features']} features")
-    return {
-        "model": "churn_xgboost_v1.5",
-        "auc": 0.83,
-        "precision": 0.75
-    }
+    result = run_ml_service_command("src.services.churn_model", "train")
+    scores = run_ml_service_command("src.services.churn_scores", "build")
+    if scores["status"] == "published":
+        print(f"🗂️ Churn score index published: {scores['users']} customers, {scores['risk_levels']}")
+    else:
+        print(f"⚠️ Churn score index not rebuilt: {scores['reason']}")
+    scored_users = scores.get("users", 0)
+    if result["status"] != "trained":
+        print(f"⚠️ Churn model not retrained: {result['reason']}")
+        return {"model": "unchanged", "status": result["status"], "scored_users": scored_users}
+    print(f"Trained on {result['rows']} customers ({result['rounds']} boosting rounds)")
+    return {"model": result["version"], **result["metrics"], "scored_users": scored_users}
 
 
 @task
 def train_forecasting_model(data):
-    """Train Prophet forecasting model"""
+    """Train Prophet forecasting model and publish the precomputed forecast store"""
     print("📈 Training demand forecasting model...")
     print(f"Training on {data['days']} days, {data['products']} products")
+    parity = run_ml_service_command("src.services.forecast_backtest", "parity", "--products", "500")
+    print(f"📏 Incremental update parity vs full refit: {parity}")
+    full_refit = parity["smape_gap"] is not None and parity["smape_gap"] > FORECAST_MAX_SMAPE_GAP
+    if full_refit:
+        print(f"⚠️ Incremental updates trail a full refit by more than {FORECAST_MAX_SMAPE_GAP} sMAPE points")
+    store = run_forecast_store_command("build" if full_refit else "refresh")
+    print(f"✅ Forecast store published: {store}")
+    backtest = run_ml_service_command("src.services.forecast_backtest", "evaluate")
+    print(f"📐 Rolling-origin backtest: {backtest}")
     return {
         "model": "prophet_forecast_v2.0",
-        "smape": 12.5,
-        "rmse": 150.3
+        "smape": backtest["smape"],
+        "rmse": backtest["rmse"],
+        "mape": backtest["mape"],
+        "coverage_95pct": backtest["coverage_95pct"],
+        "forecast_data_version": store["data_version"],
+        "forecast_products": store["products"],
+        "forecast_refresh_mode": store["refresh"]["mode"],
+        "forecast_products_refit": store["refresh"]["products_refit"],
+        "incremental_smape_gap": parity["smape_gap"],
+        "forecast_full_refit_forced": int(full_refit),
     }
 
 
+def run_forecast_store_command(*args):
+    """Run the ML service's forecast store CLI (refresh folds new actuals into stored per-SKU state, build refits)."""
+    print(f"🗄️ Forecast store: {' '.join(args)}...")
+    return run_ml_service_command("src.services.forecast_store", *args)
+
+
 @task
 def configure_mlflow():
     """Configure MLflow tracking URI and experiment."""
@@ -0,0 +1,29 @@
+"""
+ML service CLI runner shared by the Prefect flows
+The ML service's maintenance modules print a JSON summary as the last line of stdout.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ML_SERVICE_DIR = BASE_DIR / "ml_service"
+
+
+def run_ml_service_command(module, *args):
+    """Run an ML service CLI module from ml_service/ and parse the JSON summary on its last stdout line."""
+    result = subprocess.run(
+        [sys.executable, "-m", module, *args],
+        cwd=str(ML_SERVICE_DIR),
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(ML_SERVICE_DIR)},
+    )
+    if result.returncode != 0:
+        print(result.stdout)
+        print(result.stderr)
+        raise ValueError(f"{module} {args[0]} failed. See logs above.")
+    return json.loads(result.stdout.strip().splitlines()[-1])